@@ -0,0 +1,312 @@
+"""
+Asynchrone AT-Kommando-Engine mit Antwort-Korrelation.
+
+Kommandos werden in eine Warteschlange gestellt und mit bis zu `pipeline_depth`
+ausstehenden Anfragen auf den Port geschrieben. Modems antworten in
+Kommando-Reihenfolge, daher wird jeder finale Result-Code (`OK`, `ERROR`,
+`+CME ERROR: ...`, ...) der ältesten offenen Anfrage zugeordnet. Zeilen dazwischen
+sind Informationsantworten dieser Anfrage oder, wenn sie nicht passen, URCs
+(unsolicited result codes) und gehen an `on_urc`.
+
+Läuft eine Anfrage in ihr Timeout, bleibt sie als "Grabstein" in der Reihe, bis ihr
+verspäteter Result-Code eintrifft, damit dieser nicht dem nächsten Kommando
+zugeordnet wird. Nach weiteren `stale_after` Sekunden wird der Grabstein verworfen
+und die Pipeline läuft weiter.
+
+Die Engine ist unabhängig vom Transport: `write` schreibt eine Zeile, `feed_line()`
+bekommt jede empfangene Nicht-Telemetrie-Zeile. Mit `deferred_write=True` reicht
+`write(command, on_written)` die Zeile nur weiter (z.B. an den Kommando-Scheduler)
+und ruft `on_written(None)`, sobald sie auf dem Port ist, bzw. `on_written(exc)`,
+wenn sie verworfen wurde. Timeout und Latenz zählen erst ab dem Schreiben.
+
+Jedes Kommando geht mit `terminator` (Standard `"\\r"` nach V.250, `"\\r\\n"` für
+Geräte, die das verlangen) an `write`; Telemetrie-Zeilen enden dagegen mit `"\\n"`.
+"""
+from __future__ import annotations
+
+import asyncio
+import collections
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, List, Optional, Sequence
+
+FINAL_OK = ("OK", "CONNECT")
+FINAL_ERROR = ("ERROR", "NO CARRIER", "NO DIALTONE", "BUSY", "NO ANSWER")
+FINAL_ERROR_PREFIXES = ("+CME ERROR:", "+CMS ERROR:")
+
+# Typische URCs, die nie Teil einer Kommandoantwort sind
+DEFAULT_URC_PREFIXES = ("RING", "+CMTI:", "+CREG:", "+CGREG:", "+CEREG:", "+CRING:")
+
+AT_TERMINATORS = ("\r", "\r\n")
+
+# Anzahl der Antwortzeiten, aus denen Perzentile berechnet werden
+LATENCY_SAMPLES = 1024
+
+
+def is_final_result(line: str) -> bool:
+    return line in FINAL_OK or line in FINAL_ERROR or line.startswith(FINAL_ERROR_PREFIXES)
+
+
+class ATCommandError(Exception):
+    """Modem hat ein Kommando mit einem Fehler-Result-Code beantwortet."""
+
+    def __init__(self, response: "ATResponse"):
+        super().__init__(f"{response.command}: {response.status}")
+        self.response = response
+
+
+class ATTimeoutError(ATCommandError):
+    """Kein finaler Result-Code innerhalb des Timeouts."""
+
+
+class ATAbortedError(ATCommandError):
+    """Kommando konnte nicht geschrieben werden oder der Port ist weg."""
+
+
+@dataclass
+class ATResponse:
+    command: str
+    status: str = ""
+    lines: List[str] = field(default_factory=list)
+    latency_ms: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.status in FINAL_OK
+
+    def to_dict(self) -> dict:
+        return {"cmd": self.command, "status": self.status, "lines": self.lines,
+                "ms": round(self.latency_ms, 3)}
+
+
+class _Request:
+    __slots__ = ("response", "future", "timeout", "sent_at", "expired", "timer")
+
+    def __init__(self, command: str, future: asyncio.Future, timeout: float):
+        self.response = ATResponse(command)
+        self.future = future
+        self.timeout = timeout
+        self.sent_at = 0.0
+        self.expired = False
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class ATCommandEngine:
+    """Warteschlange + Korrelation für AT-Kommandos auf einer seriellen Leitung."""
+
+    def __init__(self, write: Callable[..., Any], pipeline_depth: int = 1,
+                 timeout: float = 1.0, stale_after: float = 1.0,
+                 urc_prefixes: Sequence[str] = DEFAULT_URC_PREFIXES,
+                 on_urc: Optional[Callable[[str], None]] = None,
+                 deferred_write: bool = False, terminator: str = "\r"):
+        if pipeline_depth < 1:
+            raise ValueError("pipeline_depth must be >= 1")
+        if terminator not in AT_TERMINATORS:
+            raise ValueError(f"terminator must be one of {AT_TERMINATORS!r}")
+        self.write = write
+        self.terminator = terminator
+        self.deferred_write = deferred_write
+        self.pipeline_depth = pipeline_depth
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self.urc_prefixes = tuple(urc_prefixes)
+        self.on_urc = on_urc
+        self.pending: Deque[_Request] = collections.deque()      # noch nicht geschrieben
+        self.outstanding: Deque[_Request] = collections.deque()  # geschrieben, ohne Result-Code
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.latencies: Deque[float] = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    async def send(self, command: str, timeout: Optional[float] = None,
+                   check: bool = True) -> ATResponse:
+        """
+        Stellt ein Kommando ein und wartet auf seinen finalen Result-Code.
+        Mit `check=True` wird bei Fehler-Codes `ATCommandError` ausgelöst.
+        """
+        loop = asyncio.get_running_loop()
+        request = _Request(command, loop.create_future(),
+                           self.timeout if timeout is None else timeout)
+        self.pending.append(request)
+        self._pump()
+        response = await request.future
+        if check and not response.ok:
+            raise ATCommandError(response)
+        return response
+
+    async def send_many(self, commands: Sequence[str],
+                        timeout: Optional[float] = None) -> List[ATResponse]:
+        """Sendet mehrere Kommandos gepipelinet; Fehler stehen im jeweiligen Status."""
+        results = await asyncio.gather(
+            *(self.send(cmd, timeout, check=False) for cmd in commands),
+            return_exceptions=True,
+        )
+        responses = []
+        for result in results:
+            if isinstance(result, ATCommandError):
+                responses.append(result.response)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                responses.append(result)
+        return responses
+
+    def _pump(self) -> None:
+        self._purge_stale()
+        while self.pending and len(self.outstanding) < self.pipeline_depth:
+            request = self.pending.popleft()
+            if request.future.done():  # vom Aufrufer abgebrochen
+                continue
+            # Vor dem Schreiben einreihen: die Antwort kann schon im Callback ankommen
+            self.outstanding.append(request)
+            line = request.response.command + self.terminator
+            try:
+                if self.deferred_write:
+                    self.write(line, lambda error, request=request: self._written(request, error))
+                else:
+                    self.write(line)
+            except Exception as e:
+                self.outstanding.remove(request)
+                self._abort(request, e)
+                continue
+            if not self.deferred_write:
+                self._start_timer(request)
+
+    def _start_timer(self, request: _Request) -> None:
+        request.sent_at = time.perf_counter()
+        request.timer = asyncio.get_running_loop().call_later(
+            request.timeout, self._expire, request)
+
+    def _written(self, request: _Request, error: Optional[BaseException]) -> None:
+        """Rückmeldung bei `deferred_write`: Zeile geschrieben (None) oder verworfen."""
+        if request not in self.outstanding:
+            return  # schon per fail_all() abgebrochen
+        if error is None:
+            self._start_timer(request)
+            return
+        self.outstanding.remove(request)
+        self._abort(request, error)
+        self._pump()
+
+    def _abort(self, request: _Request, error: BaseException) -> None:
+        if request.timer is not None:
+            request.timer.cancel()
+        if request.future.done():
+            return
+        request.response.status = f"ABORTED: {error}"
+        self.failed += 1
+        aborted = ATAbortedError(request.response)
+        aborted.__cause__ = error
+        request.future.set_exception(aborted)
+
+    def _purge_stale(self) -> None:
+        now = time.perf_counter()
+        while self.outstanding and self.outstanding[0].expired:
+            head = self.outstanding[0]
+            if now - head.sent_at < head.timeout + self.stale_after:
+                break
+            self.outstanding.popleft()
+
+    def _expire(self, request: _Request) -> None:
+        request.expired = True
+        self.timeouts += 1
+        asyncio.get_running_loop().call_later(self.stale_after, self._pump)
+        if not request.future.done():
+            request.response.status = "TIMEOUT"
+            request.response.latency_ms = (time.perf_counter() - request.sent_at) * 1000.0
+            request.future.set_exception(ATTimeoutError(request.response))
+
+    def feed_line(self, line: str) -> bool:
+        """
+        Verarbeitet eine empfangene Zeile. Liefert False, wenn die Zeile keiner
+        Anfrage zugeordnet werden konnte (URC bzw. unaufgeforderte Ausgabe).
+        """
+        line = line.strip()
+        if not line:
+            return True
+        head = self.outstanding[0] if self.outstanding else None
+        if head is None or line.startswith(self.urc_prefixes):
+            if self.on_urc is not None and line.startswith(("+",) + self.urc_prefixes):
+                self.on_urc(line)
+            return False
+        command = head.response.command
+        if is_final_result(line):
+            self.outstanding.popleft()
+            self._complete(head, line)
+            self._pump()
+            return True
+        if line == command:
+            return True  # Echo (ATE1)
+        if line.startswith("+") and not self._answers(command, line):
+            if self.on_urc is not None:
+                self.on_urc(line)
+            return False
+        head.response.lines.append(line)
+        return True
+
+    @staticmethod
+    def _answers(command: str, line: str) -> bool:
+        """`+CSQ: 20,99` gehört zu `AT+CSQ`, nicht zu `AT+CGMI`."""
+        name = line.split(":", 1)[0]
+        return command.upper().startswith("AT" + name.upper())
+
+    def _complete(self, request: _Request, status: str) -> None:
+        if request.timer is not None:
+            request.timer.cancel()
+        if request.expired or request.future.done():
+            return
+        response = request.response
+        response.status = status
+        response.latency_ms = (time.perf_counter() - request.sent_at) * 1000.0
+        self.latencies.append(response.latency_ms)
+        if response.ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+        request.future.set_result(response)
+
+    def fail_all(self, exc: BaseException) -> None:
+        """Bricht alle offenen Anfragen ab (`ATAbortedError`), z.B. bei Verlust des Ports."""
+        requests = list(self.outstanding) + list(self.pending)
+        self.outstanding.clear()
+        self.pending.clear()
+        for request in requests:
+            self._abort(request, exc)
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def pct(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+
+        return {
+            "pending": len(self.pending),
+            "outstanding": len(self.outstanding),
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "latency_p50_ms": pct(0.50),
+            "latency_p99_ms": pct(0.99),
+        }
+
+
+def read_at_response(ser, timeout: float = 1.0) -> List[str]:
+    """
+    Blockierende Variante für synchrone Controller: liest Zeilen bis zum finalen
+    Result-Code (inklusive) statt eine feste Zeit zu warten.
+    """
+    deadline = time.monotonic() + timeout
+    lines: List[str] = []
+    while time.monotonic() < deadline:
+        raw = ser.readline()
+        if not raw:
+            continue
+        line = raw.decode(errors="replace").strip()
+        if not line:
+            continue
+        lines.append(line)
+        if is_final_result(line):
+            break
+    return lines
@@ -0,0 +1,243 @@
+"""
+Audit-Export als Datenstrom: NDJSON, CSV oder eingerücktes JSON.
+
+Die Einträge kommen seitenweise aus `HardwareRegistry.iter_audit_trail()` und
+gehen pro Seite direkt in das Ziel (Datei, Dateiobjekt oder Socket). Im Speicher
+liegt also höchstens eine Seite; die Zahl der Zeilen ist nicht begrenzt.
+
+Formate:
+  - ndjson: ein JSON-Objekt pro Audit-Eintrag und Zeile
+  - csv:    Kopfzeile mit den Spalten aus `AUDIT_COLUMNS`, dann eine Zeile pro Eintrag
+  - json:   der vollständige Report wie früher (`export_timestamp`, `devices`,
+            `audit_trail`, ...), eingerückt; `total_audit_entries` steht am Ende,
+            weil die Zahl erst nach dem Schreiben feststeht
+
+Kompression optional mit gzip (Standardbibliothek) oder zstd (`zstandard`).
+`progress` wird alle `progress_every` Zeilen und am Ende mit einem Dict
+(`rows`, `bytes`, `seconds`, `rows_per_s`) aufgerufen; `bytes` zählt, was
+tatsächlich im Ziel ankommt (also komprimiert).
+
+Kommandozeile:
+  python audit_export.py --db hardware_registry.db --format ndjson --compress zstd \\
+      --output audit.ndjson.zst --status error --start 2024-01-01
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import csv
+import datetime
+import enum
+import gzip
+import json
+import os
+import sys
+import time
+from dataclasses import asdict
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from audit_query import AUDIT_COLUMNS, FREQUENCY_BANDS, AuditQuery
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+EXPORT_FORMATS = ("ndjson", "csv", "json")
+COMPRESSIONS = ("gzip", "zstd")
+
+Progress = Callable[[Dict[str, Any]], None]
+
+
+def available_compressions() -> list:
+    return ["gzip", "zstd"] if ZSTD_AVAILABLE else ["gzip"]
+
+
+class _CountingWriter:
+    """Reicht Bytes an das Ziel weiter und zählt sie."""
+
+    def __init__(self, target: Any):
+        self.target = target
+        self.bytes = 0
+
+    def write(self, data: Any) -> int:
+        self.target.write(data)
+        size = len(data)
+        self.bytes += size
+        return size
+
+    def flush(self) -> None:
+        self.target.flush()
+
+
+@contextlib.contextmanager
+def _open_target(target: Any) -> Iterator[Any]:
+    """Pfad -> eigene Datei; Socket -> `makefile("wb")`; sonst Dateiobjekt wie übergeben."""
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, "wb") as f:
+            yield f
+    elif hasattr(target, "sendall") and hasattr(target, "makefile"):
+        with target.makefile("wb") as f:
+            yield f
+    else:
+        yield target
+        target.flush()
+
+
+def _compressor(sink: _CountingWriter, compression: Optional[str],
+                level: Optional[int]) -> Tuple[Any, Callable[[], None]]:
+    if compression is None:
+        return sink, sink.flush
+    if compression == "gzip":
+        stream = gzip.GzipFile(fileobj=sink, mode="wb",
+                               compresslevel=6 if level is None else level)
+        return stream, stream.close  # schließt nur den gzip-Rahmen, nicht das Ziel
+    if compression == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise ValueError("zstd compression needs the 'zstandard' package")
+        stream = zstandard.ZstdCompressor(level=3 if level is None else level).stream_writer(
+            sink, closefd=False)
+        return stream, stream.close
+    raise ValueError(f"compression must be one of {COMPRESSIONS} or None")
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _indent(text: str, prefix: str) -> str:
+    return prefix + text.replace("\n", "\n" + prefix)
+
+
+class _CsvLines:
+    """`csv.writer` schreibt in eine Liste statt in eine Datei."""
+
+    def __init__(self):
+        self.parts: list = []
+
+    def write(self, text: str) -> None:
+        self.parts.append(text)
+
+
+def export_audit(registry: Any, target: Any, format: str = "ndjson",
+                 compression: Optional[str] = None, query: Optional[AuditQuery] = None,
+                 progress: Optional[Progress] = None, progress_every: int = 100_000,
+                 page_size: int = 5000, level: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Schreibt den (gefilterten) Audit-Trail von `registry` nach `target` und gibt
+    eine Statistik zurück. `target`: Pfad, binäres Dateiobjekt oder Socket.
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {EXPORT_FORMATS}")
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"compression must be one of {COMPRESSIONS} or None")
+    if compression == "zstd" and not ZSTD_AVAILABLE:
+        raise ValueError("zstd compression needs the 'zstandard' package")
+    query = query or AuditQuery()
+    rows = registry.iter_audit_trail(query, page_size=page_size, rows="tuple")
+    started = time.perf_counter()
+    count = 0
+    next_report = progress_every
+
+    with _open_target(target) as raw:
+        sink = _CountingWriter(raw)
+        stream, finish = _compressor(sink, compression, level)
+
+        def emit(text: str) -> None:
+            stream.write(text.encode())
+
+        def report() -> None:
+            elapsed = time.perf_counter() - started
+            progress({"rows": count, "bytes": sink.bytes, "seconds": round(elapsed, 3),
+                      "rows_per_s": round(count / elapsed) if elapsed > 0 else None})
+
+        csv_lines = _CsvLines()
+        csv_writer = csv.writer(csv_lines, lineterminator="\n")
+        if format == "csv":
+            csv_writer.writerow(AUDIT_COLUMNS)
+        elif format == "json":
+            devices = registry.get_all_devices()
+            head = json.dumps({
+                "export_timestamp": datetime.datetime.now().isoformat(),
+                "total_devices": len(devices),
+                "devices": [asdict(device) for device in devices],
+            }, indent=2, default=_json_default)
+            emit(head[:-2] + ',\n  "audit_trail": [')  # Objekt offen lassen
+
+        # json.dumps() mit Optionen baut pro Aufruf einen neuen Encoder
+        compact = json.JSONEncoder(separators=(",", ":")).encode
+        pretty = json.JSONEncoder(indent=2).encode
+        page: list = []
+        for row in rows:
+            if format == "ndjson":
+                page.append(compact(dict(zip(AUDIT_COLUMNS, row))))
+                page.append("\n")
+            elif format == "csv":
+                csv_writer.writerow(row)
+            else:
+                page.append(("\n" if count == 0 else ",\n")
+                            + _indent(pretty(dict(zip(AUDIT_COLUMNS, row))), "    "))
+            count += 1
+            if count % page_size == 0:
+                emit("".join(csv_lines.parts if format == "csv" else page))
+                page.clear()
+                csv_lines.parts.clear()
+            if progress is not None and count >= next_report:
+                report()
+                next_report += progress_every
+        emit("".join(csv_lines.parts if format == "csv" else page))
+        if format == "json":
+            emit(("\n  " if count else "") + f'],\n  "total_audit_entries": {count}\n}}\n')
+        finish()
+    if progress is not None:
+        report()
+    return {"format": format, "compression": compression, "rows": count,
+            "bytes": sink.bytes, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def main(argv=None) -> int:
+    from hardware_registry import HardwareRegistry
+
+    parser = argparse.ArgumentParser(description="Audit-Trail als Datenstrom exportieren")
+    parser.add_argument("--db", default="hardware_registry.db", help="Registry-Datenbank")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--compress", choices=COMPRESSIONS, help="gzip oder zstd")
+    parser.add_argument("--level", type=int, help="Kompressionsstufe")
+    parser.add_argument("--output", default="-", help="Zieldatei, '-' für stdout")
+    parser.add_argument("--device", action="append", help="Gerät (mehrfach möglich)")
+    parser.add_argument("--action", action="append")
+    parser.add_argument("--status", action="append")
+    parser.add_argument("--protocol", action="append")
+    parser.add_argument("--band", choices=sorted(FREQUENCY_BANDS))
+    parser.add_argument("--start", help="ISO-Zeitpunkt, inklusive")
+    parser.add_argument("--end", help="ISO-Zeitpunkt, exklusive")
+    parser.add_argument("--oldest-first", action="store_true")
+    parser.add_argument("--progress-every", type=int, default=1_000_000,
+                        help="Fortschritt auf stderr alle N Zeilen")
+    args = parser.parse_args(argv)
+    if args.compress == "zstd" and not ZSTD_AVAILABLE:
+        parser.error("--compress zstd needs the 'zstandard' package")
+
+    query = AuditQuery(device_id=args.device, action=args.action, status=args.status,
+                       protocol=args.protocol, band=args.band, start=args.start,
+                       end=args.end, newest_first=not args.oldest_first)
+
+    def progress(p: Dict[str, Any]) -> None:
+        print(f"[..] {p['rows']} rows, {p['bytes'] / 2**20:.1f} MB, {p['rows_per_s']} rows/s",
+              file=sys.stderr)
+
+    target = sys.stdout.buffer if args.output == "-" else args.output
+    with HardwareRegistry(args.db) as registry:
+        stats = export_audit(registry, target, args.format, args.compress, query,
+                             progress, args.progress_every, level=args.level)
+    print(json.dumps(stats), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
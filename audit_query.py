@@ -0,0 +1,153 @@
+"""
+Gefilterte Abfragen über `audit_trail`.
+
+`AuditQuery` sammelt die Filter (Gerät, Zeitraum, Aktion, Status, Protokoll,
+Frequenzband) und baut daraus parametrisiertes SQL. Die Indizes in
+`AUDIT_INDEXES` sind auf diese Filter zugeschnitten: jeder enthält `timestamp`
+als letzte Spalte, damit `ORDER BY timestamp ... LIMIT n` direkt aus dem Index
+gelesen wird, statt die passenden Zeilen erst zu sammeln und zu sortieren.
+
+Der Query-Planer kennt über `ANALYZE` nur durchschnittliche Selektivitäten und
+weiß daher nicht, dass Fehler-Status selten sind. Ein Statusfilter ohne
+"success" wird deshalb als `unlikely()` markiert; mit Aktion und Status zugleich
+läuft die Abfrage dann über den Status-Index statt über den der häufigen Aktion.
+
+Zeitstempel liegen als ISO-8601-Text vor und sortieren lexikographisch
+chronologisch; `start` ist inklusive, `end` exklusive.
+
+Seitenweises Lesen (`HardwareRegistry.iter_audit_trail()`) nutzt Keyset-
+Paginierung: jede Seite beginnt hinter dem Schlüssel (timestamp, rowid) der
+letzten Zeile der vorigen. Das kostet pro Seite einen Index-Seek, egal wie weit
+hinten sie liegt (OFFSET müsste alle übersprungenen Zeilen erneut lesen).
+"""
+from __future__ import annotations
+
+import datetime
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+AUDIT_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_audit_timestamp ON audit_trail (timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_device_time ON audit_trail (device_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_action_time ON audit_trail (action, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_status_time ON audit_trail (status, timestamp)",
+)
+
+# Benannte Bänder für `band=` (Grenzen in Hz, inklusive)
+FREQUENCY_BANDS: Dict[str, Tuple[float, float]] = {
+    "433": (433.05e6, 434.79e6),
+    "868": (863e6, 870e6),
+    "915": (902e6, 928e6),
+    "2g4": (2.4e9, 2.5e9),
+    "5g": (5.15e9, 5.875e9),
+}
+
+SUCCESS_STATUS = "success"
+
+AUDIT_COLUMNS = ("id", "timestamp", "device_id", "action", "frequency_hz", "protocol",
+                 "payload_size", "payload_hash", "status", "error_message", "user_id")
+
+Keyset = Tuple[str, int]  # (timestamp, rowid) der zuletzt gelesenen Zeile
+
+Values = Union[None, Any, Sequence[Any]]
+TimeBound = Union[None, str, datetime.datetime]
+
+
+def _time(value: TimeBound) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return value.isoformat()
+
+
+def _values(value: Values) -> Optional[List[Any]]:
+    """Einzelwert oder Liste -> Liste; Enums werden zu ihrem `.value`."""
+    if value is None:
+        return None
+    items = list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+    return [getattr(v, "value", v) for v in items]
+
+
+@dataclass
+class AuditQuery:
+    """Filter für `HardwareRegistry.query_audit_trail()`; alle Felder optional."""
+
+    device_id: Values = None
+    start: TimeBound = None
+    end: TimeBound = None
+    action: Values = None
+    status: Values = None
+    protocol: Values = None
+    band: Optional[str] = None
+    min_hz: Optional[float] = None
+    max_hz: Optional[float] = None
+    newest_first: bool = True
+
+    def frequency_range(self) -> Tuple[Optional[float], Optional[float]]:
+        lo, hi = self.min_hz, self.max_hz
+        if self.band is not None:
+            if self.band not in FREQUENCY_BANDS:
+                raise ValueError(f"unknown band {self.band!r}, one of {sorted(FREQUENCY_BANDS)}")
+            band_lo, band_hi = FREQUENCY_BANDS[self.band]
+            lo = band_lo if lo is None else max(lo, band_lo)
+            hi = band_hi if hi is None else min(hi, band_hi)
+        return lo, hi
+
+    def where(self, after: Optional[Keyset] = None) -> Tuple[str, List[Any]]:
+        """
+        WHERE-Klausel (leer, wenn nichts gefiltert wird) und ihre Parameter;
+        mit `after` nur Zeilen, die in Sortierrichtung hinter diesem Schlüssel liegen.
+        """
+        clauses: List[str] = []
+        params: List[Any] = []
+        for column in ("device_id", "action", "status", "protocol"):
+            values = _values(getattr(self, column))
+            if values is None:
+                continue
+            if not values:
+                clauses.append("0")  # leere Auswahl trifft nichts
+            else:
+                if len(values) == 1:
+                    clause = f"{column} = ?"
+                else:
+                    clause = f"{column} IN ({', '.join('?' * len(values))})"
+                if column == "status" and SUCCESS_STATUS not in values:
+                    clause = f"unlikely({clause})"
+                clauses.append(clause)
+                params.extend(values)
+        start, end = _time(self.start), _time(self.end)
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("timestamp < ?")
+            params.append(end)
+        lo, hi = self.frequency_range()
+        if lo is not None:
+            clauses.append("frequency_hz >= ?")
+            params.append(lo)
+        if hi is not None:
+            clauses.append("frequency_hz <= ?")
+            params.append(hi)
+        if after is not None:
+            clauses.append(f"(timestamp, rowid) {'<' if self.newest_first else '>'} (?, ?)")
+            params.extend(after)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def sql(self, limit: Optional[int] = 100, after: Optional[Keyset] = None,
+            with_rowid: bool = False) -> Tuple[str, List[Any]]:
+        """
+        Vollständiges SELECT über `AUDIT_COLUMNS` (mit `with_rowid` zusätzlich
+        `rowid` als letzte Spalte), sortiert nach Zeit.
+        """
+        where, params = self.where(after)
+        order = "DESC" if self.newest_first else "ASC"
+        columns = ", ".join(AUDIT_COLUMNS + (("rowid",) if with_rowid else ()))
+        # rowid als Gleichstand-Regel: steckt in jedem Index, kostet also keine Sortierung
+        text = (f"SELECT {columns} FROM audit_trail{where} "
+                f"ORDER BY timestamp {order}, rowid {order}")
+        if limit is not None:
+            if limit < 0:
+                raise ValueError("limit must be >= 0")
+            text += " LIMIT ?"
+            params.append(limit)
+        return text, params
@@ -0,0 +1,182 @@
+"""
+Audit-Einträge im Hintergrund sammeln und in Gruppen committen.
+
+`AuditWriter.submit()` hängt eine fertige Zeile an eine Warteschlange; ein
+Hintergrund-Thread schreibt sie per `executemany()` in einer Transaktion, sobald
+`batch_size` Einträge warten oder `interval_ms` seit dem ersten wartenden Eintrag
+vergangen sind. Ein Commit kostet damit pro Gruppe statt pro Eintrag.
+
+Haltbarkeit (`durability`):
+  - "async":  `submit()` kehrt sofort zurück; bei einem Absturz gehen die noch
+              nicht geschriebenen Einträge (höchstens ein Intervall) verloren
+  - "commit": `submit()` wartet, bis die Gruppe mit dem Eintrag committet ist.
+              Der Writer wartet hier nicht auf `interval_ms` (sonst kostete jeder
+              Eintrag ein Intervall); Gruppen entstehen aus den Produzenten, die
+              während eines laufenden Commits eintreffen (Group Commit)
+  - "fsync":  wie "commit", zusätzlich `synchronous=FULL`, jeder Gruppen-Commit
+              ist also auf der Platte
+
+`flush()` wartet, bis alles bis zu diesem Zeitpunkt Eingereihte geschrieben ist.
+Läuft die Warteschlange voll (`max_queue`), warten Produzenten auf den Writer.
+Scheitert eine Gruppe (z.B. doppelte ID), wird sie einzeln nachgeschrieben, damit
+nur der fehlerhafte Eintrag verloren geht.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional, Sequence
+
+from registry_db import RegistryDatabase
+
+DURABILITY_MODES = ("async", "commit", "fsync")
+
+INSERT_AUDIT = """
+    INSERT INTO audit_trail
+    (id, timestamp, device_id, action, frequency_hz, protocol,
+     payload_size, payload_hash, status, error_message, user_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class AuditWriter:
+    """Hintergrund-Thread, der Audit-Zeilen gruppenweise in `audit_trail` schreibt."""
+
+    def __init__(self, db: RegistryDatabase, batch_size: int = 256, interval_ms: float = 50.0,
+                 durability: str = "async", max_queue: int = 100_000):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}")
+        if batch_size < 1 or max_queue < batch_size:
+            raise ValueError("need 1 <= batch_size <= max_queue")
+        self.db = db
+        self.batch_size = batch_size
+        self.interval = max(0.0, interval_ms) / 1000.0 if durability == "async" else 0.0
+        self.durability = durability
+        self.max_queue = max_queue
+        if durability == "fsync":
+            db.set_synchronous("FULL")
+        self._cond = threading.Condition()
+        self._pending: Deque[Sequence] = deque()
+        self._enqueued = 0   # laufende Nummer des zuletzt eingereihten Eintrags
+        self._done = 0       # Einträge, deren Gruppe abgearbeitet ist
+        self._flush_to = 0   # flush() angefordert bis zu dieser Nummer
+        self._closing = False
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, row: Sequence) -> None:
+        """Reiht eine Zeile (Spalten wie `INSERT_AUDIT`) ein."""
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("audit writer is closed")
+            while len(self._pending) >= self.max_queue:
+                self._cond.wait()
+            self._pending.append(row)
+            self._enqueued += 1
+            seq = self._enqueued
+            if len(self._pending) in (1, self.batch_size):
+                self._cond.notify_all()  # Writer startet das Intervall bzw. schreibt
+            if self.durability != "async":
+                while self._done < seq:
+                    self._cond.wait()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wartet, bis alle bisher eingereihten Einträge geschrieben sind."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = self._enqueued
+            self._flush_to = max(self._flush_to, target)
+            self._cond.notify_all()
+            while self._done < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                if not self._thread.is_alive():
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _next_batch(self) -> Optional[list]:
+        with self._cond:
+            while not self._pending:
+                if self._closing:
+                    return None
+                self._cond.wait()
+            deadline = time.monotonic() + self.interval
+            while (len(self._pending) < self.batch_size and not self._closing
+                   and self._flush_to <= self._done):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(self.batch_size, len(self._pending))
+            batch = [self._pending.popleft() for _ in range(count)]
+            self._cond.notify_all()  # Platz für wartende Produzenten
+            return batch
+
+    def _write(self, batch: list) -> int:
+        try:
+            with self.db.write() as conn:
+                conn.executemany(INSERT_AUDIT, batch)
+            return len(batch)
+        except sqlite3.Error as e:
+            logger.warning(f"Audit-Gruppe mit {len(batch)} Einträgen gescheitert ({e}), "
+                           "schreibe einzeln")
+        written = 0
+        for row in batch:
+            try:
+                with self.db.write() as conn:
+                    conn.execute(INSERT_AUDIT, row)
+                written += 1
+            except sqlite3.Error as e:
+                logger.error(f"Fehler beim Audit-Log: {e}")
+        return written
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                written = self._write(batch)
+            except Exception as e:  # z.B. Datenbank geschlossen
+                logger.error(f"Audit-Writer: {e}")
+                written = 0
+            with self._cond:
+                self.written += written
+                self.failed += len(batch) - written
+                self.batches += 1
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self._done += len(batch)
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        return {"durability": self.durability, "batch_size": self.batch_size,
+                "interval_ms": self.interval * 1000.0, "pending": self.pending,
+                "written": self.written, "failed": self.failed, "batches": self.batches,
+                "largest_batch": self.largest_batch}
+
+    def close(self) -> None:
+        """Schreibt alles Ausstehende und beendet den Thread."""
+        if self._thread.is_alive():
+            self.flush()
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+        atexit.unregister(self.close)
@@ -0,0 +1,244 @@
+"""
+Prioritäts-Scheduler für serielle Kommandos.
+
+Sitzt vor `SerialBridge.write_line()` und verteilt Kommandos auf drei Spuren:
+
+  - safety:      PTT/TX-Steuerung, Not-Aus; wird immer zuerst geschrieben
+  - interactive: Einzelkommandos aus der Bedienoberfläche (Standard)
+  - bulk:        Konfigurations-Uploads; nur wenn die höheren Spuren leer sind
+
+Jede Spur hat optional ein Token-Bucket-Ratenlimit (Kommandos/s). Sicherheits-
+kommandos werden anhand `SAFETY_PATTERN` erkannt und können von Clients nicht
+herabgestuft werden. Noch nicht geschriebene Bulk-Arbeit lässt sich verwerfen
+(`cancel()`). Pro Spur wird die Wartezeit in der Queue gemessen.
+
+Wirft `write` einen `ConnectionError` (Port weg), bleibt das Kommando vorne in
+seiner Spur und der Durchlauf endet; nach `stop()`/`start()` geht es dort weiter.
+Kommandos mit `on_written` werden stattdessen mit dem Fehler gemeldet.
+
+`submit(..., on_written=cb)` meldet das Schicksal eines einzelnen Kommandos:
+`cb(None)` direkt nach dem Schreiben, `cb(exc)` wenn es verworfen wurde
+(Schreibfehler, `cancel()`, `abandon()`). Die AT-Engine misst damit ab dem
+tatsächlichen Schreiben statt ab dem Einreihen.
+"""
+from __future__ import annotations
+
+import asyncio
+import collections
+import enum
+import re
+import sys
+import time
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+OnWritten = Optional[Callable[[Optional[BaseException]], None]]
+
+SAFETY_PATTERN = re.compile(r"^AT\+(PTT|TX|TXOFF|STOP|ABORT|RESET)\b", re.IGNORECASE)
+
+# Anzahl der Wartezeiten pro Spur, aus denen Perzentile berechnet werden
+WAIT_SAMPLES = 1024
+
+# Max. Schreibvorgänge pro Durchlauf, danach kommt der Event-Loop wieder dran
+WRITES_PER_RUN = 16
+
+
+class CommandDropped(Exception):
+    """Kommando wurde vor dem Schreiben verworfen."""
+
+
+class Priority(enum.IntEnum):
+    SAFETY = 0
+    INTERACTIVE = 1
+    BULK = 2
+
+    @classmethod
+    def parse(cls, value) -> "Priority":
+        if isinstance(value, cls):
+            return value
+        try:
+            return cls[str(value).upper()]
+        except KeyError:
+            raise ValueError(f"unknown priority: {value!r}") from None
+
+
+def classify(command: str, requested: Optional[Priority] = None) -> Priority:
+    """Sicherheitskommandos landen immer in der safety-Spur."""
+    if SAFETY_PATTERN.match(command):
+        return Priority.SAFETY
+    return requested if requested is not None else Priority.INTERACTIVE
+
+
+class _Lane:
+    __slots__ = ("priority", "queue", "rate", "burst", "tokens", "updated",
+                 "sent", "cancelled", "waits")
+
+    def __init__(self, priority: Priority, rate: Optional[float], burst: int):
+        self.priority = priority
+        self.queue: Deque[Tuple[str, float, OnWritten]] = collections.deque()
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.perf_counter()
+        self.sent = 0
+        self.cancelled = 0
+        self.waits: Deque[float] = collections.deque(maxlen=WAIT_SAMPLES)
+
+    def refill(self, now: float) -> None:
+        if self.rate is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Sekunden bis zum nächsten Token (0 wenn sofort sendbar)."""
+        if self.rate is None or self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def stats(self) -> Dict[str, float]:
+        waits = sorted(self.waits)
+
+        def pct(p: float) -> float:
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000.0, 3) if waits else 0.0
+
+        return {
+            "queued": len(self.queue),
+            "sent": self.sent,
+            "cancelled": self.cancelled,
+            "rate": self.rate or 0,
+            "wait_p50_ms": pct(0.50),
+            "wait_p99_ms": pct(0.99),
+            "wait_max_ms": round(waits[-1] * 1000.0, 3) if waits else 0.0,
+        }
+
+
+class CommandScheduler:
+    """Schreibt Kommandos nach Priorität und Ratenlimit über `write`."""
+
+    def __init__(self, write: Callable[[str], None],
+                 rates: Optional[Dict[Priority, Optional[float]]] = None, burst: int = 10):
+        rates = rates or {}
+        self.write = write
+        self.lanes = [_Lane(p, rates.get(p), burst) for p in Priority]
+        self._waiter: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def submit(self, command: str, priority: Optional[Priority] = None,
+               on_written: OnWritten = None) -> Priority:
+        lane = self.lanes[classify(command, priority)]
+        lane.queue.append((command, time.perf_counter(), on_written))
+        self._wakeup()
+        return lane.priority
+
+    def cancel(self, priority: Priority = Priority.BULK) -> int:
+        """Verwirft noch nicht geschriebene Kommandos einer Spur."""
+        lane = self.lanes[priority]
+        dropped = list(lane.queue)
+        lane.queue.clear()
+        lane.cancelled += len(dropped)
+        for command, _, on_written in dropped:
+            if on_written is not None:
+                on_written(CommandDropped(f"{command}: cancelled"))
+        return len(dropped)
+
+    def abandon(self, exc: BaseException) -> int:
+        """
+        Verwirft alle wartenden Kommandos mit `on_written` (z.B. AT-Anfragen, deren
+        Aufrufer beim Verlust des Ports schon einen Fehler bekommen haben);
+        Kommandos ohne Rückmeldung bleiben für den Reconnect liegen.
+        """
+        dropped = []
+        for lane in self.lanes:
+            keep = [entry for entry in lane.queue if entry[2] is None]
+            dropped += [entry for entry in lane.queue if entry[2] is not None]
+            lane.queue = collections.deque(keep)
+        for _, _, on_written in dropped:
+            on_written(exc)  # type: ignore[misc]
+        return len(dropped)
+
+    def _wakeup(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _next(self, now: float) -> Tuple[Optional[_Lane], Optional[float]]:
+        """Höchste sendbare Spur bzw. Wartezeit bis eine Spur wieder sendbar ist."""
+        delay: Optional[float] = None
+        for lane in self.lanes:
+            if not lane.queue:
+                continue
+            lane.refill(now)
+            wait = lane.delay()
+            if wait == 0.0:
+                return lane, None
+            delay = wait if delay is None else min(delay, wait)
+        return None, delay
+
+    def run_once(self) -> Optional[float]:
+        """
+        Schreibt bis zu WRITES_PER_RUN sofort sendbare Kommandos. Liefert die Zeit bis
+        zum nächsten Durchlauf oder None, wenn alle Spuren leer sind.
+        """
+        for _ in range(WRITES_PER_RUN):
+            now = time.perf_counter()
+            lane, delay = self._next(now)
+            if lane is None:
+                return delay
+            command, queued_at, on_written = lane.queue.popleft()
+            try:
+                self.write(command)
+            except ConnectionError as e:
+                if on_written is None:
+                    # Nicht verlieren: nach dem Reconnect als Erstes schreiben
+                    lane.queue.appendleft((command, queued_at, on_written))
+                else:
+                    # Wie abandon(): der Aufrufer bekommt den Fehler, nach dem Reconnect
+                    # käme die Antwort sonst der nächsten AT-Anfrage zu
+                    on_written(e)
+                return None
+            except Exception as e:
+                print(f"[WARN] Serial write failed ({lane.priority.name.lower()}): {e}",
+                      file=sys.stderr)
+                if on_written is not None:
+                    on_written(e)
+            else:
+                if on_written is not None:
+                    on_written(None)
+            if lane.rate is not None:
+                lane.tokens -= 1.0
+            lane.waits.append(now - queued_at)
+            lane.sent += 1
+        return 0.0
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            delay = self.run_once()
+            self._waiter = loop.create_future()
+            timer = loop.call_later(delay, self._wakeup) if delay is not None else None
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+                if timer is not None:
+                    timer.cancel()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {lane.priority.name.lower(): lane.stats() for lane in self.lanes}
+
+
+def parse_rates(specs: List[str]) -> Dict[Priority, Optional[float]]:
+    """`bulk=50` -> {Priority.BULK: 50.0}; `0` bedeutet unbegrenzt."""
+    rates: Dict[Priority, Optional[float]] = {}
+    for spec in specs:
+        name, _, value = spec.partition("=")
+        rate = float(value)
+        rates[Priority.parse(name)] = rate if rate > 0 else None
+    return rates
@@ -8,11 +8,18 @@ import json
 import sqlite3
 import hashlib
 import datetime
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, asdict
+import io
+import itertools
+from typing import Callable, Dict, Iterator, List, Optional, Any
+from dataclasses import dataclass
 from enum import Enum
 import logging
 
+from audit_export import EXPORT_FORMATS, export_audit
+from audit_query import AUDIT_COLUMNS, AUDIT_INDEXES, AuditQuery
+from audit_writer import AuditWriter
+from registry_db import RegistryDatabase
+
 class HardwareType(Enum):
     SDR = "sdr"
     LTE_MODEM = "lte_modem"
@@ -88,18 +95,50 @@ class AuditEntry:
     error_message: Optional[str]
     user_id: Optional[str]
 
+# Formen, in denen iter_audit_trail() Zeilen liefert
+AUDIT_ROW_TYPES = ("entry", "tuple", "row")
+
 class HardwareRegistry:
     """Vollständiges Hardware-Registry-System"""
     
-    def __init__(self, db_path: str = "hardware_registry.db"):
+    def __init__(self, db_path: str = "hardware_registry.db",
+                 synchronous: str = "NORMAL", read_pool: int = 4,
+                 audit_batch_size: int = 256, audit_interval_ms: float = 50.0,
+                 audit_durability: str = "async"):
         self.db_path = db_path
         self.logger = logging.getLogger(__name__)
+        # Eine Schreibverbindung + Lese-Pool für die Lebensdauer der Registry (WAL)
+        self.db = RegistryDatabase(db_path, read_pool=read_pool, synchronous=synchronous)
         self._init_database()
+        # Audit-Einträge gehen gesammelt über einen Hintergrund-Thread in die DB
+        self.audit_writer = AuditWriter(self.db, batch_size=audit_batch_size,
+                                        interval_ms=audit_interval_ms,
+                                        durability=audit_durability)
+        self._audit_counter = itertools.count()
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Warte, bis alle eingereihten Audit-Einträge geschrieben sind"""
+        return self.audit_writer.flush(timeout)
+    
+    def close(self):
+        """Schreibe ausstehende Audit-Einträge und schließe die Datenbankverbindungen"""
+        self.audit_writer.close()
+        self.db.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
     
     def _init_database(self):
         """Initialisiere SQLite-Datenbank für Hardware-Registry"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.db.write() as conn:
+            self._create_tables(conn.cursor())
+        self.logger.info("Hardware-Registry-Datenbank initialisiert")
+    
+    @staticmethod
+    def _create_tables(cursor: sqlite3.Cursor):
         
         # Hardware-Geräte-Tabelle
         cursor.execute("""
@@ -156,42 +195,37 @@ class HardwareRegistry:
             )
         """)
         
-        conn.commit()
-        conn.close()
-        self.logger.info("Hardware-Registry-Datenbank initialisiert")
+        # Indizes für zeitlich sortierte, gefilterte Audit-Abfragen
+        for statement in AUDIT_INDEXES:
+            cursor.execute(statement)
     
     def register_device(self, device: HardwareDevice) -> bool:
         """Registriere neues Hardware-Gerät"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO hardware_devices 
-                (id, name, manufacturer, model, hardware_type, protocols, 
-                 frequency_range, power_range, interfaces, driver_info, 
-                 compliance_certs, audit_enabled, created_at, last_seen, status)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                device.id,
-                device.name,
-                device.manufacturer,
-                device.model,
-                device.hardware_type.value,
-                json.dumps([p.value for p in device.protocols]),
-                json.dumps(device.frequency_range),
-                json.dumps(device.power_range),
-                json.dumps(device.interfaces),
-                json.dumps(device.driver_info),
-                json.dumps(device.compliance_certs),
-                device.audit_enabled,
-                device.created_at.isoformat(),
-                device.last_seen.isoformat() if device.last_seen else None,
-                device.status
-            ))
-            
-            conn.commit()
-            conn.close()
+            with self.db.write() as conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO hardware_devices 
+                    (id, name, manufacturer, model, hardware_type, protocols, 
+                     frequency_range, power_range, interfaces, driver_info, 
+                     compliance_certs, audit_enabled, created_at, last_seen, status)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    device.id,
+                    device.name,
+                    device.manufacturer,
+                    device.model,
+                    device.hardware_type.value,
+                    json.dumps([p.value for p in device.protocols]),
+                    json.dumps(device.frequency_range),
+                    json.dumps(device.power_range),
+                    json.dumps(device.interfaces),
+                    json.dumps(device.driver_info),
+                    json.dumps(device.compliance_certs),
+                    device.audit_enabled,
+                    device.created_at.isoformat(),
+                    device.last_seen.isoformat() if device.last_seen else None,
+                    device.status
+                ))
             
             # Audit-Eintrag erstellen
             self._log_audit_entry(
@@ -210,30 +244,25 @@ class HardwareRegistry:
     def create_signal_path(self, signal_path: SignalPath) -> bool:
         """Erstelle neuen Signalpfad"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT INTO signal_paths 
-                (id, name, tx_device, rx_device, frequency_hz, protocol, 
-                 modulation, bandwidth_hz, power_dbm, created_at, active)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                signal_path.id,
-                signal_path.name,
-                signal_path.tx_device,
-                signal_path.rx_device,
-                signal_path.frequency_hz,
-                signal_path.protocol.value,
-                signal_path.modulation,
-                signal_path.bandwidth_hz,
-                signal_path.power_dbm,
-                signal_path.created_at.isoformat(),
-                signal_path.active
-            ))
-            
-            conn.commit()
-            conn.close()
+            with self.db.write() as conn:
+                conn.execute("""
+                    INSERT INTO signal_paths 
+                    (id, name, tx_device, rx_device, frequency_hz, protocol, 
+                     modulation, bandwidth_hz, power_dbm, created_at, active)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    signal_path.id,
+                    signal_path.name,
+                    signal_path.tx_device,
+                    signal_path.rx_device,
+                    signal_path.frequency_hz,
+                    signal_path.protocol.value,
+                    signal_path.modulation,
+                    signal_path.bandwidth_hz,
+                    signal_path.power_dbm,
+                    signal_path.created_at.isoformat(),
+                    signal_path.active
+                ))
             
             self.logger.info(f"Signalpfad erstellt: {signal_path.name} ({signal_path.id})")
             return True
@@ -250,27 +279,21 @@ class HardwareRegistry:
                         status: str = "success",
                         error_message: Optional[str] = None,
                         user_id: Optional[str] = None):
-        """Logge Audit-Eintrag"""
+        """Logge Audit-Eintrag (wird im Hintergrund gesammelt committet)"""
         try:
+            timestamp = datetime.datetime.now().isoformat()
+            # Der Zähler hält IDs innerhalb derselben Mikrosekunde eindeutig
             audit_id = hashlib.sha256(
-                f"{device_id}{action}{datetime.datetime.now().isoformat()}".encode()
+                f"{device_id}{action}{timestamp}{next(self._audit_counter)}".encode()
             ).hexdigest()[:16]
             
             payload_hash = None
             if payload_data:
                 payload_hash = hashlib.sha256(payload_data).hexdigest()
             
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT INTO audit_trail 
-                (id, timestamp, device_id, action, frequency_hz, protocol,
-                 payload_size, payload_hash, status, error_message, user_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+            self.audit_writer.submit((
                 audit_id,
-                datetime.datetime.now().isoformat(),
+                timestamp,
                 device_id,
                 action,
                 frequency_hz,
@@ -282,20 +305,13 @@ class HardwareRegistry:
                 user_id
             ))
             
-            conn.commit()
-            conn.close()
-            
         except Exception as e:
             self.logger.error(f"Fehler beim Audit-Log: {e}")
     
     def get_all_devices(self) -> List[HardwareDevice]:
         """Hole alle registrierten Geräte"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM hardware_devices")
-        rows = cursor.fetchall()
-        conn.close()
+        with self.db.read() as conn:
+            rows = conn.execute("SELECT * FROM hardware_devices").fetchall()
         
         devices = []
         for row in rows:
@@ -322,64 +338,120 @@ class HardwareRegistry:
     
     def get_audit_trail(self, device_id: Optional[str] = None, 
                        limit: int = 100) -> List[AuditEntry]:
-        """Hole Audit-Trail"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        if device_id:
-            cursor.execute("""
-                SELECT * FROM audit_trail 
-                WHERE device_id = ? 
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            """, (device_id, limit))
-        else:
-            cursor.execute("""
-                SELECT * FROM audit_trail 
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            """, (limit,))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        entries = []
-        for row in rows:
-            entry = AuditEntry(
-                id=row[0],
-                timestamp=datetime.datetime.fromisoformat(row[1]),
-                device_id=row[2],
-                action=row[3],
-                frequency_hz=row[4],
-                protocol=CommunicationProtocol(row[5]) if row[5] else None,
-                payload_size=row[6],
-                payload_hash=row[7],
-                status=row[8],
-                error_message=row[9],
-                user_id=row[10]
-            )
-            entries.append(entry)
+        """Hole Audit-Trail (inklusive aller bis jetzt geloggten Einträge)"""
+        return self.query_audit_trail(AuditQuery(device_id=device_id or None), limit=limit)
+    
+    def query_audit_trail(self, query: Optional[AuditQuery] = None, limit: int = 100,
+                          **filters: Any) -> List[AuditEntry]:
+        """
+        Hole gefilterte Audit-Einträge, neueste zuerst. Filter als `AuditQuery` oder
+        direkt als Schlüsselwörter, z.B.
+        `query_audit_trail(action="transmit", status="error", band="868", start=t0)`.
+        """
+        if query is None:
+            query = AuditQuery(**filters)
+        elif filters:
+            raise TypeError("pass either an AuditQuery or keyword filters")
+        sql, params = query.sql(limit)
+        self.audit_writer.flush()
+        with self.db.read() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [self._audit_entry(row) for row in rows]
+    
+    def iter_audit_trail(self, query: Optional[AuditQuery] = None, page_size: int = 1000,
+                         rows: str = "entry", limit: Optional[int] = None,
+                         **filters: Any) -> Iterator[Any]:
+        """
+        Gehe den (gefilterten) Audit-Trail seitenweise durch und liefere die Einträge
+        einzeln, ohne die ganze Ergebnismenge zu laden. Die Seiten schließen per
+        Keyset (timestamp, rowid) aneinander an; eine Lese-Verbindung ist nur während
+        des Holens einer Seite belegt, im Speicher liegt höchstens eine Seite.
         
-        return entries
+        `rows`: "entry" (AuditEntry), "tuple" (Spalten wie AUDIT_COLUMNS) oder
+        "row" (sqlite3.Row, Zugriff per Spaltenname, zusätzlich mit "rowid").
+        """
+        if query is None:
+            query = AuditQuery(**filters)
+        elif filters:
+            raise TypeError("pass either an AuditQuery or keyword filters")
+        if rows not in AUDIT_ROW_TYPES:
+            raise ValueError(f"rows must be one of {AUDIT_ROW_TYPES}")
+        if page_size < 1:
+            raise ValueError("page_size must be >= 1")
+        query.where()  # ungültige Filter sofort melden, nicht erst beim ersten next()
+        self.audit_writer.flush()
+        return self._iter_audit_pages(query, page_size, rows, limit)
+    
+    def _iter_audit_pages(self, query: AuditQuery, page_size: int, rows: str,
+                          limit: Optional[int]) -> Iterator[Any]:
+        rowid_index = len(AUDIT_COLUMNS)
+        after = None
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            sql, params = query.sql(size, after, with_rowid=True)
+            with self.db.read() as conn:
+                cursor = conn.cursor()
+                if rows == "row":
+                    cursor.row_factory = sqlite3.Row
+                page = cursor.execute(sql, params).fetchall()
+            if not page:
+                return
+            last = page[-1]
+            after = (last[1], last[rowid_index])
+            if rows == "entry":
+                for row in page:
+                    yield self._audit_entry(row)
+            elif rows == "tuple":
+                for row in page:
+                    yield row[:rowid_index]
+            else:
+                yield from page
+            if len(page) < size:
+                return
+            if remaining is not None:
+                remaining -= len(page)
+    
+    @staticmethod
+    def _audit_entry(row) -> AuditEntry:
+        """Zeile aus `audit_trail` (Spalten wie `AUDIT_COLUMNS`) -> AuditEntry"""
+        return AuditEntry(
+            id=row[0],
+            timestamp=datetime.datetime.fromisoformat(row[1]),
+            device_id=row[2],
+            action=row[3],
+            frequency_hz=row[4],
+            protocol=CommunicationProtocol(row[5]) if row[5] else None,
+            payload_size=row[6],
+            payload_hash=row[7],
+            status=row[8],
+            error_message=row[9],
+            user_id=row[10]
+        )
+    
+    def export_audit(self, target: Any, format: str = "ndjson",
+                     compression: Optional[str] = None, query: Optional[AuditQuery] = None,
+                     progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                     **filters: Any) -> Dict[str, Any]:
+        """
+        Exportiere den (gefilterten) Audit-Trail als Datenstrom nach `target` (Pfad,
+        binäres Dateiobjekt oder Socket) in NDJSON, CSV oder JSON, optional gzip/zstd.
+        Speicherbedarf konstant, keine Obergrenze für die Zeilenzahl.
+        """
+        if query is None:
+            query = AuditQuery(**filters)
+        elif filters:
+            raise TypeError("pass either an AuditQuery or keyword filters")
+        return export_audit(self, target, format, compression, query, progress)
     
     def export_audit_report(self, format: str = "json") -> str:
-        """Exportiere vollständigen Audit-Report"""
-        devices = self.get_all_devices()
-        audit_trail = self.get_audit_trail(limit=10000)
-        
-        report = {
-            "export_timestamp": datetime.datetime.now().isoformat(),
-            "total_devices": len(devices),
-            "total_audit_entries": len(audit_trail),
-            "devices": [asdict(device) for device in devices],
-            "audit_trail": [asdict(entry) for entry in audit_trail]
-        }
-        
-        if format == "json":
-            return json.dumps(report, indent=2, default=str)
-        else:
-            # CSV oder andere Formate können hier implementiert werden
-            return json.dumps(report, indent=2, default=str)
+        """
+        Exportiere vollständigen Audit-Report als String (für große Trails: export_audit).
+        Unbekannte Formate liefern wie bisher JSON.
+        """
+        buffer = io.BytesIO()
+        self.export_audit(buffer, format if format in EXPORT_FORMATS else "json")
+        return buffer.getvalue().decode()
 
 # Vordefinierte Hardware-Geräte für sofortige Nutzung
 PREDEFINED_DEVICES = [
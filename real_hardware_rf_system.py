@@ -18,6 +18,8 @@ from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 import logging
 
+from at_command_engine import read_at_response
+
 # ECHTE HARDWARE-TREIBER
 try:
     import serial
@@ -245,9 +247,10 @@ class RealRFChipController:
         """Echte AT-Kommando-Übertragung"""
         if self.serial_port:
             try:
+                self.serial_port.reset_input_buffer()
                 self.serial_port.write(f"{command}\r\n".encode())
-                time.sleep(0.1)
-                response = self.serial_port.read_all().decode().strip()
+                # Bis zum finalen Result-Code lesen statt fest 100 ms zu warten
+                response = "\n".join(read_at_response(self.serial_port))
                 print(f"✅ AT-Kommando gesendet: {command} -> {response}")
                 return response
             except Exception as e:
@@ -0,0 +1,387 @@
+"""
+Benchmark für Audit-Inserts der Hardware-Registry.
+
+Vergleicht pro Lauf:
+
+  - `connect`:    der frühere Weg, eine Verbindung pro Eintrag (connect, INSERT,
+                  commit, close) im Standard-Journal (DELETE, synchronous=FULL)
+  - `persistent`: `HardwareRegistry._log_audit_entry()` über die langlebige
+                  WAL-Verbindung (`--synchronous`, Standard NORMAL), ein Commit
+                  pro Eintrag (Gruppengröße 1, Produzent wartet auf den Commit)
+  - `group`:      wie `persistent`, aber mit Group Commit im Hintergrund
+                  (`--batch-size`, `--interval-ms`, `--durability`); gemessen
+                  bis einschließlich `flush()`
+
+Jeder Modus schreibt `--count` Einträge aus `--threads` Threads in eine frische
+Datenbank in einem temporären Verzeichnis (oder `--dir`, um z.B. auf der echten
+Platte statt tmpfs zu messen). Optional lesen `--readers` Threads währenddessen
+den Audit-Trail. Ergebnis als JSON auf stdout oder in `--output`.
+
+Mit `--query-rows N` wird stattdessen eine Datenbank mit N synthetischen
+Audit-Einträgen (100 pro Sekunde, 64 Geräte, 1 % Fehler) direkt in SQL erzeugt und
+die Latenz von `query_audit_trail()` für typische Filter gemessen (`--repeat`
+Aufrufe je Filter, LIMIT 100). `--compare-unindexed` misst jeden Filter zusätzlich
+einmal ohne die Audit-Indizes. `--iterate` liest danach den ganzen Trail mit
+`iter_audit_trail()` in jeder Zeilenform und meldet Zeilen/s und, in einem
+zweiten Durchlauf unter tracemalloc, den Spitzenwert des Python-Speichers.
+
+Beispiel:
+  python registry_benchmark.py --count 2000 --threads 1,4 --readers 2
+  python registry_benchmark.py --query-rows 10000000 --dir /var/tmp
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from audit_query import AUDIT_INDEXES, AuditQuery
+from audit_writer import DURABILITY_MODES
+from hardware_registry import CommunicationProtocol, HardwareRegistry
+
+MODES = ("connect", "persistent", "group")
+
+_LEGACY_INSERT = """
+    INSERT INTO audit_trail
+    (id, timestamp, device_id, action, frequency_hz, protocol,
+     payload_size, payload_hash, status, error_message, user_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def legacy_insert(db_path: str, n: int) -> None:
+    """Ein Audit-Eintrag wie vor der Verbindungsverwaltung: eigene Verbindung."""
+    now = datetime.datetime.now().isoformat()
+    conn = sqlite3.connect(db_path)
+    conn.execute(_LEGACY_INSERT, (
+        hashlib.sha256(f"bench{n}{now}".encode()).hexdigest()[:16], now,
+        f"bench_{n % 8}", "transmit", 868e6, "lora", 64, None, "success", None, "bench"))
+    conn.commit()
+    conn.close()
+
+
+def make_writer(mode: str, registry: HardwareRegistry) -> Callable[[int], None]:
+    if mode == "connect":
+        return lambda n: legacy_insert(registry.db_path, n)
+    if mode in ("persistent", "group"):
+        return lambda n: registry._log_audit_entry(
+            device_id=f"bench_{n % 8}", action="transmit", frequency_hz=868e6,
+            protocol=CommunicationProtocol.LORA, payload_size=64, user_id=f"bench{n}")
+    raise ValueError(f"unknown mode {mode!r}")
+
+
+def run_mode(mode: str, count: int, threads: int, readers: int, synchronous: str,
+             directory: Optional[str], batch_size: int = 256, interval_ms: float = 50.0,
+             durability: str = "async") -> Dict[str, Any]:
+    if mode == "group":
+        audit = {"audit_batch_size": batch_size, "audit_interval_ms": interval_ms,
+                 "audit_durability": durability}
+    else:
+        audit = {"audit_batch_size": 1, "audit_interval_ms": 0, "audit_durability": "commit"}
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        registry = HardwareRegistry(db_path, synchronous=synchronous, **audit)
+        if mode == "connect":
+            # Frische Datei im Standard-Journal, wie sie der alte Code vorfand
+            registry.close()
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+            conn = sqlite3.connect(db_path)
+            HardwareRegistry._create_tables(conn.cursor())
+            conn.commit()
+            conn.close()
+        write = make_writer(mode, registry)
+        counter = itertools.count()
+        stop = threading.Event()
+        reads = [0]
+
+        def writer() -> None:
+            while True:
+                n = next(counter)
+                if n >= count:
+                    return
+                write(n)
+
+        def reader() -> None:
+            reg = registry if mode != "connect" else None
+            while not stop.is_set():
+                if reg is not None:
+                    with reg.db.read() as conn:
+                        conn.execute("SELECT * FROM audit_trail ORDER BY timestamp DESC "
+                                     "LIMIT 50").fetchall()
+                else:
+                    conn = sqlite3.connect(db_path)
+                    conn.execute("SELECT * FROM audit_trail ORDER BY timestamp DESC "
+                                 "LIMIT 50").fetchall()
+                    conn.close()
+                reads[0] += 1
+
+        read_threads = [threading.Thread(target=reader, daemon=True) for _ in range(readers)]
+        write_threads = [threading.Thread(target=writer) for _ in range(threads)]
+        for t in read_threads:
+            t.start()
+        start = time.perf_counter()
+        for t in write_threads:
+            t.start()
+        for t in write_threads:
+            t.join()
+        if mode != "connect":
+            registry.flush()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for t in read_threads:
+            t.join()
+        if mode != "connect":
+            stored = len(registry.get_audit_trail(limit=count + 1))
+            registry.close()
+        else:
+            conn = sqlite3.connect(db_path)
+            stored = conn.execute("SELECT COUNT(*) FROM audit_trail").fetchone()[0]
+            conn.close()
+    return {
+        "mode": mode,
+        "batch_size": audit["audit_batch_size"] if mode != "connect" else None,
+        "count": count,
+        "threads": threads,
+        "readers": readers,
+        "stored": stored,
+        "seconds": round(elapsed, 3),
+        "inserts_per_s": round(count / elapsed, 1),
+        "reads_per_s": round(reads[0] / elapsed, 1) if readers else None,
+    }
+
+
+# Zeitachse der synthetischen Daten: ab BASE_EPOCH 100 Einträge pro Sekunde
+BASE_EPOCH = 1_700_000_000
+ROWS_PER_SECOND = 100
+
+_FILL_SQL = f"""
+    WITH RECURSIVE seq(n) AS (SELECT ? UNION ALL SELECT n + 1 FROM seq WHERE n + 1 < ?)
+    INSERT INTO audit_trail
+    SELECT printf('%016x', n),
+           strftime('%Y-%m-%dT%H:%M:%S', {BASE_EPOCH} + n / {ROWS_PER_SECOND}, 'unixepoch')
+               || printf('.%06d', (n % {ROWS_PER_SECOND}) * {1_000_000 // ROWS_PER_SECOND}),
+           'dev_' || ((n * 7919) % 64),
+           CASE WHEN n % 1000 = 0 THEN 'signal_path_created'
+                WHEN n % 3 = 0 THEN 'receive' ELSE 'transmit' END,
+           CASE (n / 3) % 4 WHEN 0 THEN 433.92e6 WHEN 1 THEN 868.1e6
+                            WHEN 2 THEN 915e6 ELSE 2.44e9 END,
+           CASE n % 4 WHEN 0 THEN 'lora' WHEN 1 THEN 'zigbee' WHEN 2 THEN 'lte' ELSE 'wifi' END,
+           64, NULL,
+           CASE WHEN (n * 31) % 100 = 0 THEN 'error' ELSE 'success' END,
+           NULL, 'bench'
+    FROM seq
+"""
+
+
+def timestamp_at(row: int) -> str:
+    """Zeitstempel der synthetischen Zeile `row` (wie in `_FILL_SQL`)."""
+    return datetime.datetime.utcfromtimestamp(BASE_EPOCH + row / ROWS_PER_SECOND).isoformat()
+
+
+def fill_audit_trail(db_path: str, rows: int, chunk: int = 1_000_000) -> None:
+    """Legt `rows` synthetische Audit-Einträge an; Indizes erst danach."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    HardwareRegistry._create_tables(conn.cursor())
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' "
+                                "AND tbl_name = 'audit_trail' AND sql IS NOT NULL").fetchall():
+        conn.execute(f"DROP INDEX {name}")
+    for start in range(0, rows, chunk):
+        conn.execute(_FILL_SQL, (start, min(rows, start + chunk)))
+        conn.commit()
+    for statement in AUDIT_INDEXES:
+        conn.execute(statement)
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+def query_cases(rows: int) -> Dict[str, AuditQuery]:
+    """Typische Filter; Zeitfenster eine Stunde in der Mitte der Daten."""
+    middle = rows // 2
+    start, end = timestamp_at(middle), timestamp_at(middle + 3600 * ROWS_PER_SECOND)
+    return {
+        "latest": AuditQuery(),
+        "device": AuditQuery(device_id="dev_7"),
+        "device_time_range": AuditQuery(device_id="dev_7", start=start, end=end),
+        "time_range": AuditQuery(start=start, end=end),
+        "time_range_oldest_first": AuditQuery(start=start, end=end, newest_first=False),
+        "action_rare": AuditQuery(action="signal_path_created"),
+        "status_error": AuditQuery(status="error"),
+        "protocol": AuditQuery(protocol=CommunicationProtocol.LTE),
+        "band_868": AuditQuery(band="868"),
+        "combined": AuditQuery(action="transmit", status="error", band="868",
+                               start=start, end=end),
+    }
+
+
+def percentiles(values: List[float], points=(0.5, 0.99)) -> Dict[str, float]:
+    ordered = sorted(values)
+    result = {}
+    for p in points:
+        key = "p" + f"{p * 100:g}".replace(".", "")
+        result[key] = round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 4)
+    result["max"] = round(ordered[-1], 4)
+    return result
+
+
+def run_iteration(registry: HardwareRegistry, page_size: int = 1000) -> Dict[str, Any]:
+    """Ganzer Trail per `iter_audit_trail()` je Zeilenform: Zeilen/s, Speicherspitze."""
+    results = {}
+    for rows in ("tuple", "row", "entry"):
+        t0 = time.perf_counter()
+        count = 0
+        for _ in registry.iter_audit_trail(rows=rows, page_size=page_size):
+            count += 1
+        elapsed = time.perf_counter() - t0
+        tracemalloc.start()
+        for _ in registry.iter_audit_trail(rows=rows, page_size=page_size):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[rows] = {"rows": count, "rows_per_s": round(count / elapsed),
+                         "peak_mb": round(peak / 2**20, 2)}
+    return results
+
+
+def run_queries(rows: int, repeat: int, directory: Optional[str],
+                compare_unindexed: bool = False, iterate: bool = False) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        db_path = os.path.join(tmp, "query.db")
+        started = time.perf_counter()
+        fill_audit_trail(db_path, rows)
+        fill_seconds = time.perf_counter() - started
+        cases = query_cases(rows)
+        results: Dict[str, Any] = {}
+        with HardwareRegistry(db_path) as registry:
+            for name, query in cases.items():
+                sql, params = query.sql(100)
+                with registry.db.read() as conn:
+                    plan = [r[-1] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+                found = len(registry.query_audit_trail(query))  # aufwärmen
+                sql_timings, call_timings = [], []
+                for _ in range(repeat):
+                    # reine SQL-Ausführung über die Pool-Verbindung ...
+                    with registry.db.read() as conn:
+                        t0 = time.perf_counter()
+                        conn.execute(sql, params).fetchall()
+                        sql_timings.append((time.perf_counter() - t0) * 1000.0)
+                    # ... und der ganze Aufruf inklusive AuditEntry-Objekten
+                    t0 = time.perf_counter()
+                    registry.query_audit_trail(query)
+                    call_timings.append((time.perf_counter() - t0) * 1000.0)
+                results[name] = {"rows": found, "sql_ms": percentiles(sql_timings),
+                                 "call_ms": percentiles(call_timings), "plan": plan}
+            iteration = run_iteration(registry) if iterate else None
+        if compare_unindexed:
+            conn = sqlite3.connect(db_path)
+            for statement in AUDIT_INDEXES:
+                conn.execute("DROP INDEX " + statement.split()[5])
+            for name, query in cases.items():
+                sql, params = query.sql(100)
+                t0 = time.perf_counter()
+                conn.execute(sql, params).fetchall()
+                results[name]["unindexed_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+            conn.close()
+    return {"rows": rows, "repeat": repeat, "fill_seconds": round(fill_seconds, 1),
+            "queries": results, "iteration": iteration}
+
+
+def parse_list(value: str, cast=int) -> List[Any]:
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Insert-Benchmark der Hardware-Registry")
+    parser.add_argument("--count", type=int, default=2000, help="Einträge pro Lauf")
+    parser.add_argument("--threads", default="1", help="Schreibende Threads (Kommaliste)")
+    parser.add_argument("--readers", type=int, default=0, help="Lesende Threads nebenher")
+    parser.add_argument("--modes", default=",".join(MODES), help="Kommaliste aus " + ", ".join(MODES))
+    parser.add_argument("--synchronous", default="NORMAL", help="PRAGMA synchronous für persistent")
+    parser.add_argument("--batch-size", type=int, default=256, help="Gruppengröße für group")
+    parser.add_argument("--interval-ms", type=float, default=50.0,
+                        help="Höchstwartezeit einer Gruppe für group")
+    parser.add_argument("--durability", default="async", choices=DURABILITY_MODES,
+                        help="Haltbarkeit für group")
+    parser.add_argument("--query-rows", type=int,
+                        help="Abfrage-Benchmark mit so vielen Audit-Einträgen statt Inserts")
+    parser.add_argument("--repeat", type=int, default=200, help="Aufrufe je Filter")
+    parser.add_argument("--compare-unindexed", action="store_true",
+                        help="Filter zusätzlich einmal ohne Indizes messen")
+    parser.add_argument("--iterate", action="store_true",
+                        help="Ganzen Trail mit iter_audit_trail() lesen (Zeilen/s, Speicher)")
+    parser.add_argument("--dir", help="Verzeichnis für die Testdatenbank")
+    parser.add_argument("--output", help="Ergebnis-JSON hierhin statt auf stdout")
+    args = parser.parse_args(argv)
+
+    modes = parse_list(args.modes, str)
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {sorted(unknown)}")
+
+    if args.query_rows:
+        print(f"[..] query benchmark with {args.query_rows} rows", file=sys.stderr)
+        result = run_queries(args.query_rows, args.repeat, args.dir, args.compare_unindexed,
+                             args.iterate)
+        for name, q in result["queries"].items():
+            print(f"     {name}: sql p50={q['sql_ms']['p50']}ms p99={q['sql_ms']['p99']}ms, "
+                  f"call p50={q['call_ms']['p50']}ms", file=sys.stderr)
+        for rows, it in (result["iteration"] or {}).items():
+            print(f"     iterate {rows}: {it['rows_per_s']} rows/s, peak {it['peak_mb']} MB",
+                  file=sys.stderr)
+        report = {
+            "benchmark": "registry_queries",
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            **result,
+        }
+        return write_report(report, args.output)
+
+    runs = []
+    for threads, mode in itertools.product(parse_list(args.threads), modes):
+        print(f"[..] mode={mode} threads={threads} count={args.count}", file=sys.stderr)
+        result = run_mode(mode, args.count, threads, args.readers, args.synchronous, args.dir,
+                          args.batch_size, args.interval_ms, args.durability)
+        print(f"     {result['inserts_per_s']} inserts/s", file=sys.stderr)
+        runs.append(result)
+
+    report = {
+        "benchmark": "registry_inserts",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "synchronous": args.synchronous,
+        "runs": runs,
+    }
+    return write_report(report, args.output)
+
+
+def write_report(report: Dict[str, Any], output: Optional[str]) -> int:
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Langlebige SQLite-Verbindungen für die Hardware-Registry.
+
+Statt pro Aufruf `sqlite3.connect()` / `commit()` / `close()` hält
+`RegistryDatabase` eine Schreibverbindung und einen kleinen Pool von
+Leseverbindungen offen:
+
+  - WAL-Journal: Leser blockieren den Schreiber nicht und umgekehrt
+  - `synchronous=NORMAL`: im WAL-Modus kein fsync pro Commit mehr, sondern beim
+    Checkpoint; ein Stromausfall kann die letzten Commits kosten, die Datei
+    bleibt aber konsistent (`synchronous="FULL"` für das alte Verhalten)
+  - Statement-Cache von `sqlite3` je Verbindung: gleiche SQL-Texte werden nur
+    einmal vorbereitet, solange die Verbindung lebt
+  - eine Sperre serialisiert Schreiber aus mehreren Threads; Leser bekommen
+    jeweils eine eigene Verbindung aus dem Pool (`check_same_thread=False`,
+    eine Verbindung wird nie von zwei Threads gleichzeitig benutzt)
+
+Bei `":memory:"` gibt es weder WAL noch getrennte Verbindungen auf dieselbe
+Datenbank; dann lesen alle über die Schreibverbindung.
+"""
+from __future__ import annotations
+
+import contextlib
+import queue
+import sqlite3
+import threading
+from typing import Iterator, List
+
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+class RegistryDatabase:
+    """Schreibverbindung plus Lese-Pool auf eine SQLite-Datei."""
+
+    def __init__(self, db_path: str, read_pool: int = 4, synchronous: str = "NORMAL",
+                 cached_statements: int = 128, busy_timeout_ms: int = 5000):
+        synchronous = synchronous.upper()
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"synchronous must be one of {SYNCHRONOUS_MODES}")
+        if read_pool < 1:
+            raise ValueError("read_pool must be >= 1")
+        self.db_path = db_path
+        self.synchronous = synchronous
+        self.cached_statements = cached_statements
+        self.busy_timeout_ms = busy_timeout_ms
+        self.memory = db_path == ":memory:"
+        self.read_pool_size = read_pool
+        self._write_lock = threading.RLock()
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all_readers: List[sqlite3.Connection] = []
+        self._pool_lock = threading.Lock()
+        self._closed = False
+        self.writes = 0
+        self.reads = 0
+        self.writer = self._connect()
+        self.journal_mode = self.writer.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=self.cached_statements,
+                               timeout=self.busy_timeout_ms / 1000.0)
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        if read_only:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def set_synchronous(self, mode: str) -> None:
+        """Ändert `PRAGMA synchronous` der Schreibverbindung (nur sie committet)."""
+        mode = mode.upper()
+        if mode not in SYNCHRONOUS_MODES:
+            raise ValueError(f"synchronous must be one of {SYNCHRONOUS_MODES}")
+        with self._write_lock:
+            self.writer.execute(f"PRAGMA synchronous={mode}")
+            self.synchronous = mode
+
+    @contextlib.contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """
+        Eine Schreibtransaktion: Commit am Ende des Blocks, Rollback bei einer
+        Ausnahme. Verschachtelte Blöcke im selben Thread laufen in der äußeren
+        Transaktion mit.
+        """
+        with self._write_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("registry database is closed")
+            outer = not self.writer.in_transaction
+            try:
+                yield self.writer
+            except BaseException:
+                if outer:
+                    self.writer.rollback()
+                raise
+            if outer:
+                self.writer.commit()
+                self.writes += 1
+
+    @contextlib.contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """Leseverbindung aus dem Pool; wartet, wenn alle vergeben sind."""
+        if self.memory:
+            with self._write_lock:
+                self.reads += 1
+                yield self.writer
+            return
+        conn = self._acquire_reader()
+        try:
+            self.reads += 1
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("registry database is closed")
+            if len(self._all_readers) < self.read_pool_size:
+                conn = self._connect(read_only=True)
+                self._all_readers.append(conn)
+                return conn
+        return self._readers.get()
+
+    def stats(self) -> dict:
+        return {"path": self.db_path, "journal_mode": self.journal_mode,
+                "synchronous": self.synchronous, "writes": self.writes,
+                "reads": self.reads, "read_connections": len(self._all_readers)}
+
+    def close(self) -> None:
+        with self._write_lock, self._pool_lock:
+            if self._closed:
+                return
+            self._closed = True
+            if not self.memory:
+                # Statistiken für den Query-Planer auffrischen, wo sie sich lohnen
+                self.writer.execute("PRAGMA optimize")
+            for conn in self._all_readers:
+                conn.close()
+            self._all_readers.clear()
+            self.writer.close()
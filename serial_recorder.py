@@ -0,0 +1,226 @@
+"""
+Aufzeichnung und Wiedergabe einer seriellen Sitzung.
+
+`SessionRecorder` hängt an einer `SerialBridge` und schreibt jede empfangene Zeile
+(rx, roh, inkl. AT-Antworten) und jedes gesendete Kommando (tx) mit Zeitstempel in
+eine kompakte Binärdatei: Kopf `RFREC1\\n`, danach Records `<QBI` (µs seit Start,
+Richtung, Länge) + Zeile. Endet der Dateiname auf `.gz`, wird gzip-komprimiert.
+
+Wiedergabe (ohne Funkgerät):
+
+  - pty:     `python serial_recorder.py replay aufnahme.rec --speed 10`
+             legt ein Pseudo-Terminal an und gibt dessen Pfad aus; der Server wird
+             dann mit `--port <pfad>` gestartet
+  - loop://: `python server_real_rf_system.py --port loop:// --replay aufnahme.rec`
+             speist die Aufnahme im Serverprozess ein
+
+`--speed` ist ein Faktor (1 = Echtzeit, 10 = zehnfach) oder `max` (ohne Pausen).
+`python serial_recorder.py info aufnahme.rec` zeigt Dauer, Zeilen und Raten.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gzip
+import os
+import struct
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional, Union
+
+MAGIC = b"RFREC1\n"
+RECORD = struct.Struct("<QBI")  # µs seit Aufnahmestart, Richtung, Länge
+
+RX = 0  # vom Gerät empfangen
+TX = 1  # an das Gerät gesendet
+
+# Bei max. Geschwindigkeit alle N Zeilen den Event-Loop bedienen
+YIELD_EVERY = 256
+
+
+def _open(path: str, mode: str) -> BinaryIO:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)  # type: ignore[return-value]
+    return open(path, mode)
+
+
+def parse_speed(value: Union[str, float, None]) -> Optional[float]:
+    """`max`/0 -> None (ohne Pausen), sonst Faktor > 0."""
+    if value is None or str(value).lower() in ("max", "0"):
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise ValueError("speed must be > 0 or 'max'")
+    return speed
+
+
+@dataclass
+class SessionRecord:
+    offset: float  # Sekunden seit Aufnahmestart
+    direction: int
+    data: bytes
+
+
+class SessionRecorder:
+    """Schreibt rx/tx-Zeilen gepuffert in eine Aufnahmedatei."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = _open(path, "wb")
+        self._file.write(MAGIC)
+        self._start = time.perf_counter()
+        self.counts = {RX: 0, TX: 0}
+
+    def record(self, direction: int, data: Union[str, bytes]) -> None:
+        if self._file is None:
+            return
+        if isinstance(data, str):
+            data = data.encode()
+        offset_us = int((time.perf_counter() - self._start) * 1e6)
+        self._file.write(RECORD.pack(offset_us, direction, len(data)))
+        self._file.write(data)
+        self.counts[direction] += 1
+
+    def record_rx(self, line: Union[str, bytes]) -> None:
+        self.record(RX, line)
+
+    def record_tx(self, command: Union[str, bytes]) -> None:
+        self.record(TX, command)
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_session(path: str) -> Iterator[SessionRecord]:
+    """Liest eine Aufnahme; ein abgeschnittener letzter Record wird ignoriert."""
+    with _open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path}: not a session recording")
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                return
+            offset_us, direction, length = RECORD.unpack(head)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield SessionRecord(offset_us / 1e6, direction, data)
+
+
+def session_info(path: str) -> Dict[str, Any]:
+    counts = {RX: 0, TX: 0}
+    size = 0
+    duration = 0.0
+    for record in read_session(path):
+        counts[record.direction] = counts.get(record.direction, 0) + 1
+        size += len(record.data)
+        duration = record.offset
+    return {
+        "path": path,
+        "duration_s": round(duration, 3),
+        "rx_lines": counts[RX],
+        "tx_commands": counts[TX],
+        "payload_bytes": size,
+        "rx_per_s": round(counts[RX] / duration, 1) if duration else 0.0,
+    }
+
+
+async def replay_session(path: str, write: Callable[[bytes], Any],
+                         speed: Optional[float] = 1.0, repeat: int = 1) -> int:
+    """
+    Schreibt alle rx-Zeilen (mit `\\n`) im aufgezeichneten Takt über `write`,
+    `speed=None` ohne Pausen. `repeat=0` wiederholt endlos. Liefert die Zeilenzahl.
+    """
+    loop = asyncio.get_running_loop()
+    sent = 0
+    rounds = 0
+    while repeat == 0 or rounds < repeat:
+        rounds += 1
+        start = loop.time()
+        for record in read_session(path):
+            if record.direction != RX:
+                continue
+            if speed is not None:
+                delay = start + record.offset / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif sent % YIELD_EVERY == 0:
+                await asyncio.sleep(0)
+            write(record.data + b"\n")
+            sent += 1
+    return sent
+
+
+async def replay_to_pty(path: str, speed: Optional[float], repeat: int,
+                        start_delay: float = 0.0) -> int:
+    """Spielt die Aufnahme in ein neues pty; Kommandos des Servers werden mitgelesen."""
+    import tty
+
+    master, slave = os.openpty()
+    tty.setraw(slave)  # kein Echo/Zeilenpuffer, bis der Server den Port selbst konfiguriert
+    print(f"[OK] Replay on {os.ttyname(slave)} (speed {speed or 'max'})", flush=True)
+    loop = asyncio.get_running_loop()
+
+    def drain() -> None:
+        try:
+            data = os.read(master, 65536)
+        except OSError:
+            return
+        for command in data.splitlines():
+            print(f"[TX] {command.decode(errors='replace')}", flush=True)
+
+    loop.add_reader(master, drain)
+
+    def write(data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(master, view):]
+
+    try:
+        await asyncio.sleep(start_delay)
+        return await replay_session(path, write, speed, repeat)
+    finally:
+        loop.remove_reader(master)
+        os.close(master)
+        os.close(slave)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serielle Sitzungen aufzeichnen/abspielen")
+    sub = parser.add_subparsers(dest="command", required=True)
+    info = sub.add_parser("info", help="Kennzahlen einer Aufnahme")
+    info.add_argument("path")
+    replay = sub.add_parser("replay", help="Aufnahme über ein pty abspielen")
+    replay.add_argument("path")
+    replay.add_argument("--speed", default="1", help="Faktor (1 = Echtzeit) oder max")
+    replay.add_argument("--repeat", type=int, default=1, help="Durchläufe (0 = endlos)")
+    replay.add_argument("--start-delay", type=float, default=0.0,
+                        help="Sekunden bis zur ersten Zeile (Zeit zum Starten des Servers)")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        for key, value in session_info(args.path).items():
+            print(f"{key:>12}: {value}")
+        return 0
+    try:
+        speed = parse_speed(args.speed)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        sent = asyncio.run(replay_to_pty(args.path, speed, args.repeat,
+                                         args.start_delay))
+    except KeyboardInterrupt:
+        return 0
+    print(f"[OK] {sent} lines replayed", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Asyncio-nativer Transport für pyserial-Ports.
+
+Ersetzt `serial.threaded.ReaderThread`: gelesen wird nicht-blockierend direkt im
+Event-Loop, es gibt keinen Lesethread und keine Thread-Übergabe pro Zeile.
+Die Schnittstelle zum Protokoll ist dieselbe wie bei `ReaderThread`
+(`connection_made` / `data_received` / `connection_lost`), bestehende
+`serial.threaded.Protocol`-Klassen wie `LineReader` laufen unverändert.
+
+  - Ports mit Dateideskriptor (POSIX-TTYs, ptys): `loop.add_reader()` + `os.read()`
+  - Ports ohne Deskriptor (`loop://`, Windows-COM-Ports): Polling über `in_waiting`
+
+Ein unerwarteter Abbruch (Gerät abgezogen) wird nach `connection_lost()` zusätzlich
+an `on_lost` gemeldet, damit der Besitzer den Port neu öffnen kann.
+"""
+from __future__ import annotations
+
+import asyncio
+import io
+import os
+import sys
+from typing import Callable, Optional
+
+import serial
+import serial.threaded
+
+
+class AsyncSerialTransport:
+    """Liest einen geöffneten `serial.Serial` im Event-Loop und speist ein Protokoll."""
+
+    def __init__(self, ser: serial.SerialBase,
+                 protocol_factory: Callable[[], serial.threaded.Protocol],
+                 read_size: int = 65536, poll_interval: float = 0.002,
+                 on_lost: Optional[Callable[[BaseException], None]] = None):
+        self.serial = ser
+        self.on_lost = on_lost
+        self.protocol_factory = protocol_factory
+        self.protocol: Optional[serial.threaded.Protocol] = None
+        self.read_size = read_size
+        self.poll_interval = poll_interval
+        self.alive = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._fd: Optional[int] = None
+        self._poll_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Startet das Lesen; muss aus dem laufenden Event-Loop aufgerufen werden."""
+        self._loop = asyncio.get_running_loop()
+        # Nicht-blockierende Reads: read() liefert nur, was bereits anliegt.
+        self.serial.timeout = 0
+        self.alive = True
+        self.protocol = self.protocol_factory()
+        self.protocol.connection_made(self)
+
+        fd = self._fileno()
+        if fd is not None:
+            try:
+                self._loop.add_reader(fd, self._on_readable)
+                self._fd = fd
+                return
+            except (NotImplementedError, ValueError, OSError):
+                pass
+        self._poll_task = self._loop.create_task(self._poll())
+
+    def _fileno(self) -> Optional[int]:
+        try:
+            fd = self.serial.fileno()
+        except (AttributeError, io.UnsupportedOperation, serial.SerialException):
+            return None
+        return fd if isinstance(fd, int) and fd >= 0 else None
+
+    def _on_readable(self) -> None:
+        try:
+            data = os.read(self._fd, self.read_size)  # type: ignore[arg-type]
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._lost(e)
+            return
+        if not data:
+            # Lesbar, aber keine Daten: Gerät wurde getrennt
+            self._lost(serial.SerialException("device disconnected"))
+            return
+        self._feed(data)
+
+    async def _poll(self) -> None:
+        ser = self.serial
+        try:
+            while self.alive:
+                waiting = ser.in_waiting
+                if waiting:
+                    data = ser.read(min(waiting, self.read_size))
+                    if data:
+                        self._feed(data)
+                        await asyncio.sleep(0)
+                        continue
+                await asyncio.sleep(self.poll_interval)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self._lost(e)
+
+    def _feed(self, data: bytes) -> None:
+        try:
+            self.protocol.data_received(data)  # type: ignore[union-attr]
+        except Exception as e:
+            print(f"[WARN] Protocol error on {self.serial.port}: {e}", file=sys.stderr)
+
+    def _lost(self, exc: Optional[BaseException]) -> None:
+        if not self.alive:
+            return
+        self._stop_reading()
+        protocol, self.protocol = self.protocol, None
+        if protocol is not None:
+            try:
+                protocol.connection_lost(exc)
+            except Exception as e:
+                print(f"[ERR] Serial connection lost: {e}", file=sys.stderr)
+        if exc is not None and self.on_lost is not None:
+            self.on_lost(exc)
+
+    def abort(self, exc: BaseException) -> None:
+        """Meldet einen Abbruch, der außerhalb des Lesens bemerkt wurde (z.B. beim Schreiben)."""
+        self._lost(exc)
+
+    def _stop_reading(self) -> None:
+        self.alive = False
+        if self._fd is not None and self._loop is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+
+    def write(self, data: bytes) -> int:
+        return self.serial.write(data)
+
+    def close(self) -> None:
+        self._lost(None)
+        self.serial.close()
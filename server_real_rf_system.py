@@ -5,109 +5,948 @@ Funktionen:
   - Liest Telemetrie vom seriellen Port (115200 Baud) und streamt sie als JSON-Zeilen.
   - Stellt einen WebSocket-Endpunkt bereit (ws://localhost:8765/telemetry):
       * sendet jede eingehende Zeile (bereits JSON vom Gerät) an alle Clients
+        (Fan-out über `TelemetryHub`, eigener Ringpuffer pro Client)
       * akzeptiert {"cmds": ["AT+...", ...]} und schreibt sie 1:1 zur seriellen Schnittstelle
+      * {"get": "stats"} liefert Lag-/Drop-Zähler aller Clients
+      * {"batch": {"ms": 50, "kb": 64}} schaltet für diese Verbindung Batching ein:
+        Zeilen werden als JSON-Array gesendet, sobald das Zeitfenster abläuft oder
+        die Größe erreicht ist (was zuerst eintritt); {"batch": false} schaltet ab
+      * {"rate": 5} begrenzt die Verbindung auf höchstens 5 Updates/s pro Gerät:
+        der Server hält nur den neuesten Wert je Gerät und sendet ihn im Takt
+        (ein überlasteter Client bekommt frische Daten statt eines Rückstaus);
+        {"rate": null} schaltet ab
+      * {"encoding": "msgpack"|"cbor"|"struct"|"json"} wählt das Wire-Format;
+        {"get": "schemas"} liefert die Schema-Registry (`--schemas schemas.json`)
+        und die verfügbaren Kodierungen. Kodiert wird einmal pro Zeile, nicht pro Client.
+      * {"encoding": "delta"} sendet pro Gerät Keyframes (alle `--delta-keyframe`
+        Zeilen) und dazwischen nur geänderte Felder; zusammen mit permessage-deflate
+        (`--deflate-window-bits`, `--deflate-mem-level`, `--no-deflate`) für
+        Konsolen im Mobilfunknetz. Zustand pro Client; erneutes
+        {"encoding": "delta"}, {"resume": ...} und {"subscribe": ...} erzwingen Keyframes.
+  - Mehrere Ports in einem Prozess: `--port funk1=/dev/ttyUSB0 --port funk2=/dev/ttyUSB1`.
+    Jeder Port ist ein Topic; bei mehr als einem Port tragen Zeilen das Feld "topic".
+      * {"subscribe": ["funk1"]} begrenzt den Stream auf diese Topics ({"subscribe": null}: alle)
+      * {"filter": "rssi < -90 and device == \"sx1276_001\""} filtert serverseitig
+        über Telemetriefelder, bevor eine Zeile in den Client-Puffer kommt
+        ({"filter": null}: aus; Syntax siehe `telemetry_filter.py`)
+      * {"topic": "funk2", "cmds": [...]} schreibt auf den benannten Port
+        (ohne "topic" nur zulässig, wenn genau ein Port konfiguriert ist)
+  - AT-Kommandos mit Antwort: {"at": ["AT+CSQ", ...], "id": 1} läuft über die
+    `ATCommandEngine` des Ports (Pipelining/Timeouts per `--at-pipeline`/`--at-timeout`,
+    Abschluss CR nach V.250, `--at-crlf` für CR LF)
+    und wird mit {"id": 1, "at": [{"cmd", "status", "lines", "ms"}, ...]} beantwortet.
+    Nicht-JSON-Zeilen vom Gerät gehen an die Engine; URCs als {"urc": "..."} an alle.
+    {"cmds": [...]} bleibt fire-and-forget.
+  - Alle Kommandos laufen über den `CommandScheduler` des Ports (Spuren safety,
+    interactive, bulk): {"cmds": [...], "priority": "bulk"}; PTT/TX-Stop-Kommandos
+    gehen immer über safety. {"cancel": "bulk"} verwirft noch wartende Bulk-Arbeit.
+    Ratenlimits per `--lane-rate bulk=50`; Wartezeiten pro Spur in {"get": "stats"}.
+  - Zustands-Snapshot: jede Zeile wird pro Gerät feldweise in einen Gesamtzustand
+    gemischt. Neue Clients erhalten {"state": {...}} als erste Nachricht,
+    {"get": "state"} liefert ihn aus einem vorserialisierten Cache (`--no-state` schaltet ab,
+    `--passthrough` ebenfalls, weil der Zustand jede Zeile parsen müsste).
+  - Sequenznummern: jede Zeile trägt das Feld "seq" (monoton, über alle Ports), die
+    letzten `--history` Zeilen bleiben im Speicher. Nach einem Reconnect liefert
+    `ws://.../telemetry?resume=<seq>` oder {"resume": <seq>} die verpasste Lücke nach
+    ({"resumed": {...}}, danach die Zeilen); liegt sie nicht mehr im Ring, kommt
+    {"gap": {...}} und der Client sollte sich per Zustands-Snapshot neu aufsetzen.
+  - Rollierende Aggregate (`--agg-windows 1,10,60`; `--no-aggregates` und
+    `--passthrough` schalten ab): min/max/mean/count je Gerät und numerischem Feld,
+    O(1) pro Zeile.
+    {"aggregate": {"ms": 1000, "devices": [...], "fields": ["rssi"], "windows": ["10s"]}}
+    sendet alle `ms` {"agg": {Gerät: {Feld: {"10s": {...}}}}, "t": ...} statt der
+    Rohzeilen ("raw": true liefert beides); {"aggregate": null} schaltet ab,
+    {"get": "aggregates"} liefert einmalig alle Aggregate.
+  - Telemetrie-Log auf der Platte (`--log-dir`): segmentiert, mit Zeitindex und
+    Aufbewahrung nach Größe/Alter (`--log-retention-mb`, `--log-retention-hours`).
+    {"query": {"from": t1, "to": t2, "device": "sx1276_001", "fields": ["rssi"]}, "id": 1}
+    streamt den Bereich als {"id": 1, "rows": [[t, ...], ...]} in Blöcken zurück,
+    abgeschlossen durch {"id": 1, "done": true, "count": n} (Zeiten in s seit Epoch).
+  - `--record sitzung.rec` zeichnet empfangene Zeilen und gesendete Kommandos mit
+    Zeitstempel auf; `--port loop:// --replay sitzung.rec --replay-speed 10` spielt
+    eine Aufnahme ohne Hardware wieder ein (siehe `serial_recorder.py`).
+  - `--passthrough`: Zeilen bleiben vom seriellen Puffer bis zum Socket `bytes`
+    (kein decode/json.loads/encode); geprüft wird nur strukturell
+    (ausgeglichene Klammern, gültiges UTF-8), `--validate full` erzwingt json.loads.
+    Zustands-Snapshot und Aggregate sind dann aus; geparst wird nur noch für Clients, die es
+    selbst anfordern (Filter, Binär- und Delta-Encoding).
+  - Hot-Plug: verschwindet das USB-Gerät, bleiben die WebSocket-Clients verbunden und
+    bekommen {"serial": {"topic", "status": "disconnected", "error"}}; der Port wird
+    mit Backoff (bis `--reconnect-max` s) neu geöffnet, danach folgt
+    {"serial": {"status": "connected", "downtime_ms", "attempts"}}. Wartende Kommandos
+    bleiben im Scheduler erhalten; AT-Anfragen dagegen werden sofort mit Status
+    "ABORTED: ..." beantwortet, statt bis zu ihrem Timeout zu warten. Ausfälle und
+    Reconnect-Zeiten in {"get": "stats"}.
+  - HTTP im selben Event-Loop (`--http-port 8000`, 0 = aus): `/health` (200, solange
+    alle Ports verbunden sind, sonst 503) und `/metrics` für Prometheus (Zeilen
+    empfangen/gesendet inkl. Raten, Parse-Fehler, Queue-Tiefe pro Client,
+    Kommando-/AT-Latenzen, serielle Reconnects; siehe `telemetry_metrics.py`).
+    Ist der Port belegt, läuft der WebSocket-Server mit einer Warnung ohne HTTP weiter.
+  - `--workers N`: der Hauptprozess besitzt die seriellen Ports und schreibt jede
+    Zeile einmal in einen Shared-Memory-Ring (`shm_ring.py`, `--shm-mb`); N Worker-
+    Prozesse lesen ihn unabhängig und bedienen WebSocket-Clients auf demselben Port
+    (`SO_REUSEPORT`, nur Linux/BSD). {"cmds": [...]} geht per Queue an den
+    Hauptprozess; {"at": ...}, {"cancel": ...} und {"query": ...} gibt es nur ohne Worker.
   - Optional: Wenn kein serielles Gerät verfügbar ist, beendet sich der Prozess mit Fehler (kein Dummy).
 
 Abhängigkeiten: `pip install pyserial websockets` (für asyncio reicht Standard-Bibliothek)
 
+Der serielle Port wird ohne Lesethread direkt im Event-Loop gelesen
+(`serial_transport.AsyncSerialTransport`); `--port` akzeptiert auch pyserial-URLs
+wie `loop://` oder einen pty-Pfad, z.B. für Benchmarks ohne Hardware.
+
 Start: `python server_real_rf_system.py --port /dev/ttyUSB0` (Windows z.B. `COM5`)
 """
 from __future__ import annotations
 
 import argparse
 import asyncio
+import collections
+import contextlib
+import functools
+import inspect
 import json
+import multiprocessing
+import os
+import queue
+import re
+import signal
+import socket
 import sys
-from typing import Set
+import time
+import urllib.parse
+from dataclasses import dataclass
+from typing import (Any, Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple,
+                    Union)
 
 import serial
 import serial.threaded
 import websockets
 
+from at_command_engine import ATCommandEngine
+from command_scheduler import CommandScheduler, Priority, parse_rates
+from serial_recorder import SessionRecorder, parse_speed, replay_session
+from serial_transport import AsyncSerialTransport
+from shm_ring import RingReader, SharedRing
+from telemetry_aggregate import RollingAggregates
+from telemetry_codec import (ENCODING_DELTA, ENCODING_JSON, ENCODINGS, DeltaEncoder,
+                             SchemaRegistry, TelemetryFrame, available_encodings,
+                             encode_batch, seq_field, tag_line, topic_field)
+from telemetry_filter import FilterError, Predicate, compile_filter, frame_predicate
+from telemetry_hub import ClientQueue, ReplayRing, SlowConsumerPolicy, TelemetryHub
+from telemetry_log import TelemetryLog
+from telemetry_metrics import (PROMETHEUS_CONTENT_TYPE, Metrics, health, render_metrics,
+                               serve_http)
+from telemetry_state import TelemetryState
+
+
+Line = Union[str, bytes]
+
+VALIDATE_FULL = "full"
+VALIDATE_STRUCTURAL = "structural"
+
+
+def is_json_line(line: bytes) -> bool:
+    """Vollständige Prüfung per json.loads."""
+    try:
+        json.loads(line)
+    except Exception:
+        return False
+    return True
+
+
+def looks_like_json(line: bytes) -> bool:
+    """
+    Billige Strukturprüfung für Telemetriezeilen: Objekt/Array mit ausgeglichenen
+    Klammern und gültigem UTF-8. Alles, was hier nicht eindeutig durchgeht
+    (z.B. Klammern in Strings), wird vollständig geparst.
+    """
+    first, last = line[:1], line[-1:]
+    if not ((first == b"{" and last == b"}") or (first == b"[" and last == b"]")):
+        return is_json_line(line)
+    if line.count(b"{") != line.count(b"}") or line.count(b"[") != line.count(b"]"):
+        return is_json_line(line)
+    if not line.isascii():
+        try:
+            line.decode("utf-8")
+        except UnicodeDecodeError:
+            return False
+    return True
+
 
 class LineReader(serial.threaded.LineReader):
     TERMINATOR = b"\n"
 
-    def __init__(self, on_line):
+    def __init__(self, on_line, passthrough: bool = False, validate: Optional[str] = None,
+                 on_other: Optional[Callable[[str], None]] = None,
+                 on_raw: Optional[Callable[[bytes], None]] = None):
         super().__init__()
         self.on_line = on_line
+        self.on_other = on_other  # Nicht-JSON-Zeilen, z.B. AT-Antworten
+        self.on_raw = on_raw  # jede Zeile ungeprüft, z.B. für die Aufzeichnung
+        self.passthrough = passthrough
+        if validate is None:
+            validate = VALIDATE_STRUCTURAL if passthrough else VALIDATE_FULL
+        self.check = looks_like_json if validate == VALIDATE_STRUCTURAL else is_json_line
+
+    def data_received(self, data: bytes) -> None:
+        # Zeilen direkt im Empfangspuffer zerlegen; ein Slice pro Zeile, kein Umkopieren
+        buf = self.buffer
+        if buf:
+            buf.extend(data)
+            data = bytes(buf)
+            buf.clear()
+        term = self.TERMINATOR
+        start = 0
+        while True:
+            end = data.find(term, start)
+            if end < 0:
+                break
+            self.handle_packet(data[start:end])
+            start = end + len(term)
+        if start < len(data):
+            buf.extend(memoryview(data)[start:])
+
+    def handle_packet(self, packet: bytes) -> None:
+        if self.on_raw is not None:
+            self.on_raw(packet)
+        if not self.passthrough:
+            super().handle_packet(packet)
+            return
+        packet = packet.strip()
+        if packet and self.check(packet):
+            self.on_line(packet)
+        elif packet and self.on_other is not None:
+            self.on_other(packet.decode(self.ENCODING, self.UNICODE_HANDLING))
 
     def handle_line(self, line: str) -> None:
-        # Erwartet gültiges JSON pro Zeile; ungültige Zeilen werden verworfen.
+        # Erwartet gültiges JSON pro Zeile; andere Zeilen gehen an on_other oder werden verworfen.
         try:
             json.loads(line)
         except Exception:
+            if self.on_other is not None:
+                self.on_other(line)
             return
         self.on_line(line)
 
 
+def text_sender(ws) -> Callable[[Line], Any]:
+    """
+    Liefert eine send-Funktion, die auch `bytes` als Text-Frame verschickt.
+    websockets >= 13 kann das ohne Umkodieren (`text=True`), ältere Versionen
+    bekommen einen dekodierten String.
+    """
+    if "text" in inspect.signature(ws.send).parameters:
+        def send(line: Line):
+            return ws.send(line, text=True)
+    else:
+        def send(line: Line):
+            return ws.send(line.decode() if isinstance(line, bytes) else line)
+    return send
+
+
 class SerialBridge:
-    def __init__(self, port: str, baud: int = 115200):
+    def __init__(self, port: str, baud: int = 115200,
+                 on_line: Optional[Callable[[Line], None]] = None,
+                 passthrough: bool = False, validate: Optional[str] = None,
+                 topic: Optional[str] = None, at_pipeline: int = 1, at_timeout: float = 1.0,
+                 at_terminator: str = "\r",
+                 lane_rates: Optional[Dict[Priority, Optional[float]]] = None,
+                 recorder: Optional[SessionRecorder] = None,
+                 reconnect_min: float = 0.25, reconnect_max: float = 10.0):
         self.port_name = port
+        self.topic = topic or port
         self.baud = baud
+        self.passthrough = passthrough
+        self.validate = validate
         self.ser = None
-        self.transport = None
-        self.queue: asyncio.Queue[str] = asyncio.Queue()
+        self.transport: Optional[AsyncSerialTransport] = None
+        self.on_line = on_line
+        self.recorder = recorder
+        self.queue: asyncio.Queue[Line] = asyncio.Queue()
+        self.scheduler = CommandScheduler(self.write_line, lane_rates)
+        self.at = ATCommandEngine(self._write_at, pipeline_depth=at_pipeline,
+                                  timeout=at_timeout, on_urc=self._on_urc,
+                                  deferred_write=True, terminator=at_terminator)
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.connected = False
+        self.disconnects = 0
+        self.rejected = 0  # Zeilen ohne gültiges JSON (AT-Antworten, Störungen)
+        self.reconnect_times: Deque[float] = collections.deque(maxlen=100)
+        self._down_since: Optional[float] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def _emit(self, message: Dict[str, Any]) -> None:
+        # Als JSON-Telemetrie an die Clients weiterreichen (bekommt seq, landet im Log)
+        if self.on_line is None:
+            return
+        msg = json.dumps(message)
+        self.on_line(msg.encode() if self.passthrough else msg)
+
+    def _on_other(self, line: str) -> None:
+        self.rejected += 1
+        self.at.feed_line(line)
+
+    def _on_urc(self, line: str) -> None:
+        self._emit({"urc": line})
+
+    def _status(self, status: str, **info: Any) -> None:
+        self._emit({"serial": dict(topic=self.topic, status=status, **info)})
 
     def open(self):
+        """Öffnet den Port und startet das Lesen im laufenden Event-Loop."""
         try:
-            self.ser = serial.serial_for_url(self.port_name, self.baud, timeout=1)
+            self._connect()
         except Exception as e:
             print(f"[ERR] Serial open failed: {e}", file=sys.stderr)
             raise
+        self.scheduler.start()
+
+    def _connect(self) -> None:
+        self.ser = serial.serial_for_url(self.port_name, self.baud, timeout=0)
+        # Zeilen kommen bereits im Event-Loop an: direkt zustellen, kein Thread-Hop
+        on_line = self.on_line or self.queue.put_nowait
+        on_raw = self.recorder.record_rx if self.recorder is not None else None
+        self.transport = AsyncSerialTransport(
+            self.ser,
+            lambda: LineReader(on_line, self.passthrough, self.validate, self._on_other,
+                               on_raw),
+            on_lost=self._on_lost)
+        self.transport.start()
+        self.connected = True
+
+    def _on_lost(self, exc: BaseException) -> None:
+        """
+        Gerät weg: Scheduler anhalten (Kommandos bleiben liegen), Clients informieren.
+        Wartende AT-Anfragen scheitern sofort; ihre Antworten kämen nie an.
+        """
+        if self._closing or not self.connected:
+            return
+        self.connected = False
+        self.disconnects += 1
+        self._down_since = time.perf_counter()
+        self.scheduler.stop()
+        lost = ConnectionError(f"serial {self.port_name} lost: {exc}")
+        self.at.fail_all(lost)
+        self.scheduler.abandon(lost)
+        with contextlib.suppress(Exception):
+            self.ser.close()
+        print(f"[WARN] Serial {self.port_name} lost ({exc}), reconnecting", file=sys.stderr)
+        self._status("disconnected", error=str(exc))
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
 
-        def on_line(line: str):
-            # Push line (already validated JSON) to asyncio queue
+    async def _reconnect(self) -> None:
+        delay = self.reconnect_min
+        attempts = 0
+        while True:
+            await asyncio.sleep(delay)
+            attempts += 1
             try:
-                self.queue.put_nowait(line)
-            except asyncio.QueueFull:
-                pass
+                self._connect()
+                break
+            except Exception:
+                delay = min(delay * 2, self.reconnect_max)
+        downtime = time.perf_counter() - self._down_since  # type: ignore[operator]
+        self._down_since = None
+        self._reconnect_task = None
+        self.reconnect_times.append(downtime)
+        self.scheduler.start()
+        print(f"[OK] Serial {self.port_name} back after {downtime:.2f}s ({attempts} attempts)")
+        self._status("connected", downtime_ms=round(downtime * 1000.0, 1), attempts=attempts)
+
+    def submit(self, command: str, priority: Optional[Priority] = None) -> Priority:
+        """Reiht ein Kommando im Scheduler ein (nicht blockierend)."""
+        return self.scheduler.submit(command, priority)
+
+    def _write_at(self, command: str, on_written: Callable[[Optional[BaseException]], None]):
+        # AT-Anfragen warten nicht auf den Reconnect: ohne Port gibt es keine Antwort
+        if not self.connected:
+            raise ConnectionError(f"serial {self.port_name} not connected")
+        self.scheduler.submit(command, on_written=on_written)
+
+    def link_stats(self) -> Dict[str, Any]:
+        times = sorted(self.reconnect_times)
+        down = self._down_since
+        return {
+            "connected": self.connected,
+            "disconnects": self.disconnects,
+            "reconnects": len(times),
+            "last_reconnect_ms": round(self.reconnect_times[-1] * 1000.0, 1) if times else None,
+            "max_reconnect_ms": round(times[-1] * 1000.0, 1) if times else None,
+            "down_ms": round((time.perf_counter() - down) * 1000.0, 1) if down else None,
+        }
 
-        self.transport = serial.threaded.ReaderThread(self.ser, lambda: LineReader(on_line))
-        self.transport.start()  # type: ignore
+    def stats(self) -> Dict[str, Any]:
+        return {"at": self.at.stats(), "lanes": self.scheduler.stats(),
+                "link": self.link_stats(), "rejected": self.rejected}
 
     def close(self):
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        self.scheduler.stop()
         try:
             if self.transport:
-                self.transport.close()  # type: ignore
+                self.transport.close()
         finally:
             if self.ser and self.ser.is_open:
                 self.ser.close()
+            if self.recorder is not None:
+                self.recorder.close()
 
     def write_line(self, s: str):
-        if not self.ser or not self.ser.is_open:
-            raise RuntimeError("serial not open")
-        data = (s.rstrip("\n") + "\n").encode()
-        self.ser.write(data)
+        """Schreibt eine Zeile mit LF; endet sie schon auf CR (AT-Engine), unverändert."""
+        if not self.connected or not self.ser or not self.ser.is_open:
+            raise ConnectionError("serial not open")
+        data = (s if s.endswith("\r") else s.rstrip("\n") + "\n").encode()
+        try:
+            self.ser.write(data)
+        except (serial.SerialException, OSError) as e:
+            # Abgezogen, bevor der Lesepfad es bemerkt hat: Kommando bleibt im Scheduler
+            self.transport.abort(e)  # type: ignore[union-attr]
+            raise ConnectionError(str(e)) from e
+        if self.recorder is not None:
+            self.recorder.record_tx(data.rstrip(b"\r\n"))
+
+
+class RemoteBridge:
+    """
+    Port aus Sicht eines Worker-Prozesses: Kommandos gehen per Queue an den
+    Prozess, der den seriellen Port besitzt. AT-Engine und Scheduler gibt es nur dort.
+    """
+    at = None
+    scheduler = None
+
+    def __init__(self, topic: str, commands: Any):
+        self.topic = topic
+        self.commands = commands
+
+    def submit(self, command: str, priority: Optional[Priority] = None) -> Optional[Priority]:
+        self.commands.put((self.topic, command, priority))
+        return priority
+
+    def stats(self) -> Dict[str, Any]:
+        return {"worker": os.getpid()}
+
+
+def join_batch(lines: List[Line]) -> Line:
+    """Fügt bereits serialisierte JSON-Zeilen ohne Re-Parse zu einem Array zusammen."""
+    if isinstance(lines[0], bytes):
+        return b"[" + b",".join(lines) + b"]"  # type: ignore[arg-type]
+    return "[" + ",".join(lines) + "]"  # type: ignore[arg-type]
+
+
+class ClientRequestError(ValueError):
+    """Ungültige Client-Option; wird dem Client als {"error": ...} gemeldet."""
+
+
+@dataclass
+class ClientSession:
+    """Pro-Verbindung einstellbare Optionen eines WebSocket-Clients."""
+    batch_ms: Optional[float] = None  # None: jede Zeile als eigener Frame
+    batch_bytes: int = 64 * 1024
+    encoding: str = ENCODING_JSON
+    topics: Optional[Set[str]] = None  # None: alle Topics
+    where: Optional[Predicate] = None  # kompilierter Feldfilter, None: alle Zeilen
+    rate_hz: Optional[float] = None  # Updates/s pro Gerät, None: jede Zeile
+    delta: Optional[DeltaEncoder] = None  # nur bei encoding=delta
+    agg_ms: Optional[float] = None  # Intervall für {"agg": ...}, None: keine Aggregate
+    agg_devices: Optional[Set[str]] = None
+    agg_fields: Optional[Set[str]] = None
+    agg_windows: Optional[Set[str]] = None
+    raw: bool = True  # False: nur Aggregate, Rohzeilen belegen keinen Puffer
+
+    def configure_topics(self, topics: Any, known: Set[str]) -> None:
+        if topics is None or topics == "*":
+            self.topics = None
+            return
+        if isinstance(topics, str):
+            topics = [topics]
+        if not isinstance(topics, list) or not all(isinstance(t, str) for t in topics):
+            raise ClientRequestError("subscribe must be a list of topics")
+        unknown = set(topics) - known
+        if unknown:
+            raise ClientRequestError(f"unknown topics: {sorted(unknown)}")
+        self.topics = set(topics)
+
+    def resync_delta(self) -> None:
+        """
+        Nach Resume oder neuem Abo: nächste Zeile jedes Geräts als Keyframe, damit
+        der Client nicht auf einem veralteten oder verworfenen Stand weiterrechnet.
+        """
+        if self.delta is not None:
+            self.delta.reset()
+
+    def configure_filter(self, expression: Any) -> None:
+        if expression is None or expression == "":
+            self.where = None
+            return
+        if not isinstance(expression, str):
+            raise ClientRequestError("filter must be an expression string")
+        try:
+            self.where = compile_filter(expression)
+        except FilterError as e:
+            raise ClientRequestError(str(e)) from None
+
+    def configure_aggregate(self, spec: Any, windows: Sequence[str]) -> None:
+        if not spec:
+            self.agg_ms = None
+            self.raw = True
+            return
+        if spec is True:
+            spec = {}
+        if not isinstance(spec, dict):
+            raise ClientRequestError("aggregate must be an object, true or null")
+        try:
+            ms = float(spec.get("ms", 1000))
+        except (TypeError, ValueError):
+            raise ClientRequestError("aggregate ms must be a number") from None
+        if not 100 <= ms <= 60000:
+            raise ClientRequestError("aggregate interval out of range (ms 100..60000)")
+        names = {}
+        for key in ("devices", "fields", "windows"):
+            value = spec.get(key)
+            if isinstance(value, str):
+                value = [value]
+            if value is not None and not (isinstance(value, list)
+                                          and all(isinstance(v, str) for v in value)):
+                raise ClientRequestError(f"aggregate {key} must be a list of names")
+            names[key] = set(value) if value is not None else None
+        unknown = (names["windows"] or set()) - set(windows)
+        if unknown:
+            raise ClientRequestError(f"unknown windows: {sorted(unknown)}, one of {list(windows)}")
+        self.agg_ms = ms
+        self.agg_devices, self.agg_fields, self.agg_windows = (
+            names["devices"], names["fields"], names["windows"])
+        self.raw = bool(spec.get("raw", False))
+
+    def build_filter(self) -> Optional[Callable[[Any], bool]]:
+        """Prädikat, das der Hub vor dem Einreihen einer Zeile auswertet."""
+        if not self.raw:
+            return lambda frame: False
+        topics = self.topics
+        where = frame_predicate(self.where) if self.where is not None else None
+        if topics is None:
+            return where
+        if where is None:
+            return lambda frame: frame.topic in topics
+        # Topic zuerst: billig und ohne JSON-Parse
+        return lambda frame: frame.topic in topics and where(frame)
+
+    def configure_batch(self, spec: Any) -> None:
+        if not spec:
+            self.batch_ms = None
+            return
+        if spec is True:
+            spec = {}
+        if not isinstance(spec, dict):
+            raise ClientRequestError("batch must be an object, true or false")
+        ms = float(spec.get("ms", 100))
+        kb = float(spec.get("kb", 64))
+        if not 0 < ms <= 60000 or not 0 < kb <= 16384:
+            raise ClientRequestError("batch window out of range (ms 0..60000, kb 0..16384)")
+        self.batch_ms = ms
+        self.batch_bytes = int(kb * 1024)
+
+    def configure_rate(self, spec: Any) -> None:
+        if spec is None or spec is False or spec == 0:
+            self.rate_hz = None
+            return
+        if isinstance(spec, dict):
+            spec = spec.get("hz")
+        if isinstance(spec, bool) or not isinstance(spec, (int, float)):
+            raise ClientRequestError("rate must be updates per second (number) or null")
+        if not 0 < spec <= 1000:
+            raise ClientRequestError("rate out of range (0..1000 Hz)")
+        self.rate_hz = float(spec)
+
+    def configure_encoding(self, encoding: Any, keyframe_interval: int = 100) -> None:
+        if encoding not in ENCODINGS:
+            raise ClientRequestError(f"unknown encoding: {encoding!r}")
+        if encoding not in available_encodings():
+            raise ClientRequestError(f"encoding not available on this server: {encoding}")
+        self.encoding = encoding
+        # Neuer Encoder auch bei erneutem "delta": der Client setzt mit Keyframes neu auf
+        self.delta = DeltaEncoder(keyframe_interval) if encoding == ENCODING_DELTA else None
+
+
+def render_frames(frames: List[TelemetryFrame], session: ClientSession,
+                  registry: Optional[SchemaRegistry] = None) -> List[Tuple[Line, bool]]:
+    """
+    Wandelt Frames in zu sendende Nachrichten `(payload, binary)`. Bei Binärformaten
+    gehen Zeilen, die sich nicht kodieren lassen, als JSON-Text hinterher.
+    """
+    batched = session.batch_ms is not None
+    if session.encoding == ENCODING_JSON:
+        raws = [f.raw for f in frames]
+        return [(join_batch(raws) if batched else raws[0], False)]
+    if session.delta is not None:
+        lines = [session.delta.encode(f) for f in frames]
+        return [(join_batch(lines) if batched else lines[0], False)]
+    binary: List[bytes] = []
+    text: List[Line] = []
+    for frame in frames:
+        encoded = frame.encode(session.encoding, registry)
+        if encoded is None:
+            text.append(frame.raw)
+        else:
+            binary.append(encoded)
+    messages: List[Tuple[Line, bool]] = []
+    if binary:
+        messages.append((encode_batch(session.encoding, binary) if batched else binary[0], True))
+    if text:
+        messages.append((join_batch(text) if batched else text[0], False))
+    return messages
+
+
+async def collect_batch(client: ClientQueue, session: ClientSession, first: Any) -> List[Any]:
+    """Sammelt ab `first` Zeilen, bis das Zeitfenster abläuft oder die Größe erreicht ist."""
+    batch = [first]
+    size = len(first)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + session.batch_ms / 1000.0  # type: ignore[operator]
+    while size < session.batch_bytes:
+        line = client.get_nowait()
+        if line is not None:
+            batch.append(line)
+            size += len(line)
+            continue
+        remaining = deadline - loop.time()
+        if remaining <= 0 or not await client.wait(remaining):
+            break
+    return batch
+
+
+def frame_device_key(frame: TelemetryFrame) -> str:
+    """Schlüssel für {"rate": ...}: Gerät aus der Zeile, sonst das Topic."""
+    return TelemetryState.device_key(frame.data or {}, frame.topic)
+
+
+async def collect_latest(client: ClientQueue, session: ClientSession,
+                         last_flush: float) -> Optional[List[Any]]:
+    """
+    Wartet auf Daten und den nächsten Takt (`last_flush` + 1/rate) und liefert dann
+    den neuesten Wert je Gerät. None, sobald der Client geschlossen ist.
+    """
+    if not await client.wait():
+        return None if client.closed else []
+    interval = 1.0 / session.rate_hz  # type: ignore[operator]
+    delay = last_flush + interval - asyncio.get_running_loop().time()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    return client.drain()
+
 
+async def run_aggregates(send: Callable[[Line], Any], aggregates: RollingAggregates,
+                         session: ClientSession) -> None:
+    """Sendet im Intervall des Clients dessen Ausschnitt der Aggregate."""
+    with contextlib.suppress(websockets.exceptions.ConnectionClosed):
+        while session.agg_ms is not None:
+            await asyncio.sleep(session.agg_ms / 1000.0)
+            await send(aggregates.message(session.agg_devices, session.agg_fields,
+                                          session.agg_windows))
 
-async def ws_server(bridge: SerialBridge, host: str, port: int):
+
+def select_bridge(bridges: Dict[str, SerialBridge], topic: Any) -> SerialBridge:
+    """Ziel-Port für {"cmds": ...}; ohne Topic nur eindeutig bei genau einem Port."""
+    if topic is None:
+        if len(bridges) == 1:
+            return next(iter(bridges.values()))
+        raise ClientRequestError(f"topic required, one of {sorted(bridges)}")
+    try:
+        return bridges[topic]
+    except (KeyError, TypeError):
+        raise ClientRequestError(f"unknown topic: {topic!r}") from None
+
+
+def parse_priority(value: Any) -> Priority:
+    try:
+        return Priority.parse(value)
+    except ValueError as e:
+        raise ClientRequestError(str(e)) from None
+
+
+async def run_at_commands(ws, bridge: SerialBridge, commands: List[Any],
+                          request_id: Any = None, timeout: Optional[float] = None) -> None:
+    """Führt {"at": [...]} über die Engine des Ports aus und sendet alle Antworten zurück."""
+    commands = [c for c in commands if isinstance(c, str) and c]
+    responses = await bridge.at.send_many(commands, timeout)
+    reply = {"at": [r.to_dict() for r in responses], "topic": bridge.topic}
+    if request_id is not None:
+        reply["id"] = request_id
+    with contextlib.suppress(websockets.exceptions.ConnectionClosed):
+        await ws.send(json.dumps(reply))
+
+
+def request_path(ws, path: Optional[str] = None) -> str:
+    """Request-Pfad inkl. Query (neue und Legacy-API von websockets)."""
+    if path is None:
+        request = getattr(ws, "request", None)
+        path = getattr(request, "path", None) or getattr(ws, "path", None)
+    return path or ""
+
+
+def resume_client(client: ClientQueue, ring: Optional[ReplayRing], after: Any) -> Dict[str, Any]:
+    """Liefert die Lücke nach `after` aus dem Ring nach oder meldet sie als zu groß."""
+    if ring is None:
+        raise ClientRequestError("resume not available on this server (--history 0)")
+    try:
+        after = int(after)
+    except (TypeError, ValueError):
+        raise ClientRequestError("resume must be a sequence number") from None
+    frames = ring.since(after)
+    if frames is None:
+        return {"gap": {"after": after, "first": ring.first_seq, "last": ring.last_seq,
+                        "reason": "too_large"}}
+    count = client.replay(frames)
+    return {"resumed": {"after": after, "last": ring.last_seq, "count": count}}
+
+
+QUERY_CHUNK_ROWS = 500
+
+
+def parse_log_query(spec: Any) -> Tuple[float, float, Optional[str], Optional[List[str]]]:
+    if not isinstance(spec, dict):
+        raise ClientRequestError("query must be an object")
+    try:
+        start = float(spec.get("from", 0))
+        end = float(spec["to"]) if spec.get("to") is not None else float("inf")
+    except (TypeError, ValueError):
+        raise ClientRequestError("query from/to must be timestamps") from None
+    device = spec.get("device")
+    if device is not None and not isinstance(device, str):
+        raise ClientRequestError("query device must be a string")
+    fields = spec.get("fields")
+    if isinstance(fields, str):
+        fields = [fields]
+    if fields is not None and not (isinstance(fields, list)
+                                   and all(isinstance(f, str) for f in fields)):
+        raise ClientRequestError("query fields must be a list of names")
+    return start, end, device, fields
+
+
+async def run_log_query(send: Callable[[Line], Any], tlog: TelemetryLog, spec: Any,
+                        request_id: Any = None) -> None:
+    """Streamt eine Zeitbereichs-Abfrage blockweise; gelesen wird im Thread-Pool."""
+    start, end, device, fields = parse_log_query(spec)
+    tlog.flush()
+    rows = tlog.query(start, end, device, fields)
+    head = b'{"id":' + json.dumps(request_id).encode() + b',"rows":['
+    loop = asyncio.get_running_loop()
+
+    def next_chunk() -> List[bytes]:
+        chunk = []
+        for ts, row in rows:
+            value = row if isinstance(row, bytes) else json.dumps(row).encode()
+            chunk.append(b"[%.6f,%s]" % (ts, value))
+            if len(chunk) >= QUERY_CHUNK_ROWS:
+                break
+        return chunk
+
+    count = 0
+    with contextlib.suppress(websockets.exceptions.ConnectionClosed):
+        while True:
+            chunk = await loop.run_in_executor(None, next_chunk)
+            if not chunk:
+                break
+            count += len(chunk)
+            await send(head + b",".join(chunk) + b"]}")
+        await send(json.dumps({"id": request_id, "done": True, "count": count}))
+
+
+def deflate_options(window_bits: Optional[int] = 12, mem_level: int = 5) -> Dict[str, Any]:
+    """
+    Argumente für `websockets.serve()`: permessage-deflate mit Kontextübernahme
+    (Deltas ähneln sich stark und profitieren vom gemeinsamen Wörterbuch), aber
+    kleinerem Fenster/Speicher pro Verbindung als der zlib-Standard.
+    `window_bits=None` schaltet die Kompression ab.
+    """
+    if window_bits is None:
+        return {"compression": None}
+    if not 9 <= window_bits <= 15 or not 1 <= mem_level <= 9:
+        raise ValueError("deflate window bits 9..15, mem level 1..9")
+    from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+    return {
+        "compression": None,
+        "extensions": [ServerPerMessageDeflateFactory(
+            server_max_window_bits=window_bits,
+            client_max_window_bits=window_bits,
+            compress_settings={"memLevel": mem_level},
+        )],
+    }
+
+
+async def ws_server(bridges: Dict[str, SerialBridge], host: str, port: int,
+                    hub: TelemetryHub, registry: Optional[SchemaRegistry] = None,
+                    state: Optional[TelemetryState] = None,
+                    ring: Optional[ReplayRing] = None, tlog: Optional[TelemetryLog] = None,
+                    delta_keyframe: int = 100, deflate: Optional[Dict[str, Any]] = None,
+                    reuse_port: bool = False, metrics: Optional[Metrics] = None,
+                    aggregates: Optional[RollingAggregates] = None):
     clients: Set[websockets.WebSocketServerProtocol] = set()
 
-    async def producer(ws: websockets.WebSocketServerProtocol):
-        # Per-Client consumer of serial queue
+    async def producer(ws: websockets.WebSocketServerProtocol, client: ClientQueue,
+                       session: ClientSession):
+        # Per-Client consumer des eigenen Ringpuffers
+        send = text_sender(ws)
+        loop = asyncio.get_running_loop()
+        last_flush = float("-inf")
         try:
             while True:
-                line = await bridge.queue.get()
+                if session.rate_hz is not None:
+                    # Im Takt: neuester Wert je Gerät, ein Frame pro Gerät oder ein Batch
+                    frames = await collect_latest(client, session, last_flush)
+                    if frames is None:
+                        break
+                    last_flush = loop.time()
+                    if not frames:
+                        continue
+                else:
+                    frame = await client.get()
+                    if frame is None:
+                        break
+                    frames = [frame]
+                    if session.batch_ms is not None:
+                        frames = await collect_batch(client, session, frame)
+                groups = [frames] if session.batch_ms is not None else [[f] for f in frames]
                 try:
-                    await ws.send(line)
+                    for group in groups:
+                        for payload, binary in render_frames(group, session, registry):
+                            await (ws.send(payload) if binary else send(payload))
+                            if metrics is not None:
+                                metrics.messages_sent += 1
+                        if metrics is not None:
+                            metrics.lines_sent += len(group)
                 except websockets.exceptions.ConnectionClosed:
                     break
         except asyncio.CancelledError:
             pass
+        if client.close_reason == "slow consumer":
+            with contextlib.suppress(Exception):
+                await ws.close(code=1008, reason="slow consumer")
 
-    async def handler(ws, path):
+    async def handler(ws, path=None):
         clients.add(ws)
-        prod_task = asyncio.create_task(producer(ws))
+        client = hub.subscribe(name=str(ws.remote_address))
+        session = ClientSession()
+        send_text = text_sender(ws)
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(request_path(ws, path)).query)
+        resumed = False
+        if "resume" in query:
+            # Vor dem Start des Producers: Nachlieferung und Live-Stream ohne Überlappung
+            try:
+                reply = resume_client(client, ring, query["resume"][0])
+            except ClientRequestError as e:
+                reply = {"error": str(e)}
+            resumed = "resumed" in reply
+            with contextlib.suppress(websockets.exceptions.ConnectionClosed):
+                await ws.send(json.dumps(reply))
+        if not resumed and state is not None and state.devices:
+            # Erst abonnieren, dann Snapshot senden: keine Lücke zwischen Zustand und Stream
+            with contextlib.suppress(websockets.exceptions.ConnectionClosed):
+                await send_text(state.message())
+        prod_task = asyncio.create_task(producer(ws, client, session))
+        tasks: Set[asyncio.Task] = set()
+        agg_task: Optional[asyncio.Task] = None
         try:
             async for message in ws:
                 try:
                     payload = json.loads(message)
+                    if payload.get("get") == "stats":
+                        await ws.send(json.dumps({
+                            "stats": hub.stats(),
+                            "serial": {t: b.stats() for t, b in bridges.items()},
+                            "replay": ring.stats() if ring is not None else None,
+                            "log": tlog.stats() if tlog is not None else None,
+                            "delta": session.delta.stats() if session.delta is not None else None,
+                        }))
+                        continue
+                    if payload.get("get") == "state":
+                        await send_text(state.message() if state is not None else b'{"state":{}}')
+                        continue
+                    if payload.get("get") == "aggregates":
+                        await send_text(aggregates.message() if aggregates is not None
+                                        else '{"agg":{}}')
+                        continue
+                    if payload.get("get") == "schemas":
+                        await ws.send(json.dumps({
+                            "schemas": registry.describe() if registry else [],
+                            "encodings": available_encodings(),
+                        }))
+                        continue
+                    if "batch" in payload:
+                        session.configure_batch(payload["batch"])
+                    if "encoding" in payload:
+                        session.configure_encoding(payload["encoding"], delta_keyframe)
+                    if "subscribe" in payload:
+                        session.configure_topics(payload["subscribe"], set(bridges))
+                        client.filter = session.build_filter()
+                        session.resync_delta()
+                    if "filter" in payload:
+                        session.configure_filter(payload["filter"])
+                        client.filter = session.build_filter()
+                    if "aggregate" in payload:
+                        if aggregates is None:
+                            raise ClientRequestError("no aggregates on this server "
+                                                     "(--no-aggregates or --passthrough)")
+                        session.configure_aggregate(payload["aggregate"], aggregates.labels)
+                        client.filter = session.build_filter()
+                        if agg_task is not None:
+                            agg_task.cancel()
+                            agg_task = None
+                        if session.agg_ms is not None:
+                            agg_task = asyncio.create_task(
+                                run_aggregates(send_text, aggregates, session))
+                            tasks.add(agg_task)
+                            agg_task.add_done_callback(tasks.discard)
+                    if "rate" in payload:
+                        session.configure_rate(payload["rate"])
+                        client.conflate(frame_device_key if session.rate_hz is not None else None)
+                    if "resume" in payload:
+                        reply = resume_client(client, ring, payload["resume"])
+                        session.resync_delta()
+                        await ws.send(json.dumps(reply))
+                    at_cmds = payload.get("at")
+                    if isinstance(at_cmds, list):
+                        bridge = select_bridge(bridges, payload.get("topic"))
+                        if bridge.at is None:
+                            raise ClientRequestError("AT commands need the serial process "
+                                                     "(--workers 0)")
+                        timeout = payload.get("timeout")
+                        task = asyncio.create_task(run_at_commands(
+                            ws, bridge, at_cmds, payload.get("id"),
+                            float(timeout) if timeout is not None else None))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    if "query" in payload:
+                        if tlog is None:
+                            raise ClientRequestError("no telemetry log on this server (--log-dir)")
+                        parse_log_query(payload["query"])  # Fehler sofort melden
+                        task = asyncio.create_task(run_log_query(
+                            send_text, tlog, payload["query"], payload.get("id")))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    if "cancel" in payload:
+                        bridge = select_bridge(bridges, payload.get("topic"))
+                        if bridge.scheduler is None:
+                            raise ClientRequestError("cancel needs the serial process "
+                                                     "(--workers 0)")
+                        priority = parse_priority(payload["cancel"])
+                        await ws.send(json.dumps({
+                            "cancelled": bridge.scheduler.cancel(priority),
+                            "priority": priority.name.lower(),
+                        }))
                     cmds = payload.get("cmds")
                     if isinstance(cmds, list):
+                        bridge = select_bridge(bridges, payload.get("topic"))
+                        priority = parse_priority(payload.get("priority", "interactive"))
                         for cmd in cmds:
                             if isinstance(cmd, str) and cmd:
-                                bridge.write_line(cmd)
+                                bridge.submit(cmd, priority)
+                except ClientRequestError as e:
+                    await ws.send(json.dumps({"error": str(e)}))
                 except Exception as e:
                     print(f"[WARN] Bad client message: {e}")
                     # ignore bad client messages
@@ -116,35 +955,375 @@ async def ws_server(bridge: SerialBridge, host: str, port: int):
             pass
         finally:
             prod_task.cancel()
+            for task in tasks:
+                task.cancel()
             with contextlib.suppress(Exception):
                 await prod_task
             clients.discard(ws)
+            hub.unsubscribe(client)
+            stats = client.stats()
+            print(f"[INFO] {stats['client']} disconnected: delivered={stats['delivered']} "
+                  f"dropped={stats['dropped']} max_lag={stats['max_lag']}")
+
+    options = dict(deflate if deflate is not None else deflate_options())
+    if reuse_port:
+        options["reuse_port"] = True  # mehrere Worker teilen sich host:port
+    return await websockets.serve(handler, host, port, **options)
 
-    return await websockets.serve(handler, host, port)
+
+def shared_publisher(shm: SharedRing) -> Callable[[TelemetryFrame], None]:
+    """`hub.publish`-Ersatz im seriellen Prozess, wenn Worker die Clients bedienen."""
+    def publish(frame: TelemetryFrame) -> None:
+        raw = frame.raw if isinstance(frame.raw, bytes) else frame.raw.encode()
+        if not shm.write(raw, frame.topic, frame.seq):
+            print(f"[WARN] Line too large for shared ring ({len(raw)} bytes)", file=sys.stderr)
+    return publish
+
+
+async def pump_ring(reader: RingReader, on_record: Callable[[bytes, str, int], None],
+                    poll_interval: float = 0.002) -> None:
+    """Liest neue Records aus dem Shared-Memory-Ring; schläft nur, wenn nichts anliegt."""
+    while True:
+        records = reader.read_many()
+        for raw, topic, seq in records:
+            on_record(raw, topic, seq)
+        await asyncio.sleep(0 if records else poll_interval)
+
+
+async def forward_commands(commands: Any, bridges: Dict[str, SerialBridge]) -> None:
+    """Reicht Kommandos der Worker an den Scheduler des jeweiligen Ports weiter."""
+    loop = asyncio.get_running_loop()
+    # Mit Timeout, damit der Executor-Thread beim Beenden nicht ewig blockiert
+    get = functools.partial(commands.get, timeout=0.5)
+    while True:
+        try:
+            topic, command, priority = await loop.run_in_executor(None, get)
+        except queue.Empty:
+            continue
+        bridge = bridges.get(topic)
+        if bridge is not None:
+            bridge.submit(command, priority)
+
+
+async def run_worker(index: int, ring_name: str, topics: List[str], args: argparse.Namespace,
+                     commands: Any) -> None:
+    """WebSocket-Worker: eigener Hub/Zustand/Replay-Ring, gespeist aus dem Shared-Memory-Ring."""
+    shm = SharedRing.attach(ring_name)
+    registry = SchemaRegistry.from_file(args.schemas) if args.schemas else SchemaRegistry()
+    hub = TelemetryHub(args.client_buffer, SlowConsumerPolicy(args.slow_policy))
+    state = None if args.no_state else TelemetryState()
+    aggregates = None if args.no_aggregates else RollingAggregates(args.agg_windows)
+    ring = ReplayRing(args.history) if args.history > 0 else None
+    bridges = {topic: RemoteBridge(topic, commands) for topic in topics}
+
+    def on_record(raw: bytes, topic: str, seq: int) -> None:
+        frame = TelemetryFrame(raw, topic, seq)
+        if ring is not None:
+            ring.last_seq = seq  # Nummern vergibt der serielle Prozess
+            ring.append(frame)
+        if state is not None:
+            state.update_frame(frame)
+        if aggregates is not None:
+            aggregates.update_frame(frame)
+        hub.publish(frame)
+
+    deflate = deflate_options(None if args.no_deflate else args.deflate_window_bits,
+                              args.deflate_mem_level)
+    server = await ws_server(bridges, args.host, args.wsport, hub, registry, state, ring,
+                             None, args.delta_keyframe, deflate, reuse_port=True,
+                             aggregates=aggregates)
+    print(f"[OK] Worker {index} (pid {os.getpid()}) on ws://{args.host}:{args.wsport}/telemetry")
+    try:
+        await pump_ring(shm.reader(), on_record, args.shm_poll_ms / 1000.0)
+    finally:
+        server.close()
+        shm.close()
+
+
+def worker_process(index: int, ring_name: str, topics: List[str], args: argparse.Namespace,
+                   commands: Any) -> None:
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(run_worker(index, ring_name, topics, args, commands))
+
+
+_TOPIC_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def record_path(path: str, topic: str, multiport: bool) -> str:
+    """Bei mehreren Ports eine Aufnahme pro Topic: `s.rec` -> `s.funk1.rec`."""
+    if not multiport:
+        return path
+    stem, ext = os.path.splitext(path)
+    if ext == ".gz":
+        stem, inner = os.path.splitext(stem)
+        ext = inner + ext
+    return f"{stem}.{topic}{ext}"
+
+
+def parse_port_spec(spec: str) -> Tuple[str, str]:
+    """`name=url` -> (name, url); ohne Namen ist der Port selbst das Topic."""
+    name, sep, url = spec.partition("=")
+    if sep and url and _TOPIC_RE.match(name):
+        return name, url
+    return spec, spec
+
+
+def report_replay(task: asyncio.Task) -> None:
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        print(f"[ERR] Replay failed: {task.exception()}", file=sys.stderr)
+    else:
+        print(f"[OK] Replay finished: {task.result()} lines")
 
 
 async def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--port", required=True, help="Serial port, e.g. /dev/ttyUSB0 or COM5")
+    parser.add_argument("--port", required=True, action="append",
+                        help="Serial port, e.g. /dev/ttyUSB0 or COM5; "
+                             "mehrfach als name=port für mehrere Funkgeräte")
     parser.add_argument("--baud", type=int, default=115200)
     parser.add_argument("--host", default="127.0.0.1")
     parser.add_argument("--wsport", type=int, default=8765)
+    parser.add_argument("--client-buffer", type=int, default=1024,
+                        help="Ringpuffer-Größe (Zeilen) pro WebSocket-Client")
+    parser.add_argument("--slow-policy", default=SlowConsumerPolicy.DROP_OLDEST.value,
+                        choices=[p.value for p in SlowConsumerPolicy],
+                        help="Verhalten bei vollem Client-Puffer")
+    parser.add_argument("--passthrough", action="store_true",
+                        help="Zeilen als bytes ohne JSON-Parse bis zum Socket durchreichen "
+                             "(schaltet Zustands-Snapshot und Aggregate ab)")
+    parser.add_argument("--validate", choices=[VALIDATE_STRUCTURAL, VALIDATE_FULL],
+                        help="Zeilenprüfung (Standard: structural bei --passthrough, sonst full)")
+    parser.add_argument("--schemas", help="JSON-Datei mit Telemetrie-Schemas für encoding=struct")
+    parser.add_argument("--at-pipeline", type=int, default=1,
+                        help="Max. gleichzeitig ausstehende AT-Kommandos pro Port")
+    parser.add_argument("--at-timeout", type=float, default=1.0,
+                        help="Standard-Timeout (s) pro AT-Kommando")
+    parser.add_argument("--at-crlf", action="store_true",
+                        help="AT-Kommandos mit \\r\\n statt \\r (V.250) abschließen")
+    parser.add_argument("--lane-rate", action="append", default=["bulk=100"],
+                        help="Ratenlimit einer Kommando-Spur in Kommandos/s, z.B. bulk=50 "
+                             "(0 = unbegrenzt; mehrfach angebbar)")
+    parser.add_argument("--delta-keyframe", type=int, default=100,
+                        help="Bei encoding=delta: Keyframe alle N Zeilen pro Gerät")
+    parser.add_argument("--deflate-window-bits", type=int, default=12,
+                        help="permessage-deflate Fenstergröße (9..15)")
+    parser.add_argument("--deflate-mem-level", type=int, default=5,
+                        help="permessage-deflate zlib memLevel (1..9)")
+    parser.add_argument("--no-deflate", action="store_true",
+                        help="permessage-deflate abschalten")
+    parser.add_argument("--no-state", action="store_true",
+                        help="Keinen Zustands-Snapshot führen (spart das JSON-Parsen pro Zeile)")
+    parser.add_argument("--no-aggregates", action="store_true",
+                        help="Keine rollierenden Aggregate führen")
+    parser.add_argument("--agg-windows", default="1,10,60",
+                        help="Aggregat-Fenster in Sekunden, kommagetrennt")
+    parser.add_argument("--history", type=int, default=10000,
+                        help="Zeilen im Replay-Ring für Resume nach Reconnect "
+                             "(0 = keine Sequenznummern)")
+    parser.add_argument("--log-dir", help="Telemetrie zusätzlich in ein segmentiertes Log schreiben")
+    parser.add_argument("--log-segment-mb", type=float, default=64)
+    parser.add_argument("--log-retention-mb", type=float, default=0,
+                        help="Max. Gesamtgröße des Logs (0 = unbegrenzt)")
+    parser.add_argument("--log-retention-hours", type=float, default=0,
+                        help="Max. Alter der Log-Segmente (0 = unbegrenzt)")
+    parser.add_argument("--record", help="Sitzung (rx-Zeilen, tx-Kommandos) aufzeichnen; "
+                                         "Endung .gz komprimiert")
+    parser.add_argument("--replay", help="Aufnahme in den (einzigen) loop://-Port einspielen")
+    parser.add_argument("--replay-speed", default="1", help="Faktor (1 = Echtzeit) oder max")
+    parser.add_argument("--replay-repeat", type=int, default=1, help="Durchläufe (0 = endlos)")
+    parser.add_argument("--reconnect-max", type=float, default=10.0,
+                        help="Max. Wartezeit (s) zwischen Reconnect-Versuchen nach Hot-Unplug")
+    parser.add_argument("--http-port", type=int, default=8000,
+                        help="HTTP-Port für /health und /metrics (0 = aus)")
+    parser.add_argument("--http-host", help="Adresse für --http-port (Standard: --host)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="WebSocket-Worker-Prozesse (0 = alles in einem Prozess)")
+    parser.add_argument("--shm-mb", type=float, default=16,
+                        help="Größe des Shared-Memory-Rings für --workers")
+    parser.add_argument("--shm-poll-ms", type=float, default=2,
+                        help="Abfrageintervall der Worker, wenn der Ring leer ist")
     args = parser.parse_args()
 
-    bridge = SerialBridge(args.port, args.baud)
-    bridge.open()
     try:
-        server = await ws_server(bridge, args.host, args.wsport)
-        print(f"[OK] WebSocket on ws://{args.host}:{args.wsport}/telemetry (single endpoint)")
+        lane_rates = parse_rates(args.lane_rate)
+    except ValueError as e:
+        parser.error(f"--lane-rate: {e}")
+    if args.delta_keyframe < 1:
+        parser.error("--delta-keyframe must be >= 1")
+    try:
+        deflate = deflate_options(None if args.no_deflate else args.deflate_window_bits,
+                                  args.deflate_mem_level)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        args.agg_windows = [float(w) for w in args.agg_windows.split(",") if w.strip()]
+        RollingAggregates(args.agg_windows)
+    except ValueError as e:
+        parser.error(f"--agg-windows: {e}")
+    if args.passthrough:
+        # Zustand und Aggregate parsen jede Zeile; --passthrough hält den Hot Path parse-frei
+        args.no_state = args.no_aggregates = True
+    if args.workers < 0:
+        parser.error("--workers must be >= 0")
+    if args.workers and not hasattr(socket, "SO_REUSEPORT"):
+        parser.error("--workers needs SO_REUSEPORT (Linux/BSD)")
+    registry = SchemaRegistry.from_file(args.schemas) if args.schemas else SchemaRegistry()
+    hub = TelemetryHub(args.client_buffer, SlowConsumerPolicy(args.slow_policy))
+    state = None if args.no_state or args.workers else TelemetryState()
+    aggregates = (None if args.no_aggregates or args.workers
+                  else RollingAggregates(args.agg_windows))
+    # Mit Workern hält jeder Worker seinen eigenen Ring; hier werden nur Nummern vergeben
+    ring = ReplayRing(1 if args.workers else args.history) if args.history > 0 else None
+    tlog = None
+    if args.log_dir:
+        tlog = TelemetryLog(
+            args.log_dir, int(args.log_segment_mb * 1024 * 1024),
+            retention_bytes=int(args.log_retention_mb * 1024 * 1024) or None,
+            retention_seconds=args.log_retention_hours * 3600 or None)
+
+    specs = [parse_port_spec(spec) for spec in args.port]
+    if len({name for name, _ in specs}) != len(specs):
+        parser.error("duplicate port names")
+    multiport = len(specs) > 1
+    if args.replay and (multiport or not specs[0][1].startswith("loop://")):
+        parser.error("--replay needs exactly one --port loop://")
+    try:
+        replay_speed = parse_speed(args.replay_speed)
+    except ValueError as e:
+        parser.error(f"--replay-speed: {e}")
+
+    metrics = Metrics(name for name, _ in specs)
+    received = metrics.lines_received
+
+    def make_on_line(topic: str) -> Callable[[Line], None]:
+        fields = topic_field(topic) if multiport else b""
+
+        def on_line(line: Line) -> None:
+            received[topic] += 1
+            seq = ring.next_seq() if ring is not None else 0
+            head = seq_field(seq) + fields if seq else fields
+            if head:
+                line = tag_line(line, head)
+            frame = TelemetryFrame(line, topic, seq)
+            if ring is not None:
+                ring.append(frame)
+            if tlog is not None:
+                tlog.append(line)
+            if state is not None:
+                state.update_frame(frame)
+            if aggregates is not None:
+                aggregates.update_frame(frame)
+            publish(frame)
+        return on_line
+
+    shm: Optional[SharedRing] = None
+    workers: List[multiprocessing.process.BaseProcess] = []
+    publish: Callable[[TelemetryFrame], None] = hub.publish
+    if args.workers:
+        shm = SharedRing.create(int(args.shm_mb * 1024 * 1024))
+        publish = shared_publisher(shm)
+        ctx = multiprocessing.get_context("spawn")
+        commands = ctx.Queue()
+        # Vor dem Öffnen der Ports starten: die Worker erben keine Deskriptoren
+        for i in range(args.workers):
+            worker = ctx.Process(target=worker_process, name=f"ws-worker-{i}", daemon=True,
+                                 args=(i, shm.name, [name for name, _ in specs], args, commands))
+            worker.start()
+            workers.append(worker)
+
+    # SIGTERM (z.B. docker stop) beendet sauber: Aufnahmen und Log werden geschlossen
+    with contextlib.suppress(NotImplementedError, AttributeError):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+
+    bridges: Dict[str, SerialBridge] = {}
+    command_task: Optional[asyncio.Task] = None
+    server = None
+    http_server: Optional[asyncio.AbstractServer] = None
+    try:
+        for topic, url in specs:
+            bridge = SerialBridge(url, args.baud, on_line=make_on_line(topic),
+                                  passthrough=args.passthrough, validate=args.validate,
+                                  topic=topic, at_pipeline=args.at_pipeline,
+                                  at_timeout=args.at_timeout,
+                                  at_terminator="\r\n" if args.at_crlf else "\r",
+                                  lane_rates=lane_rates,
+                                  reconnect_max=args.reconnect_max)
+            bridges[topic] = bridge
+            if args.record:
+                bridge.recorder = SessionRecorder(record_path(args.record, topic, multiport))
+            bridge.open()
+        if workers:
+            command_task = asyncio.create_task(forward_commands(commands, bridges))
+            print(f"[OK] {len(workers)} WebSocket workers on ws://{args.host}:{args.wsport}"
+                  f"/telemetry, shared ring {shm.name} ({shm.capacity} bytes)")
+        else:
+            server = await ws_server(bridges, args.host, args.wsport, hub, registry, state,
+                                     ring, tlog, args.delta_keyframe, deflate, metrics=metrics,
+                                     aggregates=aggregates)
+            print(f"[OK] WebSocket on ws://{args.host}:{args.wsport}/telemetry (single endpoint)")
+        if args.http_port:
+            def serial_stats() -> Dict[str, Dict[str, Any]]:
+                return {topic: b.stats() for topic, b in bridges.items()}
+
+            # Mit Workern liegen Clients und gesendete Zeilen in den Worker-Prozessen
+            try:
+                http_server = await serve_http(args.http_host or args.host, args.http_port, {
+                    "/health": lambda: health(serial_stats(), {"clients": len(hub.clients),
+                                                               "workers": len(workers)}),
+                    "/metrics": lambda: (200, PROMETHEUS_CONTENT_TYPE,
+                                         render_metrics(metrics, hub.stats(), serial_stats())),
+                })
+            except OSError as e:
+                # Port belegt o.ä.: Telemetrie läuft weiter, nur ohne /health und /metrics
+                print(f"[WARN] HTTP on port {args.http_port} not available ({e}), "
+                      "continuing without /health and /metrics", file=sys.stderr)
+            else:
+                print(f"     HTTP /health, /metrics on http://{args.http_host or args.host}:"
+                      f"{args.http_port}")
+        print(f"     Serial topics: {', '.join(bridges)}")
         print("     Send {\"cmds\":[\"AT+...\"]} from client to write to serial.")
-        await asyncio.Future()  # run forever
+        if args.replay:
+            bridge = next(iter(bridges.values()))
+            replay_task = asyncio.create_task(replay_session(
+                args.replay, bridge.ser.write, replay_speed, args.replay_repeat))
+            replay_task.add_done_callback(report_replay)
+        while True:
+            await asyncio.sleep(1.0)
+            metrics.tick()
+            if tlog is not None:
+                tlog.flush()
+                tlog.enforce_retention()
+            for bridge in bridges.values():
+                if bridge.recorder is not None:
+                    bridge.recorder.flush()
     finally:
-        bridge.close()
+        # Erst Zugänge schließen, die die Bridges benutzen, dann die Bridges selbst
+        if command_task is not None:
+            command_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await command_task
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        if http_server is not None:
+            http_server.close()
+            await http_server.wait_closed()
+        for bridge in bridges.values():
+            bridge.close()
+        if tlog is not None:
+            tlog.close()
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join(5)
+        if shm is not None:
+            shm.close()
 
 
 if __name__ == "__main__":
-    import contextlib
     try:
         asyncio.run(main())
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, asyncio.CancelledError):
         pass
@@ -0,0 +1,199 @@
+"""
+Ringpuffer im Shared Memory: ein Prozess schreibt Telemetrie, mehrere lesen.
+
+Der Prozess mit den seriellen Ports schreibt jede Zeile genau einmal in den Ring
+(`SharedRing.write()`), jeder WebSocket-Worker liest ihn mit einem eigenen
+`RingReader` unabhängig von den anderen. Es gibt keine Sperren: der Schreiber
+wartet nie auf Leser; ein Leser, der eine ganze Runde zurückliegt, wird auf den
+aktuellen Stand gesetzt und zählt einen Überlauf.
+
+Layout (Little Endian, alles 8-Byte-ausgerichtet):
+
+  Kopf:     magic[8] capacity:Q reserve_pos:Q write_pos:Q records:Q
+  Daten:    capacity Bytes, Records fortlaufend, am Ende umgebrochen
+  Record:   raw_len:I topic_len:I seq:Q topic raw  (aufgefüllt auf 8 Byte)
+
+`reserve_pos` wird vor dem Schreiben eines Records erhöht, `write_pos` danach.
+Ein Leser kopiert zuerst und prüft dann an `reserve_pos`, ob der Schreiber den
+gelesenen Bereich inzwischen überholt hat; so werden halb überschriebene
+Records verworfen statt ausgeliefert.
+"""
+from __future__ import annotations
+
+import struct
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+MAGIC = b"RFRING01"
+
+_HEADER = struct.Struct("<8sQQQQ")
+_POS = struct.Struct("<Q")
+_RECORD = struct.Struct("<IIQ")
+
+_RESERVE_OFFSET = 16
+_WRITE_OFFSET = 24
+_RECORDS_OFFSET = 32
+_DATA_OFFSET = _HEADER.size
+
+# raw_len-Wert für "Rest bis zum Pufferende überspringen"
+_WRAP = 0xFFFFFFFF
+
+Record = Tuple[bytes, str, int]  # (raw, topic, seq)
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+class SharedRing:
+    """Shared-Memory-Segment mit Kopf und Datenbereich; nur ein Prozess schreibt."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        self.buf = shm.buf
+        magic, self.capacity, _, _, _ = _HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"not a telemetry ring: {shm.name}")
+
+    @classmethod
+    def create(cls, capacity: int, name: Optional[str] = None) -> "SharedRing":
+        capacity = _align(capacity)
+        if capacity < 4096:
+            raise ValueError("ring capacity must be >= 4096 bytes")
+        shm = shared_memory.SharedMemory(name=name, create=True,
+                                         size=_DATA_OFFSET + capacity)
+        _HEADER.pack_into(shm.buf, 0, MAGIC, capacity, 0, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedRing":
+        try:
+            # Python >= 3.13: nicht beim resource_tracker anmelden, sonst räumt das
+            # Ende eines Lesers das Segment des Schreibers ab
+            shm = shared_memory.SharedMemory(name=name, track=False)  # type: ignore[call-arg]
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def max_record(self) -> int:
+        """Größter Record (Kopf + Topic + Zeile), der sich noch schreiben lässt."""
+        return self.capacity // 2
+
+    @property
+    def write_pos(self) -> int:
+        return _POS.unpack_from(self.buf, _WRITE_OFFSET)[0]
+
+    @property
+    def reserve_pos(self) -> int:
+        return _POS.unpack_from(self.buf, _RESERVE_OFFSET)[0]
+
+    @property
+    def records(self) -> int:
+        return _POS.unpack_from(self.buf, _RECORDS_OFFSET)[0]
+
+    def write(self, raw: bytes, topic: str = "", seq: int = 0) -> bool:
+        """Hängt eine Zeile an; False, wenn sie größer als `max_record` ist."""
+        topic_bytes = topic.encode()
+        size = _align(_RECORD.size + len(topic_bytes) + len(raw))
+        if size > self.max_record:
+            return False
+        buf = self.buf
+        pos = self.write_pos
+        offset = pos % self.capacity
+        rest = self.capacity - offset
+        skip = rest if rest < size else 0
+        _POS.pack_into(buf, _RESERVE_OFFSET, pos + skip + size)
+        if skip:
+            if rest >= _RECORD.size:
+                _RECORD.pack_into(buf, _DATA_OFFSET + offset, _WRAP, 0, 0)
+            offset = 0
+        start = _DATA_OFFSET + offset
+        _RECORD.pack_into(buf, start, len(raw), len(topic_bytes), seq)
+        start += _RECORD.size
+        buf[start:start + len(topic_bytes)] = topic_bytes
+        start += len(topic_bytes)
+        buf[start:start + len(raw)] = raw
+        _POS.pack_into(buf, _WRITE_OFFSET, pos + skip + size)
+        _POS.pack_into(buf, _RECORDS_OFFSET, self.records + 1)
+        return True
+
+    def reader(self, from_start: bool = False) -> "RingReader":
+        return RingReader(self, from_start)
+
+    def stats(self) -> dict:
+        return {"name": self.name, "capacity": self.capacity,
+                "write_pos": self.write_pos, "records": self.records}
+
+    def close(self) -> None:
+        self.buf = None  # type: ignore[assignment]
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingReader:
+    """Unabhängige Leseposition eines Prozesses im `SharedRing`."""
+
+    def __init__(self, ring: SharedRing, from_start: bool = False):
+        self.ring = ring
+        self.pos = 0 if from_start else ring.write_pos
+        self.read = 0
+        self.overruns = 0
+
+    @property
+    def lag(self) -> int:
+        """Noch nicht gelesene Bytes."""
+        return self.ring.write_pos - self.pos
+
+    def read_many(self, limit: int = 1024) -> List[Record]:
+        """Bis zu `limit` neue Records; nie blockierend."""
+        ring = self.ring
+        buf = ring.buf
+        capacity = ring.capacity
+        records: List[Record] = []
+        while len(records) < limit:
+            end = ring.write_pos
+            if self.pos >= end:
+                break
+            if end - self.pos > capacity:
+                self._resync()
+                continue
+            offset = self.pos % capacity
+            rest = capacity - offset
+            if rest < _RECORD.size:
+                self.pos += rest
+                continue
+            start = _DATA_OFFSET + offset
+            raw_len, topic_len, seq = _RECORD.unpack_from(buf, start)
+            if raw_len == _WRAP:
+                self.pos += rest
+                continue
+            start += _RECORD.size
+            size = _align(_RECORD.size + topic_len + raw_len)
+            if size > rest:
+                # Kopf schon überschrieben (Längen unsinnig): neu aufsetzen
+                self._resync()
+                continue
+            topic = bytes(buf[start:start + topic_len])
+            raw = bytes(buf[start + topic_len:start + topic_len + raw_len])
+            if ring.reserve_pos - self.pos > capacity:
+                # Während des Kopierens überholt
+                self._resync()
+                continue
+            self.pos += size
+            records.append((raw, topic.decode(), seq))
+        self.read += len(records)
+        return records
+
+    def _resync(self) -> None:
+        self.overruns += 1
+        self.pos = self.ring.write_pos
+
+    def stats(self) -> dict:
+        return {"read": self.read, "lag_bytes": self.lag, "overruns": self.overruns}
@@ -0,0 +1,161 @@
+"""
+Rollierende Aggregate (min, max, mean, count) über numerische Telemetriefelder.
+
+Pro Gerät und Feld gibt es je Zeitfenster (Standard 1 s, 10 s, 60 s) einen Ring aus
+`BUCKETS` Eimern der Breite Fenster/BUCKETS. Eine Zeile aktualisiert pro Fenster
+genau einen Eimer, also O(1) pro Feld; erst beim Abruf werden die Eimer des
+Fensters zusammengefasst. Das Fenster ist dadurch auf eine Eimerbreite genau
+(beim 60-s-Fenster 6 s), was für Trenddarstellungen reicht.
+
+Berücksichtigt werden Zahlen auf oberster Ebene des Objekts; `seq` und
+Wahrheitswerte nicht. Zeiten laufen über `time.monotonic()`, Uhrsprünge
+verschieben also keine Fenster.
+"""
+from __future__ import annotations
+
+import json
+import math
+import time
+from typing import Any, Collection, Dict, List, Optional, Sequence, Tuple
+
+from telemetry_state import TelemetryState
+
+DEFAULT_WINDOWS = (1.0, 10.0, 60.0)
+BUCKETS = 10
+IGNORED_FIELDS = frozenset({"seq"})
+
+
+def window_label(seconds: float) -> str:
+    """1.0 -> "1s", 60.0 -> "60s", 0.5 -> "500ms"."""
+    if seconds >= 1 and float(seconds).is_integer():
+        return f"{int(seconds)}s"
+    return f"{int(round(seconds * 1000))}ms"
+
+
+class RollingWindow:
+    """Ein Zeitfenster als Ring aus Eimern mit min/max/sum/count."""
+
+    __slots__ = ("span", "width", "stamps", "mins", "maxs", "sums", "counts")
+
+    def __init__(self, span: float, buckets: int = BUCKETS):
+        self.span = span
+        self.width = span / buckets
+        self.stamps = [-1] * buckets  # absolute Eimernummer, die der Platz gerade hält
+        self.mins = [0.0] * buckets
+        self.maxs = [0.0] * buckets
+        self.sums = [0.0] * buckets
+        self.counts = [0] * buckets
+
+    def add(self, now: float, value: float) -> None:
+        index = int(now / self.width)
+        slot = index % len(self.stamps)
+        if self.stamps[slot] != index:
+            self.stamps[slot] = index
+            self.mins[slot] = self.maxs[slot] = self.sums[slot] = value
+            self.counts[slot] = 1
+            return
+        if value < self.mins[slot]:
+            self.mins[slot] = value
+        elif value > self.maxs[slot]:
+            self.maxs[slot] = value
+        self.sums[slot] += value
+        self.counts[slot] += 1
+
+    def summary(self, now: float) -> Optional[Dict[str, float]]:
+        """Zusammenfassung der Eimer im Fenster; None, wenn es leer ist."""
+        current = int(now / self.width)
+        oldest = current - len(self.stamps)
+        lo = math.inf
+        hi = -math.inf
+        total = 0.0
+        count = 0
+        for slot, stamp in enumerate(self.stamps):
+            if oldest < stamp <= current:
+                lo = min(lo, self.mins[slot])
+                hi = max(hi, self.maxs[slot])
+                total += self.sums[slot]
+                count += self.counts[slot]
+        if not count:
+            return None
+        return {"min": lo, "max": hi, "mean": total / count, "count": count}
+
+
+class RollingAggregates:
+    """Aggregate aller Geräte; `update_frame()` wird pro Telemetriezeile aufgerufen."""
+
+    def __init__(self, windows: Sequence[float] = DEFAULT_WINDOWS, buckets: int = BUCKETS):
+        if not windows or any(w <= 0 for w in windows):
+            raise ValueError("windows must be positive seconds")
+        self.windows = tuple(sorted(windows))
+        self.labels = [window_label(w) for w in self.windows]
+        self.buckets = buckets
+        self.devices: Dict[str, Dict[str, List[RollingWindow]]] = {}
+        self.updates = 0
+        self._cache: Tuple[int, Optional[Dict[str, Any]]] = (-1, None)
+
+    def update(self, data: Optional[Dict[str, Any]], topic: str = "",
+               now: Optional[float] = None) -> None:
+        if not data:
+            return
+        now = time.monotonic() if now is None else now
+        key = TelemetryState.device_key(data, topic)
+        fields = self.devices.get(key)
+        if fields is None:
+            fields = self.devices[key] = {}
+        for name, value in data.items():
+            if type(value) not in (int, float) or name in IGNORED_FIELDS:
+                continue  # bool ist ein int-Subtyp und fällt hier ebenfalls heraus
+            windows = fields.get(name)
+            if windows is None:
+                windows = fields[name] = [RollingWindow(w, self.buckets) for w in self.windows]
+            for window in windows:
+                window.add(now, value)
+        self.updates += 1
+
+    def update_frame(self, frame: Any) -> None:
+        """Übernimmt einen `TelemetryFrame` (nutzt dessen einmal geparste Daten)."""
+        self.update(frame.data, frame.topic)
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        {Gerät: {Feld: {"1s": {min, max, mean, count}, ...}}}. Innerhalb derselben
+        Zehntelsekunde teilen sich alle Abrufer ein Ergebnis.
+        """
+        now = time.monotonic() if now is None else now
+        tick = int(now * 10)
+        if self._cache[0] == tick and self._cache[1] is not None:
+            return self._cache[1]
+        result: Dict[str, Any] = {}
+        for device, fields in self.devices.items():
+            out: Dict[str, Any] = {}
+            for name, windows in fields.items():
+                summaries = {}
+                for label, window in zip(self.labels, windows):
+                    summary = window.summary(now)
+                    if summary is not None:
+                        summaries[label] = summary
+                if summaries:
+                    out[name] = summaries
+            if out:
+                result[device] = out
+        self._cache = (tick, result)
+        return result
+
+    def message(self, devices: Optional[Collection[str]] = None,
+                fields: Optional[Collection[str]] = None,
+                windows: Optional[Collection[str]] = None) -> str:
+        """`{"agg": {...}}` als JSON, optional auf Geräte/Felder/Fenster beschränkt."""
+        snapshot = self.snapshot()
+        if devices is not None or fields is not None or windows is not None:
+            snapshot = {
+                device: {
+                    name: {w: s for w, s in summaries.items()
+                           if windows is None or w in windows}
+                    for name, summaries in values.items()
+                    if fields is None or name in fields
+                }
+                for device, values in snapshot.items()
+                if devices is None or device in devices
+            }
+        return json.dumps({"agg": snapshot, "t": round(time.time(), 3)},
+                          separators=(",", ":"))
@@ -0,0 +1,361 @@
+"""
+End-to-End-Benchmark für `server_real_rf_system.py`.
+
+Startet den Server gegen eine synthetische serielle Quelle (pty), die JSON-Zeilen
+mit Sendezeitstempel (`"t"`, ns) in einstellbarer Rate und Größe schreibt, hängt
+1..1000 WebSocket-Clients an (verteilt auf mehrere Prozesse) und misst pro Szenario:
+
+  - Latenz seriell -> Client (p50/p99/p999/max in ms)
+  - Zeilen/s gesendet und empfangen (über alle Clients), verlorene Zeilen
+  - CPU (% eines Kerns) und RSS des Serverprozesses
+
+Gemessen wird nur in einem gemeinsamen Zeitfenster nach Verbindungsaufbau und
+Aufwärmphase. Ergebnisse gehen als JSON auf stdout oder in `--output`, damit
+Regressionen über Releases verglichen werden können.
+
+Beispiel:
+  python telemetry_benchmark.py --clients 1,10,100,1000 --rate 1000 --size 200 \\
+      --duration 10 --server-args="--passthrough" --output bench.json
+
+Nur POSIX (pty). CPU/RSS über psutil, falls installiert, sonst /proc.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import websockets
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# Nachlauf, in dem Clients noch Zeilen aus dem Messfenster empfangen
+GRACE_S = 1.0
+
+# Latenz-Stichproben pro Client-Prozess (Reservoir), reicht für p999
+SAMPLES_PER_PROCESS = 200_000
+
+TS_FIELD = '"t":'
+
+
+def percentiles(values: Sequence[float], points=(0.5, 0.99, 0.999)) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {}
+    for p in points:
+        key = "p" + f"{p * 100:g}".replace(".", "")
+        result[key] = round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3)
+    result["max"] = round(ordered[-1], 3)
+    return result
+
+
+def extract_ts(message: str) -> List[int]:
+    """Sendezeitstempel aller Zeilen einer Nachricht (auch Batches), ohne zu parsen."""
+    stamps = []
+    pos = message.find(TS_FIELD)
+    while pos >= 0:
+        pos += len(TS_FIELD)
+        end = pos
+        while end < len(message) and message[end].isdigit():
+            end += 1
+        if end > pos:
+            stamps.append(int(message[pos:end]))
+        pos = message.find(TS_FIELD, end)
+    return stamps
+
+
+def make_line(seq: int, size: int, ts_ns: int) -> bytes:
+    """Telemetriezeile mit Zeitstempel, per `pad` auf ca. `size` Bytes aufgefüllt."""
+    head = '{"device":"bench","n":%d,"rssi":-%d,"t":%d' % (seq, 60 + seq % 50, ts_ns)
+    pad = max(0, size - len(head) - 12)
+    return (head + ',"pad":"' + "x" * pad + '"}\n').encode()
+
+
+class SyntheticSource(threading.Thread):
+    """Schreibt Zeilen mit fester Rate in den Master eines pty (eigener Thread)."""
+
+    def __init__(self, rate: float, size: int):
+        super().__init__(daemon=True)
+        self.master, self.slave = os.openpty()
+        import tty
+        tty.setraw(self.slave)
+        self.path = os.ttyname(self.slave)
+        self.rate = rate
+        self.size = size
+        self.sent = 0
+        self.window_sent = 0
+        self.window = (0, 0)  # Messfenster in ns (Sendezeit)
+        self._halt = threading.Event()
+
+    def run(self) -> None:
+        start = time.perf_counter()
+        seq = itertools.count()
+        while not self._halt.is_set():
+            due = int((time.perf_counter() - start) * self.rate) - self.sent
+            if due <= 0:
+                time.sleep(0.0005)
+                continue
+            now_ns = time.time_ns()
+            data = b"".join(make_line(next(seq), self.size, now_ns) for _ in range(due))
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self.master, view):]
+            self.sent += due
+            if self.window[0] <= now_ns < self.window[1]:
+                self.window_sent += due
+
+    def drain(self) -> None:
+        """Kommandos des Servers verwerfen, damit der pty nicht vollläuft."""
+        while not self._halt.is_set():
+            try:
+                os.read(self.master, 65536)
+            except OSError:
+                return
+
+    def stop(self) -> None:
+        self._halt.set()
+        if self.is_alive():
+            self.join(timeout=2)
+        for fd in (self.master, self.slave):
+            os.close(fd)
+
+
+def run_clients(url: str, count: int, window_start: float, window_end: float,
+                client_options: Optional[dict]) -> Dict[str, Any]:
+    """
+    Läuft in einem Client-Prozess: `count` Verbindungen. Gezählt werden Zeilen,
+    deren Sendezeit im Messfenster liegt.
+    """
+    first_ns, last_ns = int(window_start * 1e9), int(window_end * 1e9)
+    stop_at = window_end + GRACE_S
+    received = 0
+    latencies: List[float] = []
+    failed = 0
+
+    async def client() -> None:
+        nonlocal received, failed
+        try:
+            ws = await websockets.connect(url, max_size=None, compression=None)
+        except Exception:
+            failed += 1
+            return
+        async with ws:
+            if client_options:
+                await ws.send(json.dumps(client_options))
+            while time.time() < stop_at:
+                try:
+                    message = await asyncio.wait_for(ws.recv(), stop_at - time.time())
+                except (asyncio.TimeoutError, websockets.exceptions.ConnectionClosed):
+                    break
+                now_ns = time.time_ns()
+                if isinstance(message, bytes):
+                    message = message.decode(errors="replace")
+                if message.startswith('{"state"'):
+                    continue
+                for ts in extract_ts(message):
+                    if not first_ns <= ts < last_ns:
+                        continue
+                    received += 1
+                    latency = (now_ns - ts) / 1e6
+                    if len(latencies) < SAMPLES_PER_PROCESS:
+                        latencies.append(latency)
+                    else:
+                        slot = random.randrange(received)
+                        if slot < SAMPLES_PER_PROCESS:
+                            latencies[slot] = latency
+
+    async def main() -> None:
+        await asyncio.gather(*(client() for _ in range(count)))
+
+    asyncio.run(main())
+    return {"received": received, "latencies": latencies, "failed": failed}
+
+
+class ProcessStats:
+    """CPU-Zeit und RSS eines Prozesses (psutil oder /proc)."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self._proc = psutil.Process(pid) if PSUTIL_AVAILABLE else None
+
+    def cpu_seconds(self) -> Optional[float]:
+        if self._proc is not None:
+            times = self._proc.cpu_times()
+            return times.user + times.system
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def rss_mb(self) -> Dict[str, Optional[float]]:
+        if self._proc is not None:
+            return {"rss_mb": round(self._proc.memory_info().rss / 2 ** 20, 1), "peak_rss_mb": None}
+        values: Dict[str, Optional[float]] = {"rss_mb": None, "peak_rss_mb": None}
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        values["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+                    elif line.startswith("VmHWM:"):
+                        values["peak_rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+        return values
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_for_server(url: str, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with websockets.connect(url):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"server not reachable on {url}")
+            await asyncio.sleep(0.1)
+
+
+def run_scenario(clients: int, rate: float, size: int, duration: float, warmup: float,
+                 server_args: List[str], client_procs: int,
+                 client_options: Optional[dict]) -> Dict[str, Any]:
+    source = SyntheticSource(rate, size)
+    wsport = free_port()
+    url = f"ws://127.0.0.1:{wsport}/telemetry"
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                      "server_real_rf_system.py"),
+         "--port", source.path, "--wsport", str(wsport), "--client-buffer", "100000",
+         "--http-port", "0", *server_args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    threading.Thread(target=source.drain, daemon=True).start()
+    try:
+        asyncio.run(wait_for_server(url))
+        # Verbindungsaufbau großzügig einplanen: ca. 5 ms pro Client
+        window_start = time.time() + 1.0 + clients * 0.005 + warmup
+        window_end = window_start + duration
+        source.window = (int(window_start * 1e9), int(window_end * 1e9))
+        source.start()
+        procs = max(1, min(client_procs, clients))
+        shares = [clients // procs + (1 if i < clients % procs else 0) for i in range(procs)]
+        stats = ProcessStats(server.pid)
+        with multiprocessing.get_context("spawn").Pool(procs) as pool:
+            pending = pool.starmap_async(run_clients, [
+                (url, share, window_start, window_end, client_options) for share in shares])
+            time.sleep(max(0.0, window_start - time.time()))
+            cpu_start, wall_start = stats.cpu_seconds(), time.perf_counter()
+            time.sleep(max(0.0, window_end - time.time()))
+            cpu_end, wall = stats.cpu_seconds(), time.perf_counter() - wall_start
+            memory = stats.rss_mb()
+            results = pending.get(timeout=duration + GRACE_S + 60)
+    finally:
+        source.stop()
+        server.terminate()
+        try:
+            server.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    latencies = [v for r in results for v in r["latencies"]]
+    received = sum(r["received"] for r in results)
+    expected = source.window_sent * (clients - sum(r["failed"] for r in results))
+    cpu = None
+    if cpu_start is not None and cpu_end is not None and wall > 0:
+        cpu = round((cpu_end - cpu_start) / wall * 100.0, 1)
+    return {
+        "clients": clients,
+        "rate": rate,
+        "size": size,
+        "duration_s": duration,
+        "lines_sent": source.window_sent,
+        "lines_sent_per_s": round(source.window_sent / duration, 1),
+        "lines_received": received,
+        "lines_received_per_s": round(received / duration, 1),
+        "lines_missing": max(0, expected - received),
+        "connect_failures": sum(r["failed"] for r in results),
+        "latency_ms": percentiles(latencies),
+        "server_cpu_percent": cpu,
+        **memory,
+    }
+
+
+def parse_list(value: str, cast=int) -> List[Any]:
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-End-Benchmark des Telemetrie-Servers")
+    parser.add_argument("--clients", default="1,10,100", help="Kommaliste, z.B. 1,10,100,1000")
+    parser.add_argument("--rate", default="1000", help="Zeilen/s der Quelle (Kommaliste)")
+    parser.add_argument("--size", default="200", help="Bytes pro Zeile (Kommaliste)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Messfenster in s")
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--client-procs", type=int, default=os.cpu_count() or 1,
+                        help="Prozesse für die Clients")
+    parser.add_argument("--server-args", default="", help="Zusätzliche Server-Optionen")
+    parser.add_argument("--client-options", help='JSON an jeden Client, z.B. \'{"batch": {"ms": 20}}\'')
+    parser.add_argument("--output", help="Ergebnis-JSON hierhin statt auf stdout")
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, "openpty"):
+        parser.error("benchmark needs a POSIX pty")
+    server_args = shlex.split(args.server_args)
+    client_options = json.loads(args.client_options) if args.client_options else None
+
+    runs = []
+    for clients, rate, size in itertools.product(
+            parse_list(args.clients), parse_list(args.rate, float), parse_list(args.size)):
+        print(f"[..] clients={clients} rate={rate:g}/s size={size}B", file=sys.stderr)
+        result = run_scenario(clients, rate, size, args.duration, args.warmup,
+                              server_args, args.client_procs, client_options)
+        print(f"     p50={result['latency_ms'].get('p50')}ms "
+              f"p99={result['latency_ms'].get('p99')}ms "
+              f"recv={result['lines_received_per_s']}/s cpu={result['server_cpu_percent']}%",
+              file=sys.stderr)
+        runs.append(result)
+
+    report = {
+        "benchmark": "telemetry_e2e",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "websockets": websockets.__version__,
+        "server_args": server_args,
+        "client_options": client_options,
+        "runs": runs,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+Telemetrie-Frames und binäre Wire-Formate für den `/telemetry`-Stream.
+
+Eine serielle Zeile wird genau einmal in einen `TelemetryFrame` verpackt und über
+den Hub an alle Clients verteilt. Abgeleitete Daten (geparstes JSON, binäre
+Kodierungen) werden pro Frame einmalig erzeugt und zwischengespeichert, nicht
+pro Client.
+
+Kodierungen:
+  - json:    unveränderte Zeile als Text-Frame (Standard)
+  - msgpack: MessagePack (optional, `pip install msgpack`)
+  - cbor:    CBOR (optional, `pip install cbor2`)
+  - struct:  feste Binärstruktur laut Schema-Registry:
+             `<H` Schema-ID, danach die Felder in Schema-Reihenfolge (Little Endian).
+             Zeilen ohne passendes Schema gehen weiterhin als JSON-Text raus.
+  - delta:   JSON-Text, zustandsbehaftet pro Client (`DeltaEncoder`): pro Gerät
+             zuerst und danach alle N Zeilen ein Keyframe
+             `{"dev": key, "full": {...}}`, dazwischen nur die geänderten
+             Top-Level-Felder gegenüber der zuletzt gesendeten Zeile
+             `{"dev": key, "set": {...}, "del": [...]}`. Der Client setzt die
+             Zeile durch Überschreiben/Löschen dieser Felder wieder zusammen.
+"""
+from __future__ import annotations
+
+import json
+import struct
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from telemetry_state import TelemetryState
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import cbor2
+    CBOR_AVAILABLE = True
+except ImportError:
+    CBOR_AVAILABLE = False
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+ENCODING_CBOR = "cbor"
+ENCODING_STRUCT = "struct"
+ENCODING_DELTA = "delta"
+
+ENCODINGS = (ENCODING_JSON, ENCODING_MSGPACK, ENCODING_CBOR, ENCODING_STRUCT, ENCODING_DELTA)
+
+# Nur numerische Typen: Strings haben keine feste Länge
+STRUCT_TYPES = "bBhHiIqQfd?"
+
+_SCHEMA_HEADER = struct.Struct("<H")
+
+
+def available_encodings() -> List[str]:
+    available = [ENCODING_JSON, ENCODING_STRUCT, ENCODING_DELTA]
+    if MSGPACK_AVAILABLE:
+        available.append(ENCODING_MSGPACK)
+    if CBOR_AVAILABLE:
+        available.append(ENCODING_CBOR)
+    return available
+
+
+@dataclass
+class TelemetrySchema:
+    """Kompakte Binärstruktur für Zeilen, deren Felder `match` entsprechen."""
+    id: int
+    fields: Dict[str, str]               # Feldname -> struct-Typ, Reihenfolge = Wire-Reihenfolge
+    match: Dict[str, Any] = field(default_factory=dict)  # z.B. {"device": "sx1276_001"}
+    name: str = ""
+
+    def __post_init__(self):
+        if not 0 <= self.id <= 0xFFFF:
+            raise ValueError(f"schema id out of range: {self.id}")
+        if not self.fields:
+            raise ValueError(f"schema {self.id} has no fields")
+        for name, typ in self.fields.items():
+            if len(typ) != 1 or typ not in STRUCT_TYPES:
+                raise ValueError(f"schema {self.id}: unsupported type {typ!r} for {name}")
+        self.format = "<" + "".join(self.fields.values())
+        self._struct = struct.Struct(self.format)
+        self._header = _SCHEMA_HEADER.pack(self.id)
+
+    def matches(self, data: Dict[str, Any]) -> bool:
+        return all(data.get(k) == v for k, v in self.match.items())
+
+    def pack(self, data: Dict[str, Any]) -> Optional[bytes]:
+        """Packt die Schemafelder; None, wenn ein Feld fehlt oder nicht passt."""
+        try:
+            values = [data[name] for name in self.fields]
+            return self._header + self._struct.pack(*values)
+        except (KeyError, struct.error):
+            return None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "match": self.match,
+            "fields": list(self.fields),
+            "format": self.format,
+            "size": _SCHEMA_HEADER.size + self._struct.size,
+        }
+
+
+class SchemaRegistry:
+    """Ordnet Geräte-Telemetrie einem `TelemetrySchema` zu (erster Treffer gewinnt)."""
+
+    def __init__(self, schemas: Iterable[TelemetrySchema] = ()):
+        self.schemas: Dict[int, TelemetrySchema] = {}
+        for schema in schemas:
+            self.register(schema)
+
+    @classmethod
+    def from_file(cls, path: str) -> "SchemaRegistry":
+        """Lädt eine JSON-Liste: [{"id": 1, "match": {...}, "fields": {"rssi": "f"}}, ...]"""
+        with open(path, "r", encoding="utf-8") as f:
+            specs = json.load(f)
+        return cls(TelemetrySchema(**spec) for spec in specs)
+
+    def register(self, schema: TelemetrySchema) -> None:
+        if schema.id in self.schemas:
+            raise ValueError(f"duplicate schema id: {schema.id}")
+        self.schemas[schema.id] = schema
+
+    def lookup(self, data: Dict[str, Any]) -> Optional[TelemetrySchema]:
+        for schema in self.schemas.values():
+            if schema.matches(data):
+                return schema
+        return None
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [s.describe() for s in self.schemas.values()]
+
+
+def topic_field(topic: str) -> bytes:
+    """JSON-Feld `"topic":"...",` zum Einfügen per `tag_line()`."""
+    return b'"topic":' + json.dumps(topic).encode() + b","
+
+
+def seq_field(seq: int) -> bytes:
+    return b'"seq":%d,' % seq
+
+
+def tag_line(line: Union[str, bytes], fields: bytes) -> Union[str, bytes]:
+    """
+    Fügt fertig serialisierte Felder (`"key":value,` ...) vorne in ein JSON-Objekt
+    ein, ohne die Zeile zu parsen (eine Kopie pro Zeile). Nicht-Objekte bleiben
+    unverändert.
+    """
+    if isinstance(line, str):
+        return tag_line(line.encode(), fields).decode()  # type: ignore[union-attr]
+    body = line.lstrip()
+    if body[:1] != b"{" or not fields:
+        return line
+    rest = body[1:]
+    if rest.lstrip()[:1] == b"}":
+        return b"{" + fields[:-1] + rest
+    return b"{" + fields + rest
+
+
+class TelemetryFrame:
+    """Eine Telemetriezeile inkl. einmalig berechneter Ableitungen."""
+
+    __slots__ = ("raw", "topic", "seq", "_data", "_encoded")
+
+    _UNPARSED = object()
+
+    def __init__(self, raw: Union[str, bytes], topic: str = "", seq: int = 0):
+        self.raw = raw
+        self.topic = topic
+        self.seq = seq
+        self._data: Any = self._UNPARSED
+        self._encoded: Optional[Dict[str, Optional[bytes]]] = None
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    @property
+    def data(self) -> Optional[Dict[str, Any]]:
+        """Geparstes JSON-Objekt (lazy), None für Nicht-Objekte."""
+        if self._data is self._UNPARSED:
+            try:
+                data = json.loads(self.raw)
+            except ValueError:
+                data = None
+            self._data = data if isinstance(data, dict) else None
+        return self._data
+
+    def encode(self, encoding: str, registry: Optional[SchemaRegistry] = None) -> Optional[bytes]:
+        """Binäre Kodierung (einmal pro Frame); None heißt: als JSON-Text senden."""
+        if self._encoded is None:
+            self._encoded = {}
+        elif encoding in self._encoded:
+            return self._encoded[encoding]
+        data = self.data
+        encoded: Optional[bytes] = None
+        if data is not None:
+            if encoding == ENCODING_MSGPACK:
+                encoded = msgpack.packb(data)
+            elif encoding == ENCODING_CBOR:
+                encoded = cbor2.dumps(data)
+            elif encoding == ENCODING_STRUCT and registry is not None:
+                schema = registry.lookup(data)
+                encoded = schema.pack(data) if schema else None
+        self._encoded[encoding] = encoded
+        return encoded
+
+
+class DeltaEncoder:
+    """
+    Zustand eines Clients für `encoding=delta`: letzte gesendete Zeile pro Gerät.
+
+    Diffs beziehen sich immer auf das, was dieser Client tatsächlich bekommen hat
+    (nach Filter, Rate-Limit usw.), deshalb gibt es den Encoder pro Verbindung und
+    nicht pro Frame.
+    """
+
+    def __init__(self, keyframe_interval: int = 100):
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be >= 1")
+        self.keyframe_interval = keyframe_interval
+        self.last: Dict[str, Dict[str, Any]] = {}
+        self.since_keyframe: Dict[str, int] = {}
+        self.keyframes = 0
+        self.deltas = 0
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+
+    def reset(self) -> None:
+        """Nächste Zeile jedes Geräts wieder als Keyframe senden."""
+        self.last.clear()
+        self.since_keyframe.clear()
+
+    def encode(self, frame: TelemetryFrame) -> bytes:
+        """
+        Keyframe oder Diff für `frame`; Nicht-Objekte gehen unverändert raus. Immer
+        `bytes`, damit sich alle Ergebnisse per `join_batch()` verbinden lassen.
+        """
+        data = frame.data
+        raw = frame.raw.encode() if isinstance(frame.raw, str) else frame.raw
+        if data is None:
+            return raw
+        key = TelemetryState.device_key(data, frame.topic)
+        previous = self.last.get(key)
+        count = self.since_keyframe.get(key, 0)
+        self.last[key] = data  # geteilt mit anderen Clients, wird nie verändert
+        head = b'{"dev":' + json.dumps(key).encode()
+        if previous is None or count + 1 >= self.keyframe_interval:
+            self.since_keyframe[key] = 0
+            self.keyframes += 1
+            message = head + b',"full":' + raw.strip() + b"}"
+        else:
+            self.since_keyframe[key] = count + 1
+            self.deltas += 1
+            changed = {k: v for k, v in data.items()
+                       if k not in previous or previous[k] != v}
+            removed = [k for k in previous if k not in data]
+            message = head + b',"set":' + json.dumps(changed, separators=(",", ":")).encode()
+            if removed:
+                message += b',"del":' + json.dumps(removed, separators=(",", ":")).encode()
+            message += b"}"
+        self.raw_bytes += len(raw)
+        self.sent_bytes += len(message)
+        return message
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "devices": len(self.last),
+            "keyframes": self.keyframes,
+            "deltas": self.deltas,
+            "ratio": round(self.sent_bytes / self.raw_bytes, 3) if self.raw_bytes else None,
+        }
+
+
+def apply_delta(state: Dict[str, Dict[str, Any]], message: Dict[str, Any]) -> Dict[str, Any]:
+    """Gegenstück zu `DeltaEncoder.encode()` (für Clients und Tests): Zeile rekonstruieren."""
+    key = message["dev"]
+    if "full" in message:
+        line = dict(message["full"])
+    else:
+        line = dict(state[key])
+        line.update(message.get("set", {}))
+        for name in message.get("del", ()):
+            line.pop(name, None)
+    state[key] = line
+    return line
+
+
+def _array_header(encoding: str, count: int) -> bytes:
+    if encoding == ENCODING_MSGPACK:
+        if count < 16:
+            return bytes([0x90 | count])
+        if count < 0x10000:
+            return b"\xdc" + count.to_bytes(2, "big")
+        return b"\xdd" + count.to_bytes(4, "big")
+    # CBOR, Major Type 4
+    if count < 24:
+        return bytes([0x80 | count])
+    if count < 0x100:
+        return b"\x98" + count.to_bytes(1, "big")
+    if count < 0x10000:
+        return b"\x99" + count.to_bytes(2, "big")
+    return b"\x9a" + count.to_bytes(4, "big")
+
+
+def encode_batch(encoding: str, parts: List[bytes]) -> bytes:
+    """
+    Fasst bereits kodierte Frames ohne Neukodierung zusammen: MessagePack/CBOR als
+    Array, struct-Records hintereinander (Länge ergibt sich aus der Schema-ID).
+    """
+    if encoding == ENCODING_STRUCT:
+        return b"".join(parts)
+    return _array_header(encoding, len(parts)) + b"".join(parts)
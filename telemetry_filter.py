@@ -0,0 +1,192 @@
+"""
+Serverseitige Abo-Filter über Telemetriefelder.
+
+Ein Client schickt einen Ausdruck wie
+
+    rssi < -90 and device == "sx1276_001"
+
+der genau einmal in ein Prädikat übersetzt wird; der Hub wertet es pro Zeile vor
+dem Einreihen aus. Die Syntax ist eine kleine Teilmenge von Python-Ausdrücken:
+
+  - Vergleiche:  ==  !=  <  <=  >  >=  (auch verkettet: -100 < rssi < -80)
+  - Mengen:      device in ["a", "b"], mode not in ("tx",)
+  - Logik:       and, or, not, Klammern
+  - Felder:      Namen; verschachtelt per Punkt (gps.lat) oder ["key"] (meta["x-y"])
+  - Literale:    Zahlen, Strings, true/false/null (bzw. True/False/None)
+
+Fehlt ein Feld oder passen die Typen nicht (z.B. String < Zahl), ist der
+Vergleich falsch statt ein Fehler. Funktionsaufrufe, Arithmetik und alles andere
+werden beim Kompilieren abgelehnt.
+"""
+from __future__ import annotations
+
+import ast
+import functools
+import operator
+from typing import Any, Callable, Dict, Optional
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+MAX_EXPRESSION_LENGTH = 1024
+
+_MISSING = object()
+
+_LITERAL_NAMES = {"true": True, "false": False, "null": None,
+                  "True": True, "False": False, "None": None}
+
+_COMPARE_OPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+
+class FilterError(ValueError):
+    """Ausdruck lässt sich nicht übersetzen."""
+
+
+def _field_path(node: ast.AST) -> Optional[tuple]:
+    """`a.b["c"]` -> ("a", "b", "c"); None, wenn der Knoten kein Feldzugriff ist."""
+    if isinstance(node, ast.Name):
+        if node.id in _LITERAL_NAMES:
+            return None
+        return (node.id,)
+    if isinstance(node, ast.Attribute):
+        base = _field_path(node.value)
+        return base + (node.attr,) if base is not None else None
+    if isinstance(node, ast.Subscript):
+        key = node.slice
+        if isinstance(key, getattr(ast, "Index", ())):  # Python < 3.9
+            key = key.value  # type: ignore[attr-defined]
+        if not (isinstance(key, ast.Constant) and isinstance(key.value, str)):
+            raise FilterError("field subscripts must be string literals")
+        base = _field_path(node.value)
+        return base + (key.value,) if base is not None else None
+    return None
+
+
+def _getter(path: tuple) -> Callable[[Dict[str, Any]], Any]:
+    if len(path) == 1:
+        key = path[0]
+        return lambda data: data.get(key, _MISSING)
+
+    def get(data: Dict[str, Any]) -> Any:
+        value: Any = data
+        for key in path:
+            if not isinstance(value, dict):
+                return _MISSING
+            value = value.get(key, _MISSING)
+        return value
+    return get
+
+
+def _literal(node: ast.AST) -> Any:
+    if isinstance(node, ast.Constant) and isinstance(node.value, (str, int, float, bool,
+                                                                  type(None))):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in _LITERAL_NAMES:
+        return _LITERAL_NAMES[node.id]
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _literal(node.operand)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise FilterError("sign needs a number")
+        return -value if isinstance(node.op, ast.USub) else value
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        values = [_literal(elt) for elt in node.elts]
+        try:
+            return frozenset(values)
+        except TypeError:
+            return tuple(values)
+    raise FilterError(f"unsupported expression: {type(node).__name__}")
+
+
+def _operand(node: ast.AST) -> Callable[[Dict[str, Any]], Any]:
+    path = _field_path(node)
+    if path is not None:
+        return _getter(path)
+    value = _literal(node)
+    return lambda data: value
+
+
+def _compare(op: ast.cmpop, left: Callable, right: Callable) -> Predicate:
+    if isinstance(op, (ast.In, ast.NotIn)):
+        negate = isinstance(op, ast.NotIn)
+
+        def contains(data: Dict[str, Any]) -> bool:
+            value, container = left(data), right(data)
+            if value is _MISSING or container is _MISSING:
+                return False
+            try:
+                return (value in container) != negate
+            except TypeError:
+                return False
+        return contains
+    fn = _COMPARE_OPS.get(type(op))
+    if fn is None:
+        raise FilterError(f"unsupported operator: {type(op).__name__}")
+
+    def compare(data: Dict[str, Any]) -> bool:
+        a, b = left(data), right(data)
+        if a is _MISSING or b is _MISSING:
+            return False
+        try:
+            return bool(fn(a, b))
+        except TypeError:
+            return False
+    return compare
+
+
+def _compile(node: ast.AST) -> Predicate:
+    if isinstance(node, ast.BoolOp):
+        parts = tuple(_compile(v) for v in node.values)
+        if isinstance(node.op, ast.And):
+            return lambda data: all(p(data) for p in parts)
+        return lambda data: any(p(data) for p in parts)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        inner = _compile(node.operand)
+        return lambda data: not inner(data)
+    if isinstance(node, ast.Compare):
+        operands = [_operand(node.left)] + [_operand(c) for c in node.comparators]
+        tests = tuple(_compare(op, operands[i], operands[i + 1])
+                      for i, op in enumerate(node.ops))
+        if len(tests) == 1:
+            return tests[0]
+        return lambda data: all(t(data) for t in tests)
+    path = _field_path(node)
+    if path is not None:
+        # Nacktes Feld: wahr, wenn vorhanden und truthy
+        get = _getter(path)
+
+        def truthy(data: Dict[str, Any]) -> bool:
+            value = get(data)
+            return value is not _MISSING and bool(value)
+        return truthy
+    raise FilterError(f"unsupported expression: {type(node).__name__}")
+
+
+@functools.lru_cache(maxsize=256)
+def compile_filter(expression: str) -> Predicate:
+    """
+    Übersetzt einen Filterausdruck in ein Prädikat über ein Telemetrie-Objekt.
+    Gleiche Ausdrücke mehrerer Clients teilen sich das Ergebnis.
+    """
+    if not isinstance(expression, str) or not expression.strip():
+        raise FilterError("filter must be a non-empty string")
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise FilterError(f"filter longer than {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise FilterError(f"invalid filter: {e.msg}") from None
+    return _compile(tree.body)
+
+
+def frame_predicate(predicate: Predicate) -> Callable[[Any], bool]:
+    """Wendet ein Prädikat auf `TelemetryFrame.data` an (einmal pro Frame geparst)."""
+    def check(frame: Any) -> bool:
+        data = frame.data
+        return data is not None and predicate(data)
+    return check
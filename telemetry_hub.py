@@ -0,0 +1,297 @@
+"""
+Broadcast-Hub für Telemetriezeilen des seriellen Backends.
+
+Jeder verbundene WebSocket-Client bekommt einen eigenen, begrenzten Ringpuffer.
+`publish()` blockiert nie: ein langsamer Client füllt nur seinen eigenen Puffer,
+und die Slow-Consumer-Policy entscheidet, was bei vollem Puffer passiert:
+
+  - drop_oldest: älteste Zeile verwerfen, neue anhängen (Standard)
+  - drop_newest: neue Zeile verwerfen
+  - disconnect:  Client wird geschlossen
+
+Pro Client werden Lag (aktuelle Pufferfüllung, Maximum) sowie zugestellte und
+verworfene Zeilen gezählt. Ein optionaler Filter pro Client (z.B. Topic-Abo)
+wird vor dem Einreihen ausgewertet, nicht abonnierte Zeilen belegen keinen Puffer.
+
+Mit `conflate(key)` hält ein Client statt der Warteschlange nur den neuesten Wert
+pro Schlüssel (z.B. pro Gerät); ältere Werte werden überschrieben und als
+`conflated` gezählt. Der Puffer ist dann durch die Zahl der Schlüssel begrenzt.
+
+`ReplayRing` vergibt fortlaufende Sequenznummern und hält die letzten N Frames,
+damit ein Client nach einem Reconnect die verpasste Lücke nachgeliefert bekommt.
+"""
+from __future__ import annotations
+
+import asyncio
+import collections
+import enum
+import itertools
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+
+class SlowConsumerPolicy(str, enum.Enum):
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    DISCONNECT = "disconnect"
+
+
+class ClientQueue:
+    """Begrenzter Ringpuffer eines einzelnen Clients inkl. Lag-/Drop-Zählern."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, maxlen: int, policy: SlowConsumerPolicy, name: str = ""):
+        if maxlen < 1:
+            raise ValueError("maxlen must be >= 1")
+        self.id = next(self._ids)
+        self.name = name or f"client-{self.id}"
+        self.maxlen = maxlen
+        self.policy = policy
+        self.buffer: Deque[Any] = collections.deque()
+        self.replaying: Deque[Any] = collections.deque()  # Nachlieferung, vor `buffer`
+        self.filter: Optional[Callable[[Any], bool]] = None
+        self.key: Optional[Callable[[Any], Any]] = None  # gesetzt: nur neuester Wert je Schlüssel
+        self.latest: Dict[Any, Any] = {}
+        self.closed = False
+        self.close_reason = ""
+        self.delivered = 0
+        self.dropped = 0
+        self.filtered = 0
+        self.conflated = 0
+        self.max_lag = 0
+        self._waiter: Optional[asyncio.Future] = None
+
+    @property
+    def lag(self) -> int:
+        return len(self.buffer) + len(self.replaying) + len(self.latest)
+
+    def push(self, item: Any) -> bool:
+        """Hängt eine Zeile an. Liefert False, wenn der Client getrennt wurde."""
+        if self.closed:
+            return False
+        if self.filter is not None and not self.filter(item):
+            self.filtered += 1
+            return True
+        if self.key is not None:
+            self._store_latest(item)
+            if len(self.latest) > self.max_lag:
+                self.max_lag = len(self.latest)
+            self._wakeup()
+            return True
+        if len(self.buffer) >= self.maxlen:
+            if self.policy is SlowConsumerPolicy.DROP_NEWEST:
+                self.dropped += 1
+                return True
+            if self.policy is SlowConsumerPolicy.DISCONNECT:
+                self.dropped += 1
+                self.close("slow consumer")
+                return False
+            self.buffer.popleft()
+            self.dropped += 1
+        self.buffer.append(item)
+        if len(self.buffer) > self.max_lag:
+            self.max_lag = len(self.buffer)
+        self._wakeup()
+        return True
+
+    def _store_latest(self, item: Any) -> None:
+        key = self.key(item)  # type: ignore[misc]
+        if key in self.latest:
+            self.conflated += 1
+        self.latest[key] = item
+
+    def conflate(self, key: Optional[Callable[[Any], Any]]) -> None:
+        """
+        Schaltet auf "neuester Wert je `key(item)`" um (None: wieder Warteschlange).
+        Bereits gepufferte Zeilen werden dabei zusammengefasst bzw. übernommen.
+        """
+        self.key = key
+        if key is not None:
+            while self.buffer:
+                self._store_latest(self.buffer.popleft())
+        else:
+            self.buffer.extend(self.latest.values())
+            self.latest.clear()
+        self._wakeup()
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wartet, bis Zeilen anliegen. False bei Timeout oder geschlossenem Client."""
+        if not self.buffer and not self.replaying and not self.latest and not self.closed:
+            loop = asyncio.get_running_loop()
+            self._waiter = loop.create_future()
+            timer = loop.call_later(timeout, self._wakeup) if timeout is not None else None
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+                if timer is not None:
+                    timer.cancel()
+        return bool(self.buffer or self.replaying or self.latest) and not self.closed
+
+    async def get(self) -> Any:
+        """Wartet auf die nächste Zeile. Liefert None, sobald der Client geschlossen ist."""
+        while not await self.wait():
+            if self.closed:
+                return None
+        return self.get_nowait()
+
+    def get_nowait(self) -> Any:
+        """Nächste Zeile ohne zu warten, None wenn der Puffer leer ist."""
+        if self.closed:
+            return None
+        if self.replaying:
+            self.delivered += 1
+            return self.replaying.popleft()
+        if self.buffer:
+            self.delivered += 1
+            return self.buffer.popleft()
+        if self.latest:
+            self.delivered += 1
+            return self.latest.pop(next(iter(self.latest)))
+        return None
+
+    def drain(self) -> List[Any]:
+        """Alles Anliegende auf einmal (Nachlieferung, Puffer, neueste Werte)."""
+        if self.closed:
+            return []
+        items = list(self.replaying)
+        items.extend(self.buffer)
+        items.extend(self.latest.values())
+        self.replaying.clear()
+        self.buffer.clear()
+        self.latest.clear()
+        self.delivered += len(items)
+        return items
+
+    def replay(self, items: List[Any]) -> int:
+        """
+        Ersetzt den Puffer durch eine Nachlieferung (z.B. aus `ReplayRing.since()`),
+        die alle bisher eingereihten Zeilen bereits enthält. Die Nachlieferung zählt
+        nicht gegen `maxlen`, damit die Policy keine Lücke hineinreißt. Im Conflate-Modus
+        wird die Nachlieferung stattdessen zu den neuesten Werten zusammengefasst.
+        """
+        if self.closed:
+            return 0
+        if self.filter is not None:
+            items = [item for item in items if self.filter(item)]
+        self.buffer.clear()
+        if self.key is not None:
+            self.latest.clear()
+            for item in items:
+                self._store_latest(item)
+            self._wakeup()
+            return len(items)
+        self.replaying = collections.deque(items)
+        self._wakeup()
+        return len(items)
+
+    def close(self, reason: str = "") -> None:
+        if not self.closed:
+            self.closed = True
+            self.close_reason = reason
+            self.buffer.clear()
+            self.replaying.clear()
+            self.latest.clear()
+            self._wakeup()
+
+    def _wakeup(self) -> None:
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "client": self.name,
+            "policy": self.policy.value,
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "filtered": self.filtered,
+            "conflated": self.conflated,
+            "closed": self.closed,
+        }
+
+
+class TelemetryHub:
+    """Verteilt jede Zeile an alle abonnierten Clients (Fan-out)."""
+
+    def __init__(self, maxlen: int = 1024,
+                 policy: SlowConsumerPolicy = SlowConsumerPolicy.DROP_OLDEST):
+        self.maxlen = maxlen
+        self.policy = SlowConsumerPolicy(policy)
+        self.clients: Set[ClientQueue] = set()
+        self.published = 0
+
+    def subscribe(self, name: str = "", maxlen: Optional[int] = None,
+                  policy: Optional[SlowConsumerPolicy] = None) -> ClientQueue:
+        client = ClientQueue(
+            maxlen or self.maxlen,
+            SlowConsumerPolicy(policy) if policy else self.policy,
+            name,
+        )
+        self.clients.add(client)
+        return client
+
+    def unsubscribe(self, client: ClientQueue) -> None:
+        client.close()
+        self.clients.discard(client)
+
+    def publish(self, item: Any) -> None:
+        """Nicht-blockierend; muss aus dem Event-Loop aufgerufen werden."""
+        self.published += 1
+        for client in tuple(self.clients):
+            if not client.push(item):
+                self.clients.discard(client)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [c.stats() for c in sorted(self.clients, key=lambda c: c.id)]
+
+
+class ReplayRing:
+    """
+    Fortlaufende Sequenznummern plus die letzten `size` Frames.
+
+    Die Zählung beginnt bei der aktuellen Zeit in Mikrosekunden und ist damit auch
+    über Server-Neustarts monoton: eine Nummer aus einem früheren Lauf liegt immer
+    vor dem Ring und wird als Lücke gemeldet statt falsch nachgeliefert.
+    """
+
+    def __init__(self, size: int, start: Optional[int] = None):
+        if size < 1:
+            raise ValueError("size must be >= 1")
+        self.size = size
+        self.frames: Deque[Any] = collections.deque(maxlen=size)
+        self.last_seq = time.time_ns() // 1000 if start is None else start
+
+    def next_seq(self) -> int:
+        self.last_seq += 1
+        return self.last_seq
+
+    def append(self, frame: Any) -> None:
+        """Frame mit der zuletzt vergebenen Nummer (`frame.seq`) aufnehmen."""
+        self.frames.append(frame)
+
+    @property
+    def first_seq(self) -> int:
+        """Älteste noch nachlieferbare Nummer."""
+        return self.frames[0].seq if self.frames else self.last_seq + 1
+
+    def since(self, seq: int) -> Optional[List[Any]]:
+        """
+        Alle Frames nach `seq`. None, wenn die Lücke nicht mehr im Ring liegt oder
+        `seq` unbekannt ist (aus der Zukunft bzw. einem anderen Server).
+        """
+        if seq > self.last_seq:
+            return None
+        if seq == self.last_seq:
+            return []
+        first = self.first_seq
+        if seq + 1 < first:
+            return None
+        return list(itertools.islice(self.frames, seq + 1 - first, None))
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": self.size, "buffered": len(self.frames),
+                "first_seq": self.first_seq, "last_seq": self.last_seq}
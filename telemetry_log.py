@@ -0,0 +1,252 @@
+"""
+Segmentiertes, append-only Telemetrie-Log auf der Platte.
+
+Jede Zeile wird mit Empfangszeitpunkt als Record `<dI` (Zeit, Länge) + Rohzeile an
+das aktive Segment gehängt. Ein Segment wird geschlossen, sobald es `segment_bytes`
+erreicht; der Dateiname ist die Startzeit in Mikrosekunden, die Reihenfolge der
+Segmente damit die zeitliche. Pro Segment führt eine `.idx`-Datei einen dünnen
+Zeitindex (ein Eintrag `<dQ` alle `index_interval` Bytes), Leser suchen per
+Binärsuche den Einstieg und lesen ab dort per mmap, ohne ganze Dateien zu laden.
+
+Aufbewahrung nach Gesamtgröße und/oder Alter: es werden immer ganze, geschlossene
+Segmente gelöscht, die älteste zuerst.
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from telemetry_state import TelemetryState
+
+RECORD = struct.Struct("<dI")       # Zeit (s seit Epoch), Länge der Zeile
+INDEX_ENTRY = struct.Struct("<dQ")  # Zeit, Offset des Records im Segment
+
+SEGMENT_SUFFIX = ".log"
+INDEX_SUFFIX = ".idx"
+
+
+class _Segment:
+    __slots__ = ("base", "path", "index_path", "size")
+
+    def __init__(self, directory: str, base: int):
+        self.base = base  # Startzeit in Mikrosekunden
+        self.path = os.path.join(directory, f"{base:020d}{SEGMENT_SUFFIX}")
+        self.index_path = os.path.join(directory, f"{base:020d}{INDEX_SUFFIX}")
+        self.size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    @property
+    def first_ts(self) -> float:
+        return self.base / 1e6
+
+    def load_index(self) -> Tuple[List[float], List[int]]:
+        try:
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return [], []
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        times: List[float] = []
+        offsets: List[int] = []
+        for ts, offset in INDEX_ENTRY.iter_unpack(data[:usable]):
+            times.append(ts)
+            offsets.append(offset)
+        return times, offsets
+
+    def scan(self, start: float, end: float) -> Iterator[Tuple[float, bytes]]:
+        """Records mit `start <= t <= end`; ein abgeschnittener letzter Record endet den Scan."""
+        times, offsets = self.load_index()
+        # Letzter Eintrag echt vor `start`: gleiche Zeiten können über mehrere
+        # Index-Einträge reichen, die Records davor gehören dann schon dazu
+        i = bisect.bisect_left(times, start) - 1
+        offset = offsets[i] if i >= 0 else 0
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return  # inzwischen per Retention gelöscht
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= offset:
+                return
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+                while offset + RECORD.size <= size:
+                    ts, length = RECORD.unpack_from(mm, offset)
+                    body = offset + RECORD.size
+                    if ts > end or body + length > size:
+                        break
+                    if ts >= start:
+                        yield ts, mm[body:body + length]
+                    offset = body + length
+
+
+def _select(raw: bytes, device: Optional[str],
+            fields: Optional[Sequence[str]]) -> Union[None, bytes, Dict[str, Any]]:
+    """Rohzeile (ohne `fields`) bzw. Dict der gewünschten Felder; None wenn nicht passend."""
+    if device is None and fields is None:
+        return raw
+    if device is not None and device.encode() not in raw:
+        return None  # billige Vorprüfung vor dem Parsen
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    if device is not None and TelemetryState.device_key(data, data.get("topic", "")) != device:
+        return None
+    if fields is None:
+        return raw
+    selected = {name: data[name] for name in fields if name in data}
+    return selected or None
+
+
+class TelemetryLog:
+    """Schreibt Telemetrie in Segmente und beantwortet Zeitbereichs-Abfragen."""
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024,
+                 index_interval: int = 4096, retention_bytes: Optional[int] = None,
+                 retention_seconds: Optional[float] = None):
+        if segment_bytes < RECORD.size + 1:
+            raise ValueError("segment_bytes too small")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.index_interval = max(1, index_interval)
+        self.retention_bytes = retention_bytes
+        self.retention_seconds = retention_seconds
+        self.segments: List[_Segment] = sorted(
+            (_Segment(directory, int(name[:-len(SEGMENT_SUFFIX)]))
+             for name in os.listdir(directory)
+             if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()),
+            key=lambda s: s.base,
+        )
+        self.appended = 0
+        self.deleted_segments = 0
+        self._file = None
+        self._index_file = None
+        self._next_index = 0
+        self._last_ts = self.segments[-1].first_ts if self.segments else 0.0
+        # Nach einem Neustart wird immer in ein frisches Segment geschrieben,
+        # angelegt mit der ersten Zeile (deren Zeit bestimmt den Namen)
+
+    @property
+    def active(self) -> _Segment:
+        return self.segments[-1]
+
+    def total_bytes(self) -> int:
+        return sum(segment.size for segment in self.segments)
+
+    def append(self, line: Union[str, bytes], ts: Optional[float] = None) -> None:
+        """Hängt eine Zeile an (gepuffert, siehe `flush()`)."""
+        if isinstance(line, str):
+            line = line.encode()
+        ts = time.time() if ts is None else ts
+        if ts < self._last_ts:
+            ts = self._last_ts  # monoton halten, sonst stimmt die Binärsuche nicht
+        self._last_ts = ts
+        size = RECORD.size + len(line)
+        if self._file is None or (self.active.size
+                                  and self.active.size + size > self.segment_bytes):
+            self._roll(ts)
+        segment = self.active
+        if segment.size >= self._next_index:
+            self._index_file.write(INDEX_ENTRY.pack(ts, segment.size))
+            self._next_index = segment.size + self.index_interval
+        self._file.write(RECORD.pack(ts, len(line)))
+        self._file.write(line)
+        segment.size += size
+        self.appended += 1
+
+    def _roll(self, ts: float) -> None:
+        self._close_files()
+        base = int(ts * 1e6)
+        if self.segments and base <= self.active.base:
+            base = self.active.base + 1
+        segment = _Segment(self.directory, base)
+        self.segments.append(segment)
+        self._file = open(segment.path, "ab")
+        self._index_file = open(segment.index_path, "ab")
+        self._next_index = 0
+        self.enforce_retention(ts)
+
+    def flush(self, fsync: bool = False) -> None:
+        """Schreibt gepufferte Records auf die Platte (mit `fsync` auch durabel)."""
+        for f in (self._file, self._index_file):
+            if f is not None:
+                f.flush()
+                if fsync:
+                    os.fsync(f.fileno())
+
+    def enforce_retention(self, now: Optional[float] = None) -> int:
+        """Löscht geschlossene Segmente über dem Größen- oder Altersbudget."""
+        now = time.time() if now is None else now
+        removed = 0
+        total = self.total_bytes()
+        while len(self.segments) > 1:
+            oldest, following = self.segments[0], self.segments[1]
+            too_big = self.retention_bytes is not None and total > self.retention_bytes
+            # Der letzte Record eines Segments ist älter als der Start des nächsten
+            too_old = (self.retention_seconds is not None
+                       and following.first_ts < now - self.retention_seconds)
+            if not (too_big or too_old):
+                break
+            try:
+                os.remove(oldest.path)
+                if os.path.exists(oldest.index_path):
+                    os.remove(oldest.index_path)
+            except OSError:
+                break  # z.B. unter Windows noch von einem Leser geöffnet; später erneut
+            self.segments.pop(0)
+            total -= oldest.size
+            removed += 1
+        self.deleted_segments += removed
+        return removed
+
+    def query(self, start: float, end: float, device: Optional[str] = None,
+              fields: Optional[Sequence[str]] = None
+              ) -> Iterator[Tuple[float, Union[bytes, Dict[str, Any]]]]:
+        """
+        Liefert `(zeit, zeile)` aller Records zwischen `start` und `end`, optional nur
+        für ein Gerät und/oder nur ausgewählte Felder (dann `zeile` als Dict).
+        Vorher `flush()` aufrufen, damit auch das aktive Segment vollständig ist.
+        """
+        segments = list(self.segments)
+        chosen = [
+            segment for i, segment in enumerate(segments)
+            if segment.first_ts <= end
+            # Segmentnamen sind auf Mikrosekunden abgerundet
+            and (i + 1 == len(segments) or segments[i + 1].first_ts + 1e-6 >= start)
+        ]
+        return self._query(chosen, start, end, device, fields)
+
+    @staticmethod
+    def _query(segments: List[_Segment], start: float, end: float, device: Optional[str],
+               fields: Optional[Sequence[str]]
+               ) -> Iterator[Tuple[float, Union[bytes, Dict[str, Any]]]]:
+        for segment in segments:
+            for ts, raw in segment.scan(start, end):
+                selected = _select(raw, device, fields)
+                if selected is not None:
+                    yield ts, selected
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "segments": len(self.segments),
+            "bytes": self.total_bytes(),
+            "appended": self.appended,
+            "deleted_segments": self.deleted_segments,
+            "first_ts": self.segments[0].first_ts if self.segments else None,
+        }
+
+    def _close_files(self) -> None:
+        for f in (self._file, self._index_file):
+            if f is not None:
+                f.close()
+        self._file = self._index_file = None
+
+    def close(self) -> None:
+        self._close_files()
@@ -0,0 +1,192 @@
+"""
+Prometheus-Metriken und Health-Check für das serielle Backend.
+
+Der heiße Pfad erhöht nur Ganzzahl-Zähler eines `Metrics`-Objekts. Alles läuft im
+selben Event-Loop, es gibt also weder Sperren noch atomare Operationen, und ein
+Abruf liest nur, was ohnehin gezählt wird. Raten pro Sekunde entstehen im
+Sekundentakt (`Metrics.tick()`), Perzentile und Queue-Tiefen erst beim Abruf aus
+den Statistiken von Hub, Scheduler und AT-Engine.
+
+HTTP (minimal, `asyncio.start_server` im selben Loop):
+  - GET /health   200 {"status": "ok", ...}, wenn alle Ports verbunden sind, sonst 503
+  - GET /metrics  Prometheus-Textformat 0.0.4
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Response = Tuple[int, str, bytes]  # (Status, Content-Type, Body)
+
+_REASONS = {200: "OK", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+class Metrics:
+    """Zähler des Prozesses; wird nur aus dem Event-Loop verändert."""
+
+    def __init__(self, topics: Iterable[str] = ()):
+        self.started = time.time()
+        self.lines_received: Dict[str, int] = dict.fromkeys(topics, 0)
+        self.lines_sent = 0      # Zeilen, die an Clients gingen (über alle Clients)
+        self.messages_sent = 0   # WebSocket-Nachrichten (Batches zählen einmal)
+        self.received_per_second = 0.0
+        self.sent_per_second = 0.0
+        self._last_tick = time.perf_counter()
+        self._last_received = 0
+        self._last_sent = 0
+
+    def tick(self) -> None:
+        """Raten seit dem letzten Aufruf berechnen (z.B. einmal pro Sekunde)."""
+        now = time.perf_counter()
+        elapsed = now - self._last_tick
+        if elapsed <= 0:
+            return
+        received = sum(self.lines_received.values())
+        self.received_per_second = (received - self._last_received) / elapsed
+        self.sent_per_second = (self.lines_sent - self._last_sent) / elapsed
+        self._last_tick, self._last_received, self._last_sent = now, received, self.lines_sent
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Exposition:
+    """Baut eine Seite im Prometheus-Textformat auf."""
+
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def metric(self, name: str, kind: str, help_text: str) -> None:
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name: str, value: Any, **labels: Any) -> None:
+        if value is None:
+            return
+        if isinstance(value, bool):
+            value = int(value)
+        if labels:
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            self.lines.append(f"{name}{{{label_text}}} {value}")
+        else:
+            self.lines.append(f"{name} {value}")
+
+    def render(self) -> bytes:
+        return ("\n".join(self.lines) + "\n").encode()
+
+
+def render_metrics(metrics: Metrics, clients: List[Dict[str, Any]],
+                   serial: Dict[str, Dict[str, Any]]) -> bytes:
+    """
+    `clients` wie `TelemetryHub.stats()`, `serial` wie `{topic: SerialBridge.stats()}`.
+    """
+    out = Exposition()
+    out.metric("rf_uptime_seconds", "gauge", "Seconds since server start")
+    out.sample("rf_uptime_seconds", round(time.time() - metrics.started, 3))
+
+    out.metric("rf_lines_received_total", "counter", "Telemetry lines received from serial")
+    for topic, count in metrics.lines_received.items():
+        out.sample("rf_lines_received_total", count, topic=topic)
+    out.metric("rf_lines_received_per_second", "gauge", "Received lines/s over the last tick")
+    out.sample("rf_lines_received_per_second", round(metrics.received_per_second, 3))
+    out.metric("rf_lines_sent_total", "counter", "Telemetry lines sent to WebSocket clients")
+    out.sample("rf_lines_sent_total", metrics.lines_sent)
+    out.metric("rf_lines_sent_per_second", "gauge", "Sent lines/s over the last tick")
+    out.sample("rf_lines_sent_per_second", round(metrics.sent_per_second, 3))
+    out.metric("rf_messages_sent_total", "counter", "WebSocket messages sent (a batch is one)")
+    out.sample("rf_messages_sent_total", metrics.messages_sent)
+
+    out.metric("rf_clients", "gauge", "Connected WebSocket clients")
+    out.sample("rf_clients", len(clients))
+    out.metric("rf_client_queue_depth", "gauge", "Lines waiting in a client's buffer")
+    for c in clients:
+        out.sample("rf_client_queue_depth", c["lag"], client=c["client"])
+    out.metric("rf_client_dropped_total", "counter", "Lines dropped by the slow-consumer policy")
+    for c in clients:
+        out.sample("rf_client_dropped_total", c["dropped"], client=c["client"])
+
+    out.metric("rf_lines_rejected_total", "counter",
+               "Serial lines that failed the JSON check (parse failures, AT responses)")
+    for topic, s in serial.items():
+        out.sample("rf_lines_rejected_total", s.get("rejected"), topic=topic)
+
+    out.metric("rf_command_wait_ms", "gauge", "Command queue latency per scheduler lane")
+    for topic, s in serial.items():
+        for lane, lane_stats in s.get("lanes", {}).items():
+            out.sample("rf_command_wait_ms", lane_stats["wait_p50_ms"],
+                       topic=topic, lane=lane, quantile="0.5")
+            out.sample("rf_command_wait_ms", lane_stats["wait_p99_ms"],
+                       topic=topic, lane=lane, quantile="0.99")
+    out.metric("rf_commands_sent_total", "counter", "Commands written to serial")
+    for topic, s in serial.items():
+        for lane, lane_stats in s.get("lanes", {}).items():
+            out.sample("rf_commands_sent_total", lane_stats["sent"], topic=topic, lane=lane)
+
+    out.metric("rf_at_latency_ms", "gauge", "AT command response latency")
+    for topic, s in serial.items():
+        at = s.get("at", {})
+        out.sample("rf_at_latency_ms", at.get("latency_p50_ms"), topic=topic, quantile="0.5")
+        out.sample("rf_at_latency_ms", at.get("latency_p99_ms"), topic=topic, quantile="0.99")
+    out.metric("rf_at_timeouts_total", "counter", "AT commands without a final result code")
+    for topic, s in serial.items():
+        out.sample("rf_at_timeouts_total", s.get("at", {}).get("timeouts"), topic=topic)
+
+    out.metric("rf_serial_connected", "gauge", "1 while the serial port is open")
+    out.metric("rf_serial_disconnects_total", "counter", "Serial port losses (hot-unplug)")
+    out.metric("rf_serial_reconnects_total", "counter", "Successful serial reconnects")
+    out.metric("rf_serial_last_reconnect_ms", "gauge", "Downtime of the last serial outage")
+    for topic, s in serial.items():
+        link = s.get("link", {})
+        out.sample("rf_serial_connected", link.get("connected"), topic=topic)
+        out.sample("rf_serial_disconnects_total", link.get("disconnects"), topic=topic)
+        out.sample("rf_serial_reconnects_total", link.get("reconnects"), topic=topic)
+        out.sample("rf_serial_last_reconnect_ms", link.get("last_reconnect_ms"), topic=topic)
+    return out.render()
+
+
+def health(serial: Dict[str, Dict[str, Any]], extra: Optional[Dict[str, Any]] = None) -> Response:
+    """200, solange alle Ports verbunden sind; sonst 503 mit den betroffenen Topics."""
+    down = sorted(t for t, s in serial.items() if not s.get("link", {}).get("connected", True))
+    body: Dict[str, Any] = {"status": "degraded" if down else "ok", "serial": sorted(serial)}
+    if down:
+        body["down"] = down
+    if extra:
+        body.update(extra)
+    return (503 if down else 200), "application/json", json.dumps(body).encode()
+
+
+async def serve_http(host: str, port: int, routes: Dict[str, Callable[[], Response]]):
+    """Minimaler HTTP/1.0-Server für GET-Routen; eine Anfrage pro Verbindung."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5.0)
+            while True:  # Header überspringen
+                line = await asyncio.wait_for(reader.readline(), 5.0)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+            method, target = request.decode("latin-1").split()[:2]
+            route = routes.get(target.split("?", 1)[0])
+            if route is None:
+                status, content_type, body = 404, "text/plain", b"not found\n"
+            elif method not in ("GET", "HEAD"):
+                status, content_type, body = 405, "text/plain", b"method not allowed\n"
+            else:
+                status, content_type, body = route()
+            head = (f"HTTP/1.0 {status} {_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    "Connection: close\r\n\r\n").encode()
+            writer.write(head if method == "HEAD" else head + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
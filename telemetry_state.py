@@ -0,0 +1,88 @@
+"""
+Zuletzt bekannter Gerätezustand für sofortiges Client-Onboarding.
+
+Jede Telemetriezeile wird pro Gerät feldweise (rekursiv) in ein Zustandsdokument
+gemischt. Neue Clients bekommen es als erste Nachricht, `{"get": "state"}` liefert
+es jederzeit. Serialisiert wird nur bei Bedarf und nur für geänderte Geräte; die
+fertige Nachricht bleibt gecacht, bis die nächste Zeile eintrifft.
+
+Die Felder, die der Server selbst in jede Zeile einfügt (`seq`, `topic`, siehe
+`tag_line()`), sind keine Gerätedaten und landen nicht im Zustand.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Collection, Dict, Optional
+
+DEVICE_KEYS = ("device", "device_id")
+INJECTED_FIELDS = frozenset({"seq", "topic"})
+
+
+def deep_merge(target: Dict[str, Any], update: Dict[str, Any],
+               skip: Collection[str] = ()) -> None:
+    """
+    Mischt `update` in `target`; verschachtelte Objekte feldweise, alles andere ersetzt.
+    Schlüssel aus `skip` werden (nur auf oberster Ebene) übergangen.
+    """
+    for key, value in update.items():
+        if key in skip:
+            continue
+        if isinstance(value, dict):
+            current = target.get(key)
+            if not isinstance(current, dict):
+                # Eigene Kopie: die Daten des Frames dürfen später nicht mitverändert werden
+                current = target[key] = {}
+            deep_merge(current, value)
+            continue
+        target[key] = value
+
+
+class TelemetryState:
+    """Inkrementell gemischter Zustand aller Geräte mit vorserialisiertem Snapshot."""
+
+    def __init__(self):
+        self.devices: Dict[str, Dict[str, Any]] = {}
+        self.updates = 0
+        self._fragments: Dict[str, Optional[bytes]] = {}
+        self._message: Optional[bytes] = None
+
+    @staticmethod
+    def device_key(data: Dict[str, Any], topic: str = "") -> str:
+        for key in DEVICE_KEYS:
+            value = data.get(key)
+            if isinstance(value, (str, int)):
+                return str(value)
+        return topic or "_"
+
+    def update(self, data: Optional[Dict[str, Any]], topic: str = "") -> None:
+        if not data:
+            return
+        key = self.device_key(data, topic)
+        device = self.devices.get(key)
+        if device is None:
+            device = self.devices[key] = {}
+        deep_merge(device, data, INJECTED_FIELDS)
+        self._fragments[key] = None
+        self._message = None
+        self.updates += 1
+
+    def update_frame(self, frame: Any) -> None:
+        """Übernimmt einen `TelemetryFrame` (nutzt dessen einmal geparste Daten)."""
+        self.update(frame.data, frame.topic)
+
+    def message(self) -> bytes:
+        """`{"state": {...}}` als fertige JSON-Nachricht; O(1) solange sich nichts ändert."""
+        if self._message is None:
+            parts = []
+            for key, device in self.devices.items():
+                fragment = self._fragments.get(key)
+                if fragment is None:
+                    fragment = self._fragments[key] = (
+                        json.dumps(key) + ":" + json.dumps(device, separators=(",", ":"))
+                    ).encode()
+                parts.append(fragment)
+            self._message = b'{"state":{' + b",".join(parts) + b"}}"
+        return self._message
+
+    def snapshot(self) -> Dict[str, Any]:
+        return json.loads(self.message())["state"]
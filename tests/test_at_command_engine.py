@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Tests für die AT-Kommando-Engine mit simuliertem Modem (ohne Hardware)
+"""
+
+import asyncio
+
+import pytest
+
+from at_command_engine import ATAbortedError, ATCommandEngine, ATCommandError, ATTimeoutError
+
+pytestmark = pytest.mark.asyncio
+
+REPLIES = {
+    "AT": ["OK"],
+    "AT+CSQ": ["+CSQ: 20,99", "OK"],
+    "AT+CGMI": ["Quectel", "OK"],
+    "AT+BAD": ["+CME ERROR: 3"],
+}
+
+
+class FakeModem:
+    """Antwortet in Kommando-Reihenfolge; `silent` Kommandos bleiben unbeantwortet."""
+
+    def __init__(self, silent=()):
+        self.written = []
+        self.silent = set(silent)
+        self.engine = None
+
+    def write(self, line):
+        assert line.endswith("\r")  # V.250-Abschluss, kein "\n"
+        command = line[:-1]
+        self.written.append(command)
+        if command in self.silent:
+            return
+        loop = asyncio.get_running_loop()
+        for line in REPLIES[command]:
+            loop.call_soon(self.engine.feed_line, line)
+
+
+def make_engine(depth=1, timeout=1.0, silent=(), urcs=None):
+    modem = FakeModem(silent)
+    modem.engine = ATCommandEngine(modem.write, pipeline_depth=depth, timeout=timeout,
+                                   stale_after=0.05,
+                                   on_urc=urcs.append if urcs is not None else None)
+    return modem.engine, modem
+
+
+async def test_responses_are_correlated_in_pipeline():
+    engine, modem = make_engine(depth=4)
+    csq, cgmi, ok = await asyncio.gather(
+        engine.send("AT+CSQ"), engine.send("AT+CGMI"), engine.send("AT"))
+    assert csq.lines == ["+CSQ: 20,99"] and csq.ok
+    assert cgmi.lines == ["Quectel"]
+    assert ok.status == "OK" and ok.lines == []
+    assert engine.stats()["completed"] == 3
+
+
+async def test_pipeline_depth_limits_outstanding_commands():
+    engine, modem = make_engine(depth=1)
+    tasks = [asyncio.ensure_future(engine.send(c)) for c in ("AT", "AT+CSQ", "AT")]
+    await asyncio.sleep(0)
+    assert modem.written == ["AT"]
+    await asyncio.gather(*tasks)
+    assert modem.written == ["AT", "AT+CSQ", "AT"]
+
+
+async def test_error_codes_and_urcs():
+    urcs = []
+    engine, modem = make_engine(urcs=urcs)
+    engine.feed_line("+CREG: 1")
+    with pytest.raises(ATCommandError) as exc:
+        await engine.send("AT+BAD")
+    assert exc.value.response.status == "+CME ERROR: 3"
+
+    task = asyncio.ensure_future(engine.send("AT+CGMI"))
+    await asyncio.sleep(0)
+    engine.feed_line("RING")
+    assert (await task).lines == ["Quectel"]
+    assert urcs == ["+CREG: 1", "RING"]
+
+
+async def test_timeout_leaves_tombstone_for_late_reply():
+    engine, modem = make_engine(timeout=0.02, silent={"AT+CSQ"})
+    with pytest.raises(ATTimeoutError):
+        await engine.send("AT+CSQ")
+
+    # Verspätete Antwort darf nicht dem nächsten Kommando zugeordnet werden
+    task = asyncio.ensure_future(engine.send("AT+CGMI"))
+    engine.feed_line("+CSQ: 20,99")
+    engine.feed_line("OK")
+    assert (await asyncio.wait_for(task, 1)).lines == ["Quectel"]
+    assert engine.timeouts == 1
+
+
+async def test_deferred_write_times_from_actual_write():
+    queued = []
+    engine = ATCommandEngine(lambda cmd, on_written: queued.append((cmd, on_written)),
+                             timeout=0.05, deferred_write=True)
+    task = asyncio.ensure_future(engine.send("AT"))
+    await asyncio.sleep(0.1)  # länger als das Timeout, aber noch nicht geschrieben
+    assert not task.done()
+
+    command, on_written = queued.pop()
+    on_written(None)
+    engine.feed_line("OK")
+    response = await task
+    assert response.ok and response.latency_ms < 50
+
+
+async def test_dropped_and_lost_requests_fail_immediately():
+    queued = []
+    engine = ATCommandEngine(lambda cmd, on_written: queued.append(on_written),
+                             pipeline_depth=2, deferred_write=True)
+    first = asyncio.ensure_future(engine.send("AT", check=False))
+    second = asyncio.ensure_future(engine.send("AT+CSQ", check=False))
+    third = asyncio.ensure_future(engine.send("AT+CGMI", check=False))
+    await asyncio.sleep(0)
+    queued[0](RuntimeError("cancelled"))
+    with pytest.raises(ATAbortedError):
+        await first
+    assert len(queued) == 3  # AT+CGMI rückt nach
+
+    engine.fail_all(ConnectionError("unplugged"))
+    for task in (second, third):
+        with pytest.raises(ATAbortedError) as exc:
+            await task
+        assert exc.value.response.status == "ABORTED: unplugged"
+    queued[1](None)  # später geschrieben: bleibt folgenlos
+    assert engine.stats()["outstanding"] == 0
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests für den Audit-Export als Datenstrom (Formate, Kompression, Ziele, Speicher)
+"""
+
+import csv
+import gzip
+import io
+import json
+import socket
+import threading
+import tracemalloc
+
+import pytest
+
+from audit_export import export_audit
+from hardware_registry import PREDEFINED_DEVICES, CommunicationProtocol, HardwareRegistry
+from registry_benchmark import fill_audit_trail
+
+
+@pytest.fixture
+def registry(tmp_path):
+    with HardwareRegistry(str(tmp_path / "e.db")) as registry:
+        for device in PREDEFINED_DEVICES:
+            registry.register_device(device)
+        registry._log_audit_entry(device_id="sx1276_001", action="transmit",
+                                  protocol=CommunicationProtocol.LORA, status="error",
+                                  error_message='nack, "retry"\nline 2')
+        yield registry
+
+
+def test_ndjson_and_csv_round_trip(registry, tmp_path):
+    path = tmp_path / "audit.ndjson"
+    stats = registry.export_audit(str(path), "ndjson")
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert stats["rows"] == len(lines) == 4 and stats["bytes"] == path.stat().st_size
+    assert lines[0]["protocol"] == "lora" and lines[0]["error_message"].endswith("line 2")
+
+    text = registry.export_audit_report("csv")
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert len(rows) == 4 and rows[0]["error_message"] == 'nack, "retry"\nline 2'
+
+
+def test_json_report_keeps_devices_and_counts(registry):
+    report = json.loads(registry.export_audit_report())
+    assert report["total_devices"] == 3 and report["total_audit_entries"] == 4
+    assert report["devices"][0]["hardware_type"] == "sdr"
+    assert len(report["audit_trail"]) == 4
+    empty = io.BytesIO()
+    registry.export_audit(empty, "json", action="nothing")
+    assert json.loads(empty.getvalue())["audit_trail"] == []
+
+    # Altes Verhalten: unbekannte Formate fallen auf JSON zurück
+    assert json.loads(registry.export_audit_report("xml"))["total_audit_entries"] == 4
+    with pytest.raises(ValueError):
+        registry.export_audit(io.BytesIO(), "xml")
+
+
+def test_compression_and_progress(registry):
+    seen = []
+    buffer = io.BytesIO()
+    stats = export_audit(registry, buffer, "ndjson", "gzip", progress=seen.append,
+                         progress_every=2, page_size=3)
+    assert len(gzip.decompress(buffer.getvalue()).splitlines()) == 4
+    assert [p["rows"] for p in seen] == [2, 4, 4] and seen[-1]["bytes"] == stats["bytes"]
+    zstandard = pytest.importorskip("zstandard")
+    buffer = io.BytesIO()
+    registry.export_audit(buffer, "csv", "zstd", status="error")
+    text = zstandard.ZstdDecompressor().decompressobj().decompress(buffer.getvalue())
+    assert len(list(csv.reader(io.StringIO(text.decode())))) == 2
+    with pytest.raises(ValueError):
+        registry.export_audit(io.BytesIO(), "xml")
+
+
+def test_export_to_socket(registry):
+    left, right = socket.socketpair()
+    received = []
+    reader = threading.Thread(target=lambda: received.append(right.makefile("rb").read()))
+    reader.start()
+    registry.export_audit(left, "ndjson")
+    left.close()
+    reader.join(5)
+    right.close()
+    assert len(received[0].splitlines()) == 4
+
+
+def test_export_memory_stays_flat(tmp_path):
+    peaks = []
+    for rows in (2_000, 20_000):
+        db_path = str(tmp_path / f"m{rows}.db")
+        fill_audit_trail(db_path, rows)
+        with HardwareRegistry(db_path) as registry:
+            tracemalloc.start()
+            stats = export_audit(registry, str(tmp_path / f"m{rows}.json"), "json", "gzip",
+                                 page_size=500)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        assert stats["rows"] == rows
+    assert peaks[1] < peaks[0] * 1.5
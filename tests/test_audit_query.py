@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests für gefilterte Audit-Abfragen (SQL-Aufbau, Indizes, Registry-API)
+"""
+
+import datetime
+import sqlite3
+import tracemalloc
+
+import pytest
+
+from audit_query import AuditQuery
+from hardware_registry import CommunicationProtocol, HardwareRegistry
+from registry_benchmark import fill_audit_trail, query_cases, timestamp_at
+
+
+def test_sql_for_combined_filters():
+    sql, params = AuditQuery(device_id=["a", "b"], status="error", band="868",
+                             min_hz=865e6, start=datetime.datetime(2024, 1, 1)).sql(10)
+    assert "device_id IN (?, ?)" in sql and "unlikely(status = ?)" in sql
+    assert sql.endswith("ORDER BY timestamp DESC, rowid DESC LIMIT ?")
+    assert params == ["a", "b", "error", "2024-01-01T00:00:00", 865e6, 870e6, 10]
+    assert AuditQuery().sql(None) == (
+        "SELECT id, timestamp, device_id, action, frequency_hz, protocol, payload_size, "
+        "payload_hash, status, error_message, user_id FROM audit_trail "
+        "ORDER BY timestamp DESC, rowid DESC", [])
+    assert "0" in AuditQuery(action=[]).where()[0]
+    with pytest.raises(ValueError):
+        AuditQuery(band="77g").where()
+
+
+def test_registry_query_filters(tmp_path):
+    with HardwareRegistry(str(tmp_path / "q.db")) as registry:
+        log = registry._log_audit_entry
+        log(device_id="a", action="transmit", frequency_hz=868.1e6,
+            protocol=CommunicationProtocol.LORA)
+        log(device_id="a", action="transmit", frequency_hz=433.92e6,
+            protocol=CommunicationProtocol.LORA, status="error", error_message="nack")
+        log(device_id="b", action="receive", frequency_hz=2.44e9,
+            protocol=CommunicationProtocol.ZIGBEE)
+        assert len(registry.query_audit_trail()) == 3
+        assert [e.error_message for e in registry.query_audit_trail(status="error")] == ["nack"]
+        assert [e.device_id for e in registry.query_audit_trail(band="2g4")] == ["b"]
+        lora = registry.query_audit_trail(protocol=CommunicationProtocol.LORA, newest_first=False)
+        assert [e.frequency_hz for e in lora] == [868.1e6, 433.92e6]
+        assert registry.query_audit_trail(action="transmit", band="868", limit=1)[0].status == "success"
+        assert registry.query_audit_trail(AuditQuery(start=datetime.datetime.now())) == []
+        with pytest.raises(TypeError):
+            registry.query_audit_trail(AuditQuery(), action="x")
+
+
+def test_every_benchmark_filter_uses_an_index(tmp_path):
+    db_path = str(tmp_path / "bench.db")
+    fill_audit_trail(db_path, 5000)
+    with HardwareRegistry(db_path) as registry:
+        for name, query in query_cases(5000).items():
+            sql, params = query.sql(100)
+            with registry.db.read() as conn:
+                plan = " ".join(r[-1] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+            assert "USING INDEX" in plan and "TEMP B-TREE" not in plan, (name, plan)
+        assert registry.query_audit_trail(status="error", start=timestamp_at(0))
+
+
+def test_iterator_pages_through_ties_in_both_directions(tmp_path):
+    with HardwareRegistry(str(tmp_path / "i.db")) as registry:
+        with registry.db.write() as conn:  # viele gleiche Zeitstempel
+            conn.executemany("INSERT INTO audit_trail (id, timestamp, device_id, action, status)"
+                             " VALUES (?, ?, 'd', 'tx', 'success')",
+                             [(f"id{n:03d}", f"2024-01-01T00:00:0{n // 7}") for n in range(50)])
+        expected = [e.id for e in registry.query_audit_trail(limit=1000)]
+        assert [e.id for e in registry.iter_audit_trail(page_size=7)] == expected
+        oldest_first = registry.iter_audit_trail(page_size=3, newest_first=False, rows="tuple")
+        assert [t[0] for t in oldest_first] == expected[::-1]
+        first = registry.iter_audit_trail(rows="tuple", limit=12, page_size=5)
+        assert [t[0] for t in first] == expected[:12]
+        row = next(registry.iter_audit_trail(rows="row"))
+        assert isinstance(row, sqlite3.Row) and row["id"] == expected[0]
+        assert isinstance(next(registry.iter_audit_trail(rows="tuple")), tuple)
+        with pytest.raises(ValueError):
+            registry.iter_audit_trail(rows="dict")
+        with pytest.raises(ValueError):
+            registry.iter_audit_trail(band="nope")
+
+
+def test_iterator_memory_stays_flat(tmp_path):
+    peaks = []
+    for rows in (2_000, 20_000):
+        db_path = str(tmp_path / f"m{rows}.db")
+        fill_audit_trail(db_path, rows)
+        with HardwareRegistry(db_path) as registry:
+            tracemalloc.start()
+            count = sum(1 for _ in registry.iter_audit_trail(rows="tuple", page_size=500))
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        assert count == rows
+    assert peaks[1] < peaks[0] * 1.5
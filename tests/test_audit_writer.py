@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests für den Group-Commit-Audit-Writer (Hintergrund-Thread, flush, Haltbarkeit)
+"""
+
+import threading
+
+import pytest
+
+from audit_writer import AuditWriter
+from hardware_registry import HardwareRegistry
+from registry_db import RegistryDatabase
+
+
+def row(n, audit_id=None):
+    return (audit_id or f"id{n}", f"2024-01-01T00:00:{n:02d}", "dev", "tx", None, None,
+            None, None, "success", None, None)
+
+
+def count(db):
+    with db.read() as conn:
+        return conn.execute("SELECT COUNT(*) FROM audit_trail").fetchone()[0]
+
+
+@pytest.fixture
+def db(tmp_path):
+    registry = HardwareRegistry(str(tmp_path / "audit.db"))
+    registry.audit_writer.close()
+    yield registry.db
+    registry.db.close()
+
+
+def test_async_batches_and_flush(db):
+    writer = AuditWriter(db, batch_size=10, interval_ms=5000)
+    for n in range(25):
+        writer.submit(row(n))
+    assert writer.flush(timeout=5)
+    assert count(db) == 25
+    stats = writer.stats()
+    assert stats["written"] == 25 and stats["largest_batch"] == 10 and stats["batches"] == 3
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.submit(row(99))
+
+
+def test_commit_mode_groups_concurrent_producers(db):
+    writer = AuditWriter(db, batch_size=64, durability="commit")
+    seen = []
+
+    def produce(base):
+        for n in range(20):
+            writer.submit(row(base + n))
+            seen.append(count(db) >= 1)  # eigener Eintrag ist bereits committet
+
+    threads = [threading.Thread(target=produce, args=(i * 100,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(seen) and count(db) == 80
+    assert writer.stats()["batches"] <= 80
+    writer.close()
+
+
+def test_failed_batch_is_retried_row_by_row(db):
+    writer = AuditWriter(db, batch_size=4, interval_ms=5000)
+    for n, audit_id in enumerate(["a", "b", "a", "c"]):
+        writer.submit(row(n, audit_id))
+    writer.flush()
+    assert count(db) == 3
+    assert writer.stats()["failed"] == 1
+    writer.close()
+
+
+def test_registry_reads_see_queued_entries(tmp_path):
+    with HardwareRegistry(str(tmp_path / "r.db"), audit_interval_ms=10_000) as registry:
+        for _ in range(3):
+            registry._log_audit_entry(device_id="sx1276_001", action="tx")
+        assert len(registry.get_audit_trail(device_id="sx1276_001")) == 3
+    with pytest.raises(ValueError):
+        AuditWriter(RegistryDatabase(":memory:"), durability="maybe")
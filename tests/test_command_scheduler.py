@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Tests für den Prioritäts-Scheduler serieller Kommandos
+"""
+
+import asyncio
+
+import pytest
+
+from at_command_engine import ATAbortedError, ATCommandEngine
+from command_scheduler import CommandDropped, CommandScheduler, Priority, parse_rates
+
+
+def test_safety_preempts_queued_bulk_work():
+    written = []
+    scheduler = CommandScheduler(written.append)
+    for i in range(3):
+        scheduler.submit(f"AT+CFG={i}", Priority.BULK)
+    scheduler.submit("AT+FREQ=915000000")
+    # PTT kann nicht als bulk herabgestuft werden
+    assert scheduler.submit("AT+PTT=0", Priority.BULK) is Priority.SAFETY
+
+    scheduler.run_once()
+    assert written == ["AT+PTT=0", "AT+FREQ=915000000", "AT+CFG=0", "AT+CFG=1", "AT+CFG=2"]
+    stats = scheduler.stats()
+    assert stats["safety"]["sent"] == 1 and stats["bulk"]["sent"] == 3
+
+
+def test_command_survives_lost_connection():
+    written = []
+
+    def write(command):
+        if not written:
+            written.append(None)
+            raise ConnectionError("device disconnected")
+        written.append(command)
+
+    scheduler = CommandScheduler(write)
+    scheduler.submit("AT+FREQ=868100000")
+    scheduler.submit("AT+PWR=10")
+    assert scheduler.run_once() is None
+    assert scheduler.stats()["interactive"]["queued"] == 2
+
+    scheduler.run_once()
+    assert written == [None, "AT+FREQ=868100000", "AT+PWR=10"]
+    assert scheduler.stats()["interactive"]["sent"] == 2
+
+
+def test_rate_limit_and_cancel():
+    written = []
+    scheduler = CommandScheduler(written.append, rates={Priority.BULK: 10.0}, burst=2)
+    for i in range(5):
+        scheduler.submit(f"AT+CFG={i}", Priority.BULK)
+
+    delay = scheduler.run_once()
+    assert written == ["AT+CFG=0", "AT+CFG=1"]
+    assert 0 < delay <= 0.1
+
+    assert scheduler.cancel(Priority.BULK) == 3
+    assert scheduler.run_once() is None
+    assert scheduler.stats()["bulk"]["cancelled"] == 3
+
+
+def test_on_written_reports_write_cancel_and_abandon():
+    written, reports = [], []
+    scheduler = CommandScheduler(written.append)
+    scheduler.submit("AT", on_written=lambda e: reports.append(("AT", e)))
+    scheduler.run_once()
+    assert reports == [("AT", None)]
+
+    scheduler.submit("AT+CFG=1", Priority.BULK, on_written=lambda e: reports.append(e))
+    scheduler.cancel(Priority.BULK)
+    assert isinstance(reports[-1], CommandDropped)
+
+    scheduler.submit("AT+FREQ=868100000")
+    scheduler.submit("AT+CSQ", on_written=lambda e: reports.append(e))
+    lost = ConnectionError("unplugged")
+    assert scheduler.abandon(lost) == 1
+    assert reports[-1] is lost
+    assert scheduler.stats()["interactive"]["queued"] == 1  # ohne Rückmeldung: bleibt
+
+
+@pytest.mark.asyncio
+async def test_at_request_lost_mid_write_is_not_resent():
+    connected = [True]
+    written = []
+    engine = None
+
+    def write(command):
+        if command == "AT+CSQ\r" and connected[0]:
+            # Port stirbt während des Schreibens, wie SerialBridge._on_lost()
+            connected[0] = False
+            lost = ConnectionError("unplugged")
+            engine.fail_all(lost)
+            scheduler.abandon(lost)
+            raise lost
+        written.append(command)
+        asyncio.get_running_loop().call_soon(engine.feed_line, "OK")
+
+    scheduler = CommandScheduler(write)
+    engine = ATCommandEngine(lambda cmd, cb: scheduler.submit(cmd, on_written=cb),
+                             deferred_write=True)
+    task = asyncio.ensure_future(engine.send("AT+CSQ", check=False))
+    await asyncio.sleep(0)
+    assert scheduler.run_once() is None
+    with pytest.raises(ATAbortedError):
+        await task
+
+    # Reconnect: das verlorene Kommando wird nicht nachgeschrieben
+    second = asyncio.ensure_future(engine.send("AT+CGMI"))
+    await asyncio.sleep(0)
+    scheduler.run_once()
+    assert (await asyncio.wait_for(second, 1)).command == "AT+CGMI"
+    assert written == ["AT+CGMI\r"]
+    assert scheduler.stats()["interactive"]["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_background_task_drains_lanes():
+    written = []
+    scheduler = CommandScheduler(written.append)
+    scheduler.start()
+    try:
+        scheduler.submit("AT")
+        await asyncio.sleep(0.01)
+        assert written == ["AT"]
+    finally:
+        scheduler.stop()
+
+
+def test_parse_rates():
+    assert parse_rates(["bulk=50", "interactive=0"]) == {
+        Priority.BULK: 50.0, Priority.INTERACTIVE: None}
+    with pytest.raises(ValueError):
+        parse_rates(["urgent=1"])
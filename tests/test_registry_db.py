@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests für die langlebigen Registry-Verbindungen (WAL, Lese-Pool, Transaktionen)
+"""
+
+import sqlite3
+import threading
+
+import pytest
+
+from hardware_registry import PREDEFINED_DEVICES, HardwareRegistry
+from registry_benchmark import run_mode
+from registry_db import RegistryDatabase
+
+
+def test_wal_mode_and_transactions(tmp_path):
+    db = RegistryDatabase(str(tmp_path / "r.db"))
+    assert db.journal_mode == "wal"
+    with db.write() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    with pytest.raises(RuntimeError):
+        with db.write() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+            raise RuntimeError("abort")
+    with db.write() as conn:
+        conn.execute("INSERT INTO t VALUES (2)")
+        with db.write() as inner:  # läuft in der äußeren Transaktion mit
+            inner.execute("INSERT INTO t VALUES (3)")
+    with db.read() as conn:
+        assert [r[0] for r in conn.execute("SELECT x FROM t ORDER BY x")] == [2, 3]
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO t VALUES (4)")  # Leseverbindungen sind query_only
+    db.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        with db.write():
+            pass
+
+
+def test_read_pool_is_bounded_across_threads(tmp_path):
+    db = RegistryDatabase(str(tmp_path / "r.db"), read_pool=2)
+    with db.write() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    errors = []
+
+    def work(n):
+        try:
+            for i in range(50):
+                with db.write() as conn:
+                    conn.execute("INSERT INTO t VALUES (?)", (n * 100 + i,))
+                with db.read() as conn:
+                    conn.execute("SELECT COUNT(*) FROM t").fetchone()
+        except Exception as e:  # pragma: no cover - nur zur Diagnose
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert db.stats()["read_connections"] <= 2
+    with db.read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 300
+    db.close()
+
+
+def test_registry_round_trip_on_persistent_connection(tmp_path):
+    with HardwareRegistry(str(tmp_path / "reg.db")) as registry:
+        for device in PREDEFINED_DEVICES:
+            assert registry.register_device(device)
+        assert {d.id for d in registry.get_all_devices()} == {d.id for d in PREDEFINED_DEVICES}
+        trail = registry.get_audit_trail(device_id="sx1276_001")
+        assert [e.action for e in trail] == ["device_registered"]
+    memory = HardwareRegistry(":memory:")
+    assert memory.register_device(PREDEFINED_DEVICES[0])
+    assert len(memory.get_all_devices()) == 1
+    memory.close()
+
+
+@pytest.mark.parametrize("mode", ["connect", "persistent"])
+def test_benchmark_modes_store_every_insert(mode, tmp_path):
+    result = run_mode(mode, 50, 2, 1, "NORMAL", str(tmp_path))
+    assert result["stored"] == 50 and result["inserts_per_s"] > 0
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests für Aufzeichnung und Wiedergabe serieller Sitzungen (ohne Hardware)
+"""
+
+import asyncio
+
+import pytest
+
+from serial_recorder import (RX, TX, SessionRecorder, parse_speed, read_session,
+                             replay_session, session_info)
+from server_real_rf_system import LineReader, record_path
+
+
+@pytest.mark.parametrize("name", ["session.rec", "session.rec.gz"])
+def test_recording_roundtrip(tmp_path, name):
+    path = str(tmp_path / name)
+    recorder = SessionRecorder(path)
+    reader = LineReader(lambda line: None, passthrough=True, on_raw=recorder.record_rx)
+    reader.data_received(b'{"rssi": -90}\nOK\n')
+    recorder.record_tx("AT+CSQ")
+    recorder.close()
+
+    records = list(read_session(path))
+    assert [(r.direction, r.data) for r in records] == [
+        (RX, b'{"rssi": -90}'), (RX, b"OK"), (TX, b"AT+CSQ")]
+    assert records[0].offset <= records[-1].offset
+    info = session_info(path)
+    assert info["rx_lines"] == 2 and info["tx_commands"] == 1
+
+
+@pytest.mark.asyncio
+async def test_replay_honours_speed(tmp_path):
+    path = str(tmp_path / "s.rec")
+    recorder = SessionRecorder(path)
+    recorder.record_rx(b"a")
+    recorder._start -= 0.2  # zweite Zeile 200 ms später
+    recorder.record_rx(b"b")
+    recorder.close()
+
+    written = []
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    assert await replay_session(path, written.append, speed=10) == 2
+    assert 0.015 <= loop.time() - start < 0.2
+    assert written == [b"a\n", b"b\n"]
+
+    assert await replay_session(path, written.append, speed=None, repeat=2) == 4
+
+
+def test_parse_speed_and_record_path():
+    assert parse_speed("max") is None and parse_speed("2.5") == 2.5
+    with pytest.raises(ValueError):
+        parse_speed("-1")
+    assert record_path("/tmp/a.b/s.rec.gz", "funk1", True) == "/tmp/a.b/s.funk1.rec.gz"
+    assert record_path("s.rec", "funk1", False) == "s.rec"
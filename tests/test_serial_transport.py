@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Tests für den asyncio-nativen seriellen Transport (pty und loop://, ohne Hardware)
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+from at_command_engine import ATAbortedError
+from server_real_rf_system import LineReader, SerialBridge, looks_like_json
+
+
+async def _collect(lines, count, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while len(lines) < count and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.01)
+    return lines
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(sys.platform == "win32", reason="pty nur auf POSIX")
+async def test_pty_lines_are_framed_in_event_loop():
+    import pty
+
+    master, slave = pty.openpty()
+    lines = []
+    bridge = SerialBridge(os.ttyname(slave), on_line=lines.append)
+    bridge.open()
+    try:
+        assert bridge.transport._fd is not None  # add_reader-Pfad, kein Polling
+        os.write(master, b'{"a": 1}\n{"b": ')
+        os.write(master, b'2}\nnot json\n{"c": 3}\n')
+        await _collect(lines, 3)
+        assert lines == ['{"a": 1}', '{"b": 2}', '{"c": 3}']
+    finally:
+        bridge.close()
+        os.close(master)
+        os.close(slave)
+
+
+@pytest.mark.asyncio
+async def test_loop_url_roundtrip_uses_polling():
+    lines = []
+    bridge = SerialBridge("loop://", on_line=lines.append)
+    bridge.open()
+    try:
+        assert bridge.transport._poll_task is not None
+        bridge.write_line('{"rssi": -91}')
+        bridge.write_line('{"rssi": -92}')
+        await _collect(lines, 2)
+        assert lines == ['{"rssi": -91}', '{"rssi": -92}']
+    finally:
+        bridge.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(sys.platform == "win32", reason="pty nur auf POSIX")
+async def test_unplugged_port_is_reopened_and_keeps_commands(tmp_path):
+    import pty
+
+    # Symlink wie ein udev-Alias: nach dem "Einstecken" zeigt er auf ein neues pty
+    link = tmp_path / "ttyRF"
+    master, slave = pty.openpty()
+    link.symlink_to(os.ttyname(slave))
+    lines = []
+    bridge = SerialBridge(str(link), on_line=lines.append, reconnect_min=0.05,
+                          reconnect_max=0.1)
+    bridge.open()
+    try:
+        os.close(slave)
+        os.close(master)  # Gerät abgezogen
+        await _collect(lines, 1)
+        assert json.loads(lines[0])["serial"]["status"] == "disconnected"
+        assert not bridge.connected
+        bridge.submit("AT+FREQ=868100000")  # während des Ausfalls
+
+        master, slave = pty.openpty()
+        link.unlink()
+        link.symlink_to(os.ttyname(slave))
+        await _collect(lines, 2)
+        status = json.loads(lines[1])["serial"]
+        assert status["status"] == "connected" and status["downtime_ms"] > 0
+        assert bridge.link_stats()["reconnects"] == 1
+
+        await asyncio.sleep(0.1)
+        assert b"AT+FREQ=868100000" in os.read(master, 1024)
+        os.write(master, b'{"rssi": -91}\n')
+        await _collect(lines, 3)
+        assert lines[2] == '{"rssi": -91}'
+    finally:
+        bridge.close()
+        os.close(master)
+        os.close(slave)
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(sys.platform == "win32", reason="pty nur auf POSIX")
+async def test_unplug_fails_waiting_at_commands():
+    import pty
+
+    master, slave = pty.openpty()
+    lines = []
+    bridge = SerialBridge(os.ttyname(slave), on_line=lines.append, at_timeout=30.0,
+                          reconnect_min=10.0)
+    bridge.open()
+    try:
+        task = asyncio.ensure_future(bridge.at.send_many(["AT+CSQ"]))
+        await asyncio.sleep(0.05)
+        assert os.read(master, 1024) == b"AT+CSQ\r"  # V.250: CR, nicht LF
+        os.close(slave)
+        os.close(master)  # Gerät abgezogen, Antwort kommt nie
+        response, = await asyncio.wait_for(task, 2)
+        assert response.status.startswith("ABORTED")
+        with pytest.raises(ATAbortedError):
+            await bridge.at.send("AT")  # ohne Port sofort, nicht erst nach dem Timeout
+        assert bridge.stats()["lanes"]["interactive"]["queued"] == 0
+    finally:
+        bridge.close()
+
+
+def test_structural_check_accepts_json_and_rejects_garbage():
+    assert looks_like_json(b'{"rssi": -91, "tags": [1, 2]}')
+    assert looks_like_json('{"name": "Überträger"}'.encode())
+    # Klammern im String: Fallback auf vollständiges Parsen
+    assert looks_like_json(b'{"msg": "a{"}')
+    assert not looks_like_json(b'{"rssi": -91')
+    assert not looks_like_json(b"OK")
+    assert not looks_like_json(b'{"x": "\xff"}')
+
+
+def test_passthrough_keeps_lines_as_bytes():
+    lines = []
+    reader = LineReader(lines.append, passthrough=True)
+    reader.data_received(b'{"a": 1}\r\n{"b"')
+    reader.data_received(b': 2}\nERROR\n{"c": 3')
+    assert lines == [b'{"a": 1}', b'{"b": 2}']
+    assert bytes(reader.buffer) == b'{"c": 3'
+
+    strict = []
+    reader = LineReader(strict.append, passthrough=True, validate="full")
+    reader.data_received(b'{"a": 1}\n{"a": 1,}\n')
+    assert strict == [b'{"a": 1}']
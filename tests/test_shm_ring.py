@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests für den Shared-Memory-Telemetriering (ein Schreiber, unabhängige Leser)
+"""
+
+import multiprocessing
+
+import pytest
+
+from shm_ring import SharedRing
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRing.create(4096)
+    yield ring
+    ring.close()
+
+
+def _read_in_child(name, conn):
+    ring = SharedRing.attach(name)
+    conn.send(ring.reader(from_start=True).read_many())
+    ring.close()
+
+
+def test_readers_see_every_record_across_wraparound(ring):
+    fast = ring.reader()
+    other = SharedRing.attach(ring.name).reader()
+    for i in range(500):
+        line = b'{"n": %d, "pad": "%s"}' % (i, b"x" * (i % 50))
+        assert ring.write(line, "funk1", i)
+        assert fast.read_many() == [(line, "funk1", i)]
+        if i % 3 == 0:
+            assert [seq for _, _, seq in other.read_many()] == list(range(i - 2 if i else 0, i + 1))
+    assert ring.records == 500 and fast.overruns == 0 and other.overruns == 0
+    other.ring.close()
+
+
+def test_lapped_reader_resyncs_and_counts_overrun(ring):
+    slow = ring.reader()
+    for i in range(200):
+        ring.write(b"x" * 100, "", i)
+    assert slow.read_many() == []
+    assert slow.overruns == 1 and slow.lag == 0
+
+    ring.write(b"next", "", 200)
+    assert slow.read_many() == [(b"next", "", 200)]
+
+
+def test_oversized_record_is_rejected(ring):
+    assert not ring.write(b"x" * ring.capacity)
+    assert ring.records == 0
+
+
+def test_other_process_attaches_by_name(ring):
+    ring.write(b'{"rssi": -91}', "a", 7)
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe()
+    proc = ctx.Process(target=_read_in_child, args=(ring.name, child))
+    proc.start()
+    assert parent.recv() == [(b'{"rssi": -91}', "a", 7)]
+    proc.join(10)
+    assert proc.exitcode == 0
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests für die rollierenden Aggregate (Fenster mit expliziter Zeit, ohne Hardware)
+"""
+
+import json
+
+import pytest
+
+from telemetry_aggregate import RollingAggregates, RollingWindow, window_label
+
+
+def test_window_summary_and_expiry():
+    window = RollingWindow(1.0, buckets=10)
+    for i, value in enumerate([-90, -80, -100]):
+        window.add(100.0 + i * 0.1, value)
+    assert window.summary(100.25) == {"min": -100, "max": -80, "mean": -90.0, "count": 3}
+    # nach einem vollen Fenster ist alles herausgefallen
+    assert window.summary(101.5) is None
+    window.add(101.5, 5)
+    assert window.summary(101.5) == {"min": 5, "max": 5, "mean": 5.0, "count": 1}
+
+
+def test_aggregates_per_device_and_window():
+    agg = RollingAggregates([1.0, 10.0])
+    assert agg.labels == ["1s", "10s"]
+    agg.update({"device": "a", "rssi": -90, "seq": 1, "ok": True, "mode": "rx"}, now=10.0)
+    agg.update({"device": "a", "rssi": -70, "seq": 2}, now=15.0)
+    agg.update({"device": "b", "rssi": -50}, now=15.0)
+    snap = agg.snapshot(now=15.05)
+    assert set(snap["a"]) == {"rssi"}  # seq, bool und Strings fließen nicht ein
+    assert snap["a"]["rssi"]["1s"]["count"] == 1
+    assert snap["a"]["rssi"]["10s"] == {"min": -90, "max": -70, "mean": -80.0, "count": 2}
+    assert snap["b"]["rssi"]["10s"]["mean"] == -50.0
+
+
+def test_message_filters_devices_fields_windows():
+    agg = RollingAggregates()
+    agg.update({"device": "a", "rssi": -90, "snr": 7.5})
+    agg.update({"device": "b", "rssi": -60})
+    msg = json.loads(agg.message(devices={"a"}, fields={"rssi"}, windows={"10s"}))
+    assert msg["agg"] == {"a": {"rssi": {"10s": {"min": -90, "max": -90, "mean": -90.0,
+                                                 "count": 1}}}}
+    assert "t" in msg
+    assert window_label(0.5) == "500ms"
+    with pytest.raises(ValueError):
+        RollingAggregates([0])
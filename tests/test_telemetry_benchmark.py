@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Tests für die Hilfsfunktionen des End-to-End-Benchmarks (ohne Server)
+"""
+
+import json
+
+from telemetry_benchmark import extract_ts, make_line, percentiles
+
+
+def test_synthetic_line_is_valid_json_of_requested_size():
+    line = make_line(7, 200, 123456789)
+    assert abs(len(line) - 200) <= 2
+    data = json.loads(line)
+    assert data["n"] == 7 and data["t"] == 123456789
+
+
+def test_timestamps_found_in_lines_and_batches():
+    one = make_line(1, 80, 111).decode().strip()
+    two = make_line(2, 80, 222).decode().strip()
+    assert extract_ts(one) == [111]
+    assert extract_ts("[" + one + "," + two + "]") == [111, 222]
+    assert extract_ts('{"urc": "RING"}') == []
+
+
+def test_percentiles():
+    result = percentiles([float(i) for i in range(1, 1001)])
+    assert result == {"p50": 501.0, "p99": 991.0, "p999": 1000.0, "max": 1000.0}
+    assert percentiles([]) == {}
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tests für Telemetrie-Frames, Schema-Registry und binäre Kodierungen
+"""
+
+import json
+import struct
+
+import pytest
+
+from telemetry_codec import (ENCODING_CBOR, ENCODING_MSGPACK, ENCODING_STRUCT,
+                             DeltaEncoder, SchemaRegistry, TelemetryFrame, TelemetrySchema,
+                             apply_delta, encode_batch, seq_field, tag_line, topic_field)
+from telemetry_state import TelemetryState
+
+LINE = json.dumps({"device": "sx1276_001", "rssi": -91.5, "snr": 7.25, "freq": 868100000})
+
+REGISTRY = SchemaRegistry([
+    TelemetrySchema(id=7, match={"device": "sx1276_001"},
+                    fields={"rssi": "f", "snr": "f", "freq": "I"}),
+])
+
+
+def test_struct_encoding_uses_matching_schema():
+    packed = TelemetryFrame(LINE).encode(ENCODING_STRUCT, REGISTRY)
+    assert struct.unpack("<HffI", packed) == (7, -91.5, 7.25, 868100000)
+
+    # Kein passendes Schema oder fehlendes Feld: Rückfall auf JSON-Text
+    assert TelemetryFrame('{"device": "other"}').encode(ENCODING_STRUCT, REGISTRY) is None
+    assert TelemetryFrame('{"device": "sx1276_001"}').encode(ENCODING_STRUCT, REGISTRY) is None
+    assert TelemetryFrame(b"[1, 2]").encode(ENCODING_STRUCT, REGISTRY) is None
+
+
+def test_frame_is_transcoded_once():
+    frame = TelemetryFrame(LINE.encode())
+    first = frame.encode(ENCODING_STRUCT, REGISTRY)
+    assert frame.encode(ENCODING_STRUCT, REGISTRY) is first
+    assert len(frame) == len(LINE)
+
+
+def test_schema_validation():
+    with pytest.raises(ValueError):
+        TelemetrySchema(id=1, fields={"name": "s"})
+    with pytest.raises(ValueError):
+        REGISTRY.register(TelemetrySchema(id=7, fields={"x": "f"}))
+
+
+def test_msgpack_batch_is_array_of_frames():
+    msgpack = pytest.importorskip("msgpack")
+    frames = [TelemetryFrame(json.dumps({"n": i})) for i in range(20)]
+    batch = encode_batch(ENCODING_MSGPACK, [f.encode(ENCODING_MSGPACK) for f in frames])
+    assert msgpack.unpackb(batch) == [{"n": i} for i in range(20)]
+
+
+def test_cbor_batch_is_array_of_frames():
+    cbor2 = pytest.importorskip("cbor2")
+    frames = [TelemetryFrame(json.dumps({"n": i})) for i in range(30)]
+    batch = encode_batch(ENCODING_CBOR, [f.encode(ENCODING_CBOR) for f in frames])
+    assert cbor2.loads(batch) == [{"n": i} for i in range(30)]
+
+
+def test_delta_encoding_round_trips_with_keyframes():
+    encoder = DeltaEncoder(keyframe_interval=3)
+    lines = [
+        {"device": "d1", "rssi": -91, "freq": 868100000, "mode": "rx"},
+        {"device": "d1", "rssi": -92, "freq": 868100000, "mode": "rx"},
+        {"device": "d2", "rssi": -70},
+        {"device": "d1", "rssi": -92, "freq": 868100000},
+        {"device": "d1", "rssi": -93, "freq": 868100000},
+    ]
+    client_state = {}
+    messages = []
+    for line in lines:
+        message = json.loads(encoder.encode(TelemetryFrame(json.dumps(line))))
+        messages.append(message)
+        assert apply_delta(client_state, message) == line
+
+    assert [("full" in m) for m in messages] == [True, False, True, False, True]
+    assert messages[1] == {"dev": "d1", "set": {"rssi": -92}}
+    assert messages[3] == {"dev": "d1", "set": {}, "del": ["mode"]}
+    assert encoder.stats()["keyframes"] == 3
+
+    assert encoder.encode(TelemetryFrame(b"[1]")) == b"[1]"
+    encoder.reset()
+    assert b'"full"' in encoder.encode(TelemetryFrame(json.dumps(lines[0])))
+
+
+def test_tag_line_inserts_fields_without_parsing():
+    prefix = topic_field("funk1")
+    assert tag_line(b'{"rssi": -91}', prefix) == b'{"topic":"funk1","rssi": -91}'
+    assert json.loads(tag_line(b"{ }", prefix)) == {"topic": "funk1"}
+    assert tag_line('{"a": 1}\r', prefix) == '{"topic":"funk1","a": 1}\r'
+    assert tag_line(b"[1, 2]", prefix) == b"[1, 2]"
+    tagged = json.loads(tag_line(LINE.encode(), seq_field(42) + prefix))
+    assert tagged["seq"] == 42 and tagged["topic"] == "funk1"
+
+
+def test_state_ignores_fields_injected_by_the_server():
+    state = TelemetryState()
+    line = tag_line(b'{"device": "d1", "rssi": -91}', seq_field(7) + topic_field("funk1"))
+    state.update_frame(TelemetryFrame(line, "funk1", 7))
+    assert json.loads(state.message()) == {"state": {"d1": {"device": "d1", "rssi": -91}}}
+
+
+def test_state_is_deep_merged_per_device_and_cached():
+    state = TelemetryState()
+    first = TelemetryFrame(b'{"device": "d1", "rssi": -91, "cfg": {"sf": 7, "bw": 125}}')
+    state.update_frame(first)
+    state.update_frame(TelemetryFrame(b'{"device": "d1", "cfg": {"sf": 9}}'))
+    state.update_frame(TelemetryFrame(b'{"x": 1}', topic="funk2"))
+
+    message = state.message()
+    assert state.message() is message  # unverändert: kein erneutes Serialisieren
+    assert json.loads(message) == {"state": {
+        "d1": {"device": "d1", "rssi": -91, "cfg": {"sf": 9, "bw": 125}},
+        "funk2": {"x": 1},
+    }}
+    # Der Zustand teilt keine verschachtelten Objekte mit dem Frame
+    assert first.data["cfg"] == {"sf": 7, "bw": 125}
+
+    state.update_frame(TelemetryFrame(b'{"device": "d1", "rssi": -80}'))
+    assert state.message() is not message
+    assert state.snapshot()["d1"]["rssi"] == -80
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Tests für serverseitige Abo-Filter (Ausdruck -> Prädikat)
+"""
+
+import pytest
+
+from telemetry_codec import TelemetryFrame
+from telemetry_filter import FilterError, compile_filter, frame_predicate
+
+
+def test_compare_and_combine_fields():
+    match = compile_filter('rssi < -90 and device == "sx1276_001"')
+    assert match({"device": "sx1276_001", "rssi": -95})
+    assert not match({"device": "sx1276_001", "rssi": -80})
+    assert not match({"device": "other", "rssi": -95})
+
+    assert compile_filter("-100 < rssi <= -80")({"rssi": -80})
+    assert compile_filter('mode in ["rx", "idle"] or not tx')({"mode": "idle", "tx": True})
+    assert compile_filter('mode not in ("tx",)')({"mode": "rx"})
+    assert compile_filter("locked == true")({"locked": True})
+
+
+def test_nested_fields_and_bare_names():
+    match = compile_filter('gps.fix and meta["rx-gain"] >= 10')
+    assert match({"gps": {"fix": 1}, "meta": {"rx-gain": 12}})
+    assert not match({"gps": {"fix": 0}, "meta": {"rx-gain": 12}})
+    assert not match({"gps": 5, "meta": {"rx-gain": 12}})
+
+
+def test_missing_fields_and_type_mismatch_do_not_match():
+    match = compile_filter("rssi < -90")
+    assert not match({})
+    assert not match({"rssi": "weak"})
+    assert not compile_filter("rssi != 1")({})
+    assert compile_filter("not rssi < -90")({})
+
+
+@pytest.mark.parametrize("expression", [
+    "", "rssi <", '__import__("os")', "rssi + 1 > 0", "rssi < x[0]",
+    "f(rssi)", "[x for x in y]", "-'a' < rssi",
+])
+def test_rejects_unsupported_expressions(expression):
+    with pytest.raises(FilterError):
+        compile_filter(expression)
+
+
+def test_frame_predicate_skips_non_objects():
+    check = frame_predicate(compile_filter("snr > 5"))
+    assert check(TelemetryFrame(b'{"snr": 7.5}'))
+    assert not check(TelemetryFrame(b'[1, 2]'))
+    assert compile_filter("snr > 5") is compile_filter("snr > 5")
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Unit-Tests für den Telemetrie-Fan-out-Hub (ohne Hardware, ohne Netzwerk)
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from server_real_rf_system import (ClientRequestError, ClientSession, collect_batch,
+                                   collect_latest, frame_device_key, join_batch,
+                                   parse_port_spec, pump_ring, render_frames,
+                                   resume_client, shared_publisher)
+from shm_ring import SharedRing
+from telemetry_codec import TelemetryFrame
+from telemetry_hub import ReplayRing, SlowConsumerPolicy, TelemetryHub
+
+
+@pytest.mark.asyncio
+async def test_every_line_reaches_every_client():
+    hub = TelemetryHub(maxlen=16)
+    clients = [hub.subscribe() for _ in range(3)]
+
+    for i in range(5):
+        hub.publish(f'{{"n": {i}}}')
+
+    for client in clients:
+        received = [await client.get() for _ in range(5)]
+        assert received == [f'{{"n": {i}}}' for i in range(5)]
+        assert client.delivered == 5
+        assert client.dropped == 0
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest_keeps_newest_lines():
+    hub = TelemetryHub(maxlen=2, policy=SlowConsumerPolicy.DROP_OLDEST)
+    client = hub.subscribe()
+    for i in range(5):
+        hub.publish(i)
+
+    assert [await client.get(), await client.get()] == [3, 4]
+    assert client.dropped == 3
+    assert client.max_lag == 2
+
+
+@pytest.mark.asyncio
+async def test_drop_newest_keeps_oldest_lines():
+    hub = TelemetryHub(maxlen=2, policy=SlowConsumerPolicy.DROP_NEWEST)
+    client = hub.subscribe()
+    for i in range(5):
+        hub.publish(i)
+
+    assert [await client.get(), await client.get()] == [0, 1]
+    assert client.dropped == 3
+
+
+@pytest.mark.asyncio
+async def test_disconnect_policy_removes_only_slow_client():
+    hub = TelemetryHub(maxlen=2)
+    fast = hub.subscribe()
+    slow = hub.subscribe(policy=SlowConsumerPolicy.DISCONNECT)
+
+    for i in range(3):
+        hub.publish(i)
+        assert await fast.get() == i
+
+    assert slow.closed and slow.close_reason == "slow consumer"
+    assert await slow.get() is None
+    assert slow not in hub.clients
+    assert fast in hub.clients
+
+
+@pytest.mark.asyncio
+async def test_get_waits_for_publish():
+    hub = TelemetryHub()
+    client = hub.subscribe()
+    waiter = asyncio.ensure_future(client.get())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    hub.publish("x")
+    assert await asyncio.wait_for(waiter, 1) == "x"
+
+    hub.unsubscribe(client)
+    assert await client.get() is None
+
+
+@pytest.mark.asyncio
+async def test_batch_flushes_on_size_or_window():
+    hub = TelemetryHub()
+    client = hub.subscribe()
+    session = ClientSession()
+    session.configure_batch({"ms": 20, "kb": 0.02})  # 20 Byte
+
+    for i in range(5):
+        hub.publish(b'{"n": %d}' % i)
+    batch = await collect_batch(client, session, await client.get())
+    assert join_batch(batch) == b'[{"n": 0},{"n": 1},{"n": 2}]'
+
+    batch = await collect_batch(client, session, await client.get())
+    assert join_batch(batch) == b'[{"n": 3},{"n": 4}]'
+    assert client.lag == 0
+
+    session.configure_batch(False)
+    assert session.batch_ms is None
+    with pytest.raises(ValueError):
+        session.configure_batch({"ms": -1})
+
+
+def test_batched_delta_mixes_objects_and_other_json():
+    session = ClientSession()
+    session.configure_batch({"ms": 20})
+    session.configure_encoding("delta")
+    frames = [TelemetryFrame('{"device": "d1", "rssi": -91}'), TelemetryFrame("[1, 2]"),
+              TelemetryFrame("42")]
+
+    (payload, binary), = render_frames(frames, session)
+    assert not binary
+    assert json.loads(payload) == [{"dev": "d1", "full": {"device": "d1", "rssi": -91}},
+                                   [1, 2], 42]
+
+    (payload, _), = render_frames(frames[:1], session)
+    assert b'"set"' in payload
+    session.resync_delta()  # z.B. nach {"resume": ...}: wieder ein Keyframe
+    (payload, _), = render_frames(frames[:1], session)
+    assert b'"full"' in payload
+
+
+def test_topic_subscription_filters_before_queueing():
+    hub = TelemetryHub()
+    client = hub.subscribe()
+    session = ClientSession()
+    session.configure_topics(["b"], known={"a", "b"})
+    client.filter = session.build_filter()
+
+    hub.publish(TelemetryFrame(b"{}", "a"))
+    hub.publish(TelemetryFrame(b"{}", "b"))
+    assert client.lag == 1 and client.filtered == 1
+    assert client.get_nowait().topic == "b"
+
+    with pytest.raises(ClientRequestError):
+        session.configure_topics(["c"], known={"a", "b"})
+
+
+def test_field_filter_combines_with_topics():
+    hub = TelemetryHub()
+    client = hub.subscribe()
+    session = ClientSession()
+    session.configure_topics(["a"], known={"a", "b"})
+    session.configure_filter("rssi < -90")
+    client.filter = session.build_filter()
+
+    hub.publish(TelemetryFrame(b'{"rssi": -95}', "a"))
+    hub.publish(TelemetryFrame(b'{"rssi": -70}', "a"))
+    hub.publish(TelemetryFrame(b'{"rssi": -95}', "b"))
+    assert client.lag == 1 and client.filtered == 2
+
+    session.configure_filter(None)
+    assert session.where is None
+    with pytest.raises(ClientRequestError):
+        session.configure_filter("rssi <")
+
+
+def test_conflate_keeps_newest_value_per_key():
+    hub = TelemetryHub(maxlen=2)
+    client = hub.subscribe()
+    hub.publish(TelemetryFrame(b'{"device": "a", "n": 0}'))
+    client.conflate(frame_device_key)
+    for i in range(1, 50):
+        hub.publish(TelemetryFrame(b'{"device": "%s", "n": %d}' % (b"ab"[i % 2:i % 2 + 1], i)))
+
+    assert client.lag == 2 and client.dropped == 0 and client.conflated == 48
+    assert [f.data for f in client.drain()] == [{"device": "a", "n": 48},
+                                                {"device": "b", "n": 49}]
+    hub.publish(TelemetryFrame(b'{"device": "a", "n": 50}'))
+    client.conflate(None)
+    assert client.get_nowait().data["n"] == 50
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_flushes_latest_on_tick():
+    hub = TelemetryHub()
+    client = hub.subscribe()
+    session = ClientSession()
+    session.configure_rate({"hz": 20})
+    client.conflate(frame_device_key)
+    loop = asyncio.get_running_loop()
+
+    hub.publish(TelemetryFrame(b'{"device": "a", "n": 1}'))
+    hub.publish(TelemetryFrame(b'{"device": "a", "n": 2}'))
+    last_flush = loop.time()
+    frames = await collect_latest(client, session, last_flush)
+    assert loop.time() - last_flush >= 0.04
+    assert [f.data["n"] for f in frames] == [2]
+
+    session.configure_rate(None)
+    assert session.rate_hz is None
+    with pytest.raises(ClientRequestError):
+        session.configure_rate(-1)
+
+
+@pytest.mark.asyncio
+async def test_worker_pump_feeds_hub_from_shared_ring():
+    shm = SharedRing.create(1 << 16)
+    hub = TelemetryHub()
+    client = hub.subscribe()
+    reader = shm.reader()
+    publish = shared_publisher(shm)
+    pump = asyncio.ensure_future(pump_ring(
+        reader, lambda raw, topic, seq: hub.publish(TelemetryFrame(raw, topic, seq)), 0.001))
+    try:
+        publish(TelemetryFrame('{"seq":5,"rssi":-91}', "funk1", 5))
+        frame = await asyncio.wait_for(client.get(), 1)
+        assert (frame.raw, frame.topic, frame.seq) == (b'{"seq":5,"rssi":-91}', "funk1", 5)
+    finally:
+        pump.cancel()
+        shm.close()
+
+
+def test_parse_port_spec():
+    assert parse_port_spec("funk1=/dev/ttyUSB0") == ("funk1", "/dev/ttyUSB0")
+    assert parse_port_spec("COM5") == ("COM5", "COM5")
+    assert parse_port_spec("loop://?logging=debug") == ("loop://?logging=debug",) * 2
+
+
+def publish_seq(hub, ring, n):
+    for _ in range(n):
+        seq = ring.next_seq()
+        frame = TelemetryFrame(b'{"seq":%d}' % seq, "", seq)
+        ring.append(frame)
+        hub.publish(frame)
+
+
+def test_replay_ring_reports_gap_outside_window():
+    ring = ReplayRing(4, start=100)
+    publish_seq(TelemetryHub(), ring, 6)  # 101..106, Ring hält 103..106
+    assert [f.seq for f in ring.since(104)] == [105, 106]
+    assert ring.since(106) == []
+    assert [f.seq for f in ring.since(102)] == [103, 104, 105, 106]
+    assert ring.since(101) is None   # 102 ist schon aus dem Ring gefallen
+    assert ring.since(200) is None   # unbekannte Nummer
+
+
+def test_resume_replays_gap_before_live_lines():
+    hub = TelemetryHub(maxlen=2)
+    ring = ReplayRing(100, start=0)
+    publish_seq(hub, ring, 5)
+    client = hub.subscribe()
+    publish_seq(hub, ring, 1)  # 6, bereits im Puffer des neuen Clients
+
+    reply = resume_client(client, ring, 2)
+    assert reply == {"resumed": {"after": 2, "last": 6, "count": 4}}
+    publish_seq(hub, ring, 3)  # 7..9: Puffer (maxlen 2) läuft über, Nachlieferung nicht
+    received = []
+    while (frame := client.get_nowait()) is not None:
+        received.append(frame.seq)
+    assert received == [3, 4, 5, 6, 8, 9]
+
+    ring.frames.clear()
+    assert resume_client(client, ring, 2)["gap"]["reason"] == "too_large"
+    with pytest.raises(ClientRequestError):
+        resume_client(client, None, 2)
+
+
+def test_aggregate_subscription_replaces_raw_stream():
+    session = ClientSession()
+    session.configure_aggregate({"fields": ["rssi"], "windows": ["10s"]}, ["1s", "10s"])
+    assert session.agg_ms == 1000 and session.agg_fields == {"rssi"}
+    assert session.build_filter()(TelemetryFrame(b'{"rssi": -90}')) is False
+    with pytest.raises(ClientRequestError):
+        session.configure_aggregate({"windows": ["5m"]}, ["1s", "10s"])
+    session.configure_aggregate(None, ["1s"])
+    assert session.agg_ms is None and session.build_filter() is None
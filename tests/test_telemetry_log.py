@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests für das segmentierte Telemetrie-Log (temporäres Verzeichnis, ohne Hardware)
+"""
+
+import json
+import os
+
+from telemetry_log import TelemetryLog
+
+
+def fill(log, count, t0=1000.0):
+    for i in range(count):
+        device = "sx1276_001" if i % 2 else "sx1276_002"
+        log.append(json.dumps({"device": device, "rssi": -80 - i, "n": i}), ts=t0 + i)
+    log.flush()
+
+
+def test_time_range_query_across_segments(tmp_path):
+    log = TelemetryLog(str(tmp_path), segment_bytes=512, index_interval=64)
+    fill(log, 100)
+    assert len(log.segments) > 5
+
+    rows = list(log.query(1010.0, 1019.0))
+    assert [ts for ts, _ in rows] == [1000.0 + i for i in range(10, 20)]
+    assert json.loads(rows[0][1])["n"] == 10
+
+    rssi = list(log.query(1010.0, 1015.0, device="sx1276_001", fields=["rssi"]))
+    assert rssi == [(1011.0, {"rssi": -91}), (1013.0, {"rssi": -93}), (1015.0, {"rssi": -95})]
+    log.close()
+
+
+def test_equal_timestamps_spanning_index_entries(tmp_path):
+    log = TelemetryLog(str(tmp_path), index_interval=64)
+    log.append(b'{"n": -1}', ts=999.0)
+    for i in range(100):
+        log.append(json.dumps({"n": i}), ts=1000.0)
+    log.append(b'{"n": 100}', ts=1001.0)
+    log.flush()
+
+    rows = list(log.query(1000.0, 1000.0))
+    assert [json.loads(raw)["n"] for _, raw in rows] == list(range(100))
+    assert len(list(log.query(1000.0, 1001.0))) == 101
+    log.close()
+
+
+def test_retention_by_size_and_age(tmp_path):
+    log = TelemetryLog(str(tmp_path), segment_bytes=512, retention_bytes=2048)
+    fill(log, 100)
+    assert log.total_bytes() <= 2048 + 512
+    assert log.deleted_segments > 0
+    assert min(ts for ts, _ in log.query(0, 2000)) > 1000.0
+
+    log.retention_bytes = None
+    log.retention_seconds = 10
+    log.enforce_retention(now=1099.0)
+    assert all(s.first_ts >= 1080.0 for s in log.segments[1:])
+    assert len(os.listdir(tmp_path)) == 2 * len(log.segments)
+    log.close()
+
+
+def test_reopen_keeps_segments_and_tolerates_torn_tail(tmp_path):
+    log = TelemetryLog(str(tmp_path), segment_bytes=4096)
+    fill(log, 10)
+    log.close()
+    with open(log.segments[-1].path, "ab") as f:
+        f.write(b"\x00\x00")  # abgebrochener Record-Kopf
+
+    reopened = TelemetryLog(str(tmp_path), segment_bytes=4096)
+    fill(reopened, 1, t0=2000.0)
+    assert [ts for ts, _ in reopened.query(0, 3000)][-2:] == [1009.0, 2000.0]
+    reopened.close()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests für /metrics und /health (Prometheus-Textformat, Mini-HTTP-Server)
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from telemetry_hub import TelemetryHub
+from telemetry_metrics import (PROMETHEUS_CONTENT_TYPE, Metrics, health, render_metrics,
+                               serve_http)
+
+SERIAL = {
+    "funk1": {
+        "at": {"timeouts": 1, "latency_p50_ms": 12.5, "latency_p99_ms": 40.0},
+        "lanes": {"bulk": {"sent": 7, "wait_p50_ms": 1.0, "wait_p99_ms": 9.5}},
+        "link": {"connected": True, "disconnects": 2, "reconnects": 2,
+                 "last_reconnect_ms": 850.0},
+        "rejected": 3,
+    },
+}
+
+
+def test_render_exposes_counters_and_client_depth():
+    metrics = Metrics(["funk1"])
+    metrics.lines_received["funk1"] += 5
+    metrics.lines_sent = 10
+    hub = TelemetryHub()
+    client = hub.subscribe(name='c"1')
+    hub.publish(b"{}")
+
+    page = render_metrics(metrics, hub.stats(), SERIAL).decode()
+    assert 'rf_lines_received_total{topic="funk1"} 5' in page
+    assert "rf_lines_sent_total 10" in page
+    assert 'rf_client_queue_depth{client="c\\"1"} 1' in page
+    assert 'rf_command_wait_ms{topic="funk1",lane="bulk",quantile="0.99"} 9.5' in page
+    assert 'rf_at_latency_ms{topic="funk1",quantile="0.5"} 12.5' in page
+    assert 'rf_serial_reconnects_total{topic="funk1"} 2' in page
+    assert 'rf_lines_rejected_total{topic="funk1"} 3' in page
+    assert "# TYPE rf_serial_connected gauge" in page
+    assert client.lag == 1  # Abruf verändert nichts
+
+
+def test_tick_computes_rates():
+    metrics = Metrics(["a"])
+    metrics._last_tick -= 2.0
+    metrics.lines_received["a"] = 100
+    metrics.tick()
+    assert 45 < metrics.received_per_second <= 50
+
+
+def test_health_degrades_when_port_is_down():
+    status, _, body = health(SERIAL)
+    assert status == 200 and json.loads(body)["status"] == "ok"
+    down = {"funk1": {"link": {"connected": False}}}
+    status, _, body = health(down)
+    assert status == 503 and json.loads(body)["down"] == ["funk1"]
+
+
+@pytest.mark.asyncio
+async def test_http_server_routes_requests():
+    server = await serve_http("127.0.0.1", 0, {
+        "/metrics": lambda: (200, PROMETHEUS_CONTENT_TYPE, b"rf_up 1\n"),
+    })
+    port = server.sockets[0].getsockname()[1]
+
+    async def get(path):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+        response = await reader.read()
+        writer.close()
+        return response
+
+    try:
+        response = await get("/metrics?x=1")
+        assert response.startswith(b"HTTP/1.0 200 OK\r\n")
+        assert response.endswith(b"\r\n\r\nrf_up 1\n")
+        assert (await get("/nope")).startswith(b"HTTP/1.0 404")
+    finally:
+        server.close()
+        await server.wait_closed()
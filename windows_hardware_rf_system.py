@@ -18,6 +18,8 @@ from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 import logging
 
+from at_command_engine import read_at_response
+
 # WINDOWS-KOMPATIBLE HARDWARE-TREIBER
 try:
     import serial
@@ -252,9 +254,10 @@ class WindowsRFChipController:
         """Echte AT-Kommando-Übertragung"""
         if self.serial_port:
             try:
+                self.serial_port.reset_input_buffer()
                 self.serial_port.write(f"{command}\r\n".encode())
-                time.sleep(0.1)
-                response = self.serial_port.read_all().decode().strip()
+                # Bis zum finalen Result-Code lesen statt fest 100 ms zu warten
+                response = "\n".join(read_at_response(self.serial_port))
                 print(f"✅ AT-Kommando gesendet: {command} -> {response}")
                 return response
             except Exception as e: